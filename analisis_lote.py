@@ -0,0 +1,213 @@
+"""
+Analizador por lotes sin navegador.
+
+Aplica a cada CSV de un directorio la misma carga, limpieza, ANOVA de medidas
+repetidas y verificación de supuestos que el dashboard, repartiendo los
+archivos en un pool de procesos. Por cada dataset escribe en
+`<salida>/<nombre>/`:
+
+* `resumen.json`: metadatos, reparación de `value`, supuestos por DV (Shapiro,
+  Levene, recta del Q-Q) y, con `--formato json|ambos`, las tablas.
+* `anova.parquet`, `celdas.parquet` y `residuos.parquet` (con `--formato parquet|ambos`).
+
+y un `manifiesto.json` global con el estado y la duración de cada archivo.
+
+Uso:
+    python analisis_lote.py DIRECTORIO [--salida resultados_lote] [--procesos N]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from anova_vectorizado import rm_anova_rapido
+from preparacion import cargar_tabla, clean_neuro_data
+from supuestos import residuos_y_supuestos
+
+WITHIN = ['prime', 'target']
+SUBJECT = 'id'
+# Variables dependientes que analiza el dashboard, en orden de preferencia
+DVS = ['rt_log', 'value']
+PATRONES = ['*.csv', '*.csv.gz', '*.csv.zst']
+FORMATOS = ['json', 'parquet', 'ambos']
+
+
+def nombre_dataset(ruta, directorio):
+    """Nombre de la carpeta de salida: ruta relativa sin extensiones, con `__` por separador."""
+    relativa = os.path.relpath(ruta, directorio)
+    for extension in ('.gz', '.zst', '.csv'):
+        if relativa.endswith(extension):
+            relativa = relativa[:-len(extension)]
+    return relativa.replace(os.sep, '__')
+
+
+def buscar_archivos(directorio, recursivo=False):
+    """CSV (también `.gz` / `.zst`) de `directorio`, ordenados."""
+    prefijo = os.path.join(directorio, '**') if recursivo else directorio
+    rutas = set()
+    for patron in PATRONES:
+        rutas.update(glob.glob(os.path.join(prefijo, patron), recursive=recursivo))
+    return sorted(rutas)
+
+
+def _registros(df):
+    """Filas de `df` como lista de diccionarios serializables (NaN -> null)."""
+    return json.loads(df.to_json(orient='records'))
+
+
+def analizar_dataset(df, dvs):
+    """
+    ANOVA, supuestos, medias por celda y residuos de `df` para cada DV de `dvs`.
+
+    Devuelve `(anova, celdas, residuos, supuestos)`; `supuestos` es un diccionario
+    DV -> estadísticos escalares.
+    """
+    anova = rm_anova_rapido(df, dvs, WITHIN, SUBJECT)
+    sup = residuos_y_supuestos(df, dvs, within=WITHIN, subject=SUBJECT)
+
+    celdas = df.groupby(WITHIN, observed=True)[dvs].agg(['count', 'mean', 'std', 'median'])
+    celdas.columns = [f'{dv}_{estadistico}' for dv, estadistico in celdas.columns]
+    celdas = celdas.reset_index()
+
+    residuos = df[[SUBJECT, *WITHIN]].copy()
+    for dv in dvs:
+        residuos[f'residuo_{dv}'] = sup['residuos'][dv]
+
+    supuestos = {
+        dv: {clave: float(sup[clave][i]) for clave in
+             ('shapiro_w', 'shapiro_p', 'levene_stat', 'levene_p', 'qq_pendiente', 'qq_intercepto', 'qq_r')}
+        for i, dv in enumerate(dvs)
+    }
+    return anova, celdas, residuos, supuestos
+
+
+def procesar_archivo(ruta, dir_salida, formato='ambos'):
+    """
+    Carga, limpia y analiza `ruta` y escribe sus resultados en `dir_salida`.
+
+    Se ejecuta en un proceso del pool; devuelve la entrada del manifiesto.
+    """
+    inicio = time.perf_counter()
+    warnings.filterwarnings("ignore")
+    df = clean_neuro_data(cargar_tabla(ruta))
+    faltan = [c for c in [SUBJECT, *WITHIN] if c not in df.columns]
+    dvs = [dv for dv in DVS if dv in df.columns]
+    if faltan or not dvs:
+        raise ValueError(f"Columnas insuficientes: faltan {faltan or 'variables dependientes'}")
+    df = df.dropna(subset=dvs)
+
+    anova, celdas, residuos, supuestos = analizar_dataset(df, dvs)
+
+    os.makedirs(dir_salida, exist_ok=True)
+    resumen = {
+        'archivo': os.path.abspath(ruta),
+        'dvs': dvs,
+        'n_filas': int(len(df)),
+        'n_sujetos': int(df[SUBJECT].nunique()),
+        'reparacion_value': df.attrs.get('reparacion_value'),
+        'supuestos': supuestos,
+    }
+    if formato in ('json', 'ambos'):
+        resumen['anova'] = _registros(anova)
+        resumen['celdas'] = _registros(celdas)
+    if formato in ('parquet', 'ambos'):
+        anova.to_parquet(os.path.join(dir_salida, 'anova.parquet'), index=False)
+        celdas.to_parquet(os.path.join(dir_salida, 'celdas.parquet'), index=False)
+        residuos.to_parquet(os.path.join(dir_salida, 'residuos.parquet'), index=False)
+    with open(os.path.join(dir_salida, 'resumen.json'), 'w', encoding='utf-8') as fh:
+        json.dump(resumen, fh, ensure_ascii=False, indent=2, default=str)
+
+    return {
+        'archivo': resumen['archivo'], 'salida': os.path.abspath(dir_salida), 'estado': 'ok',
+        'dvs': dvs, 'n_sujetos': resumen['n_sujetos'],
+        'p_interaccion': {dv: float(p) for dv, p in
+                          anova.loc[anova['Source'] == f'{WITHIN[0]} * {WITHIN[1]}', ['DV', 'p-unc']].to_numpy()},
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def analizar_directorio(directorio, salida='resultados_lote', procesos=None, formato='ambos',
+                        recursivo=False, progreso=None):
+    """
+    Analiza todos los CSV de `directorio` en paralelo y escribe `manifiesto.json`.
+
+    Un archivo que falla no detiene el lote: queda en el manifiesto con estado
+    `error` y su traza. `progreso(entrada)` se llama al terminar cada archivo.
+    """
+    rutas = buscar_archivos(directorio, recursivo)
+    if procesos is None:
+        procesos = min(os.cpu_count() or 1, max(len(rutas), 1))
+    inicio = time.perf_counter()
+
+    trabajos = {ruta: os.path.join(salida, nombre_dataset(ruta, directorio)) for ruta in rutas}
+    entradas = []
+
+    def registrar(ruta, calcular):
+        try:
+            entrada = calcular()
+        except Exception as exc:
+            entrada = {'archivo': os.path.abspath(ruta), 'estado': 'error',
+                       'error': f'{type(exc).__name__}: {exc}',
+                       'traza': ''.join(traceback.format_exception(exc))}
+        entradas.append(entrada)
+        if progreso is not None:
+            progreso(entrada)
+
+    if procesos > 1 and len(rutas) > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = {pool.submit(procesar_archivo, ruta, destino, formato): ruta
+                       for ruta, destino in trabajos.items()}
+            for futuro in as_completed(futuros):
+                registrar(futuros[futuro], futuro.result)
+    else:
+        for ruta, destino in trabajos.items():
+            registrar(ruta, lambda: procesar_archivo(ruta, destino, formato))
+
+    entradas.sort(key=lambda e: e['archivo'])
+    manifiesto = {
+        'directorio': os.path.abspath(directorio),
+        'fecha': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'procesos': procesos,
+        'formato': formato,
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'correctos': sum(e['estado'] == 'ok' for e in entradas),
+        'errores': sum(e['estado'] == 'error' for e in entradas),
+        'datasets': entradas,
+    }
+    os.makedirs(salida, exist_ok=True)
+    with open(os.path.join(salida, 'manifiesto.json'), 'w', encoding='utf-8') as fh:
+        json.dump(manifiesto, fh, ensure_ascii=False, indent=2, default=str)
+    return manifiesto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ANOVA y supuestos del dashboard sobre todos los CSV de un directorio.")
+    parser.add_argument('directorio', help="Directorio con los CSV de los estudios")
+    parser.add_argument('--salida', default='resultados_lote', help="Directorio de resultados (por defecto: resultados_lote)")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos en paralelo (por defecto: núcleos disponibles)")
+    parser.add_argument('--formato', choices=FORMATOS, default='ambos', help="Tablas en JSON, Parquet o ambos")
+    parser.add_argument('--recursivo', action='store_true', help="Buscar también en subdirectorios")
+    args = parser.parse_args(argv)
+
+    def mostrar(entrada):
+        if entrada['estado'] == 'ok':
+            print(f"[ok] {entrada['archivo']} ({entrada['segundos']} s)")
+        else:
+            print(f"[error] {entrada['archivo']}: {entrada['error']}", file=sys.stderr)
+
+    manifiesto = analizar_directorio(args.directorio, args.salida, args.procesos, args.formato,
+                                     args.recursivo, progreso=mostrar)
+    print(f"{manifiesto['correctos']} correctos, {manifiesto['errores']} con error "
+          f"en {manifiesto['segundos']} s -> {os.path.join(args.salida, 'manifiesto.json')}")
+    return 1 if manifiesto['errores'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
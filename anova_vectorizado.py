@@ -0,0 +1,233 @@
+"""
+Motor NumPy para el ANOVA de medidas repetidas de dos factores (prime × target).
+
+Trabaja sobre un array `sujetos × niveles_a × niveles_b × n_dv` y calcula las
+sumas de cuadrados, F y p de `a`, `b` y `a * b` para todas las variables
+dependientes a la vez. Reproduce las fórmulas de `pg.rm_anova` (incluidos
+`p-GG-corr`, `ng2` y `eps`), por lo que las tablas resultantes se pueden pasar
+directamente a `formatear_tabla_anova`.
+"""
+import numpy as np
+import pandas as pd
+from scipy.stats import f as dist_f
+
+COLUMNAS_ANOVA = ['Source', 'SS', 'ddof1', 'ddof2', 'MS', 'F', 'p-unc', 'p-GG-corr', 'ng2', 'eps']
+
+
+def cubo_celdas(df, dv, within=('prime', 'target'), subject='id'):
+    """
+    Pasa un DataFrame largo a un array `(sujetos, niveles_a, niveles_b, n_dv)`.
+
+    Las observaciones repetidas de una misma celda (p. ej. varias `run`) se
+    promedian, igual que hace Pingouin. Los sujetos con alguna celda vacía se
+    eliminan (análisis de casos completos). `dv` puede ser una columna o una
+    lista de columnas. Devuelve `(cubo, coords)`, donde `coords` contiene las
+    etiquetas de sujetos, niveles y variables dependientes.
+    """
+    dvs = [dv] if isinstance(dv, str) else list(dv)
+    a, b = within
+    piv = df.pivot_table(index=subject, columns=[a, b], values=dvs, observed=True, aggfunc='mean')
+    piv = piv.dropna()
+
+    niveles_a = piv.columns.get_level_values(a).unique().sort_values()
+    niveles_b = piv.columns.get_level_values(b).unique().sort_values()
+    columnas = pd.MultiIndex.from_product([dvs, niveles_a, niveles_b])
+    piv = piv.reindex(columns=columnas)
+
+    cubo = piv.to_numpy(dtype=np.float64).reshape(len(piv), len(dvs), len(niveles_a), len(niveles_b))
+    cubo = np.ascontiguousarray(np.moveaxis(cubo, 1, -1))
+    coords = {subject: piv.index.to_numpy(), a: niveles_a.to_numpy(), b: niveles_b.to_numpy(), 'dv': dvs}
+    return cubo, coords
+
+
+def _epsilon_desde_cov(cov):
+    """Épsilon de Greenhouse-Geisser a partir de covarianzas `(n_dv, k, k)`."""
+    n_dv, k, _ = cov.shape
+    if k <= 2:
+        return np.ones(n_dv)
+    mean_var = np.einsum('nkk->n', cov) / k
+    s_mean = cov.mean(axis=(1, 2))
+    ss_mat = (cov ** 2).sum(axis=(1, 2))
+    ss_rows = (cov.mean(axis=2) ** 2).sum(axis=1)
+    num = (k * (mean_var - s_mean)) ** 2
+    den = (k - 1) * (ss_mat - 2 * k * ss_rows + k ** 2 * s_mean ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.minimum(num / den, 1.0)
+
+
+def _epsilon_gg(wide):
+    """Épsilon de Greenhouse-Geisser para `wide` con forma `(sujetos, k, n_dv)`."""
+    n, k, n_dv = wide.shape
+    if k <= 2:
+        return np.ones(n_dv)
+    centrado = wide - wide.mean(axis=0)
+    return _epsilon_desde_cov(np.einsum('skn,sjn->nkj', centrado, centrado) / (n - 1))
+
+
+def _epsilon_interaccion(cubo):
+    """Épsilon de la interacción con la misma convención que `pg.epsilon`."""
+    n_s, n_a, n_b, n_dv = cubo.shape
+    if n_a == 2:
+        return _epsilon_gg(cubo[:, 1] - cubo[:, 0])
+    if n_b == 2:
+        return _epsilon_gg(cubo[:, :, 1] - cubo[:, :, 0])
+    return _epsilon_gg(cubo.reshape(n_s, n_a * n_b, n_dv))
+
+
+def rm_anova2_arrays(cubo):
+    """
+    ANOVA de medidas repetidas 2 × 2 (o a × b) vectorizado.
+
+    `cubo` tiene forma `(sujetos, niveles_a, niveles_b, n_dv)` y no puede tener
+    NaN. Devuelve un diccionario de arrays de forma `(3, n_dv)` (filas: a, b,
+    a * b) más `ddof1` / `ddof2` de forma `(3,)`.
+    """
+    cubo = np.asarray(cubo, dtype=np.float64)
+    if cubo.ndim == 3:
+        cubo = cubo[..., np.newaxis]
+    n_s, n_a, n_b, _ = cubo.shape
+
+    mu = cubo.mean(axis=(0, 1, 2))
+    m_s = cubo.mean(axis=(1, 2))
+    m_a = cubo.mean(axis=(0, 2))
+    m_b = cubo.mean(axis=(0, 1))
+    m_ab = cubo.mean(axis=0)
+    m_as = cubo.mean(axis=2)
+    m_bs = cubo.mean(axis=1)
+
+    # Sumas de cuadrados (mismas fórmulas que pingouin.rm_anova2)
+    ss_tot = ((cubo - mu) ** 2).sum(axis=(0, 1, 2))
+    ss_s = n_a * n_b * ((m_s - mu) ** 2).sum(axis=0)
+    ss_a = n_b * n_s * ((m_a - mu) ** 2).sum(axis=0)
+    ss_b = n_a * n_s * ((m_b - mu) ** 2).sum(axis=0)
+    ss_ab = n_s * ((m_ab - mu) ** 2).sum(axis=(0, 1)) - ss_a - ss_b
+    ss_as = n_b * ((m_as - mu) ** 2).sum(axis=(0, 1)) - ss_s - ss_a
+    ss_bs = n_a * ((m_bs - mu) ** 2).sum(axis=(0, 1)) - ss_s - ss_b
+    ss_abs = ss_tot - ss_a - ss_b - ss_s - ss_ab - ss_as - ss_bs
+
+    # Corrección de Greenhouse-Geisser
+    eps = np.stack([_epsilon_gg(m_as), _epsilon_gg(m_bs), _epsilon_interaccion(cubo)])
+    return _completar_anova(n_s, n_a, n_b, (ss_a, ss_b, ss_ab), (ss_as, ss_bs, ss_abs), ss_s, eps)
+
+
+def _completar_anova(n_s, n_a, n_b, ss, ss_err, ss_s, eps):
+    """Grados de libertad, MS, F, p, ng2 y p-GG-corr a partir de las sumas de cuadrados."""
+    df_a, df_b, df_s = n_a - 1, n_b - 1, n_s - 1
+    ddof1 = np.array([df_a, df_b, df_a * df_b])
+    ddof2 = np.array([df_a * df_s, df_b * df_s, df_a * df_b * df_s])
+    ss = np.stack(ss)
+    ss_err = np.stack(ss_err)
+
+    ms = ss / ddof1[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f_val = ms / (ss_err / ddof2[:, None])
+        # Eta cuadrado generalizado (Bakeman, 2005)
+        ng2 = ss / (ss + ss_s + ss_err.sum(axis=0))
+    p_unc = dist_f.sf(f_val, ddof1[:, None], ddof2[:, None])
+
+    df1_c = np.maximum(ddof1[:, None] * eps, 1.0)
+    df2_c = np.maximum(ddof2[:, None] * eps, 1.0)
+    p_gg = dist_f.sf(f_val, df1_c, df2_c)
+
+    return {
+        'SS': ss, 'ddof1': ddof1, 'ddof2': ddof2, 'MS': ms, 'F': f_val,
+        'p-unc': p_unc, 'p-GG-corr': p_gg, 'ng2': ng2, 'eps': eps,
+    }
+
+
+def rm_anova2_momentos(n_s, suma, suma_cruzada):
+    """
+    Mismo resultado que `rm_anova2_arrays` a partir de momentos sumables por sujeto.
+
+    Con `x_s` el vector (a-mayor) de medias de celda del sujeto `s`:
+    `suma = Σ x_s` con forma `(niveles_a, niveles_b, n_dv)` y
+    `suma_cruzada = Σ x_s x_sᵀ` con forma `(a·b, a·b, n_dv)`. Como ambos se
+    acumulan sujeto a sujeto, añadir sujetos no obliga a recorrer los
+    anteriores. Las sumas de cuadrados son invariantes a desplazar todas las
+    medias por una constante, lo que permite acumular desviaciones respecto a
+    una referencia para no perder precisión.
+    """
+    suma = np.asarray(suma, dtype=np.float64)
+    cruzada = np.asarray(suma_cruzada, dtype=np.float64)
+    if suma.ndim == 2:
+        suma, cruzada = suma[..., np.newaxis], cruzada[..., np.newaxis]
+    n_a, n_b, n_dv = suma.shape
+    k = n_a * n_b
+
+    total = suma.sum(axis=(0, 1))
+    corr = total ** 2 / (n_s * k)
+    m4 = cruzada.reshape(n_a, n_b, n_a, n_b, n_dv)
+
+    ss_tot = np.einsum('iin->n', cruzada) - corr
+    ss_s = cruzada.sum(axis=(0, 1)) / k - corr
+    ss_a = (suma.sum(axis=1) ** 2).sum(axis=0) / (n_s * n_b) - corr
+    ss_b = (suma.sum(axis=0) ** 2).sum(axis=0) / (n_s * n_a) - corr
+    ss_ab = (suma ** 2).sum(axis=(0, 1)) / n_s - corr - ss_a - ss_b
+    ss_as = np.einsum('abacn->n', m4) / n_b - corr - ss_s - ss_a
+    ss_bs = np.einsum('abcbn->n', m4) / n_a - corr - ss_s - ss_b
+    ss_abs = ss_tot - ss_a - ss_b - ss_s - ss_ab - ss_as - ss_bs
+
+    # Covarianza entre sujetos de las medias de celda y sus proyecciones
+    plano = suma.reshape(k, n_dv)
+    cov = np.moveaxis(cruzada - np.einsum('in,jn->ijn', plano, plano) / n_s, -1, 0) / (n_s - 1)
+    media_b = np.kron(np.eye(n_a), np.ones((1, n_b)) / n_b)
+    media_a = np.kron(np.ones((1, n_a)) / n_a, np.eye(n_b))
+    if n_a == 2:
+        contraste = np.kron(np.array([[-1.0, 1.0]]), np.eye(n_b))
+    elif n_b == 2:
+        contraste = np.kron(np.eye(n_a), np.array([[-1.0, 1.0]]))
+    else:
+        contraste = np.eye(k)
+
+    def _proyectar(p):
+        return p @ cov @ p.T
+
+    eps = np.stack([
+        _epsilon_desde_cov(_proyectar(media_b)),
+        _epsilon_desde_cov(_proyectar(media_a)),
+        _epsilon_desde_cov(_proyectar(contraste)),
+    ])
+    return _completar_anova(n_s, n_a, n_b, (ss_a, ss_b, ss_ab), (ss_as, ss_bs, ss_abs), ss_s, eps)
+
+
+def tabla_anova(res, within=('prime', 'target'), dvs=None):
+    """DataFrame en formato Pingouin a partir del diccionario de `rm_anova2_arrays`."""
+    n_dv = res['SS'].shape[1]
+    a, b = within
+    fuentes = [a, b, f'{a} * {b}']
+
+    tabla = pd.DataFrame({
+        'Source': np.tile(fuentes, n_dv),
+        'SS': res['SS'].T.ravel(),
+        'ddof1': np.tile(res['ddof1'], n_dv),
+        'ddof2': np.tile(res['ddof2'], n_dv),
+        'MS': res['MS'].T.ravel(),
+        'F': res['F'].T.ravel(),
+        'p-unc': res['p-unc'].T.ravel(),
+        'p-GG-corr': res['p-GG-corr'].T.ravel(),
+        'ng2': res['ng2'].T.ravel(),
+        'eps': res['eps'].T.ravel(),
+    })
+    if dvs is None and n_dv == 1:
+        return tabla
+    dvs = list(range(n_dv)) if dvs is None else list(dvs)
+    tabla.insert(0, 'DV', np.repeat(dvs, 3))
+    return tabla
+
+
+def rm_anova2_vectorizado(cubo, within=('prime', 'target'), dvs=None):
+    """
+    Tabla ANOVA (formato Pingouin) para todas las variables dependientes del cubo.
+
+    Con una sola variable dependiente devuelve exactamente las columnas de
+    `pg.rm_anova(..., detailed=True)`; con varias, añade una columna `DV` y
+    apila las tres filas de cada variable.
+    """
+    return tabla_anova(rm_anova2_arrays(cubo), within=within, dvs=dvs)
+
+
+def rm_anova_rapido(data, dv, within, subject):
+    """Sustituto de `pg.rm_anova(..., detailed=True)` para diseños de dos factores."""
+    cubo, coords = cubo_celdas(data, dv, within=within, subject=subject)
+    dvs = None if isinstance(dv, str) else coords['dv']
+    return rm_anova2_vectorizado(cubo, within=within, dvs=dvs)
@@ -2,11 +2,38 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import scipy.stats as stats
-import pingouin as pg
-from scipy.stats import shapiro, levene
+import os
+import time
 import warnings
 
+from cache_analisis import cache_analisis, cubo_cacheado, huella_dataframe, rm_anova_cacheado
+from ingesta import firma_archivo
+from ensayos import es_archivo_ensayos
+from libros_excel import es_libro_excel
+from suficientes import actualizar_almacen
+from preparacion import (COLUMNAS_NEURO, COLUMNAS_RT, cargar_tabla, clean_neuro_data,
+                         formatear_tabla_anova)
+from pestanas import (controles_filtros, panel_instrumentacion, pestana, ranura, registrar_tiempo,
+                      resultado_o_espera, selector_pestanas, tabla_tiempos)
+from trabajos import planificador
+from filtros import filtrar_cacheado, indice_cacheado
+from instrumentacion import instrumentacion
+from supuestos import supuestos_cacheados
+from sketch_cuantiles import (PUNTOS_QQ, describir_cacheado, qq_desde_sketch,
+                              resumen_por_grupo_cacheado, sketches_cacheados)
+from permutaciones import prueba_signos_cacheada
+from bootstrap_ic import ic_bootstrap_cacheado
+from replicaciones import (DIR_REPLICACIONES, PATRON, analizar_replicaciones,
+                            descubrir_replicaciones, nombre_replicacion, resumen_interaccion)
+from modelo_mixto import ESTRUCTURAS, ajustar_en_segundo_plano
+from potencia import METODOS, curva_potencia_cacheada, n_para_potencia
+from searchlight_voxel import anova_searchlight_voxeles, contar_voxeles_umbral
+from graficos_ligeros import (PRESUPUESTO_PUNTOS, UMBRAL_FILAS_LIGERO, figura_caja_ligera,
+                              puntos_qq, traza_puntos)
+
+# Inicio del rerun: mide el tiempo de datos + KPIs antes de la pestaña visible
+inicio_script = time.perf_counter()
+
 # Ignorar warnings
 warnings.filterwarnings("ignore")
 
@@ -93,76 +120,129 @@ COLOR_PRIME_WHITE = '#E91E63'
 
 
 @st.cache_data
-def load_data(file_name):
+def _cargar_tabla(file_name, columnas, firma):
+    """Lectura cacheada; `firma` (mtime, tamaño) invalida la caché si cambia el archivo."""
+    instrumentacion.anotar_cache(False)
+    return cargar_tabla(file_name, columnas)
+
+def load_data(file_name, columnas=None):
     """Función para cargar y cachear datos."""
     try:
-        df = pd.read_csv(file_name)
-        # Convertir a categórico
-        if 'id' in df.columns:
-            df['id'] = df['id'].astype('category')
-        if 'prime' in df.columns:
-            df['prime'] = df['prime'].astype('category')
-        if 'target' in df.columns:
-            df['target'] = df['target'].astype('category')
-        return df
+        with instrumentacion.etapa("Carga CSV") as medicion:
+            datos = _cargar_tabla(file_name, columnas, firma_archivo(file_name))
+            medicion.acierto_si_no_calculado()
+        return datos
     except FileNotFoundError:
-        st.error(f"Error: Archivo '{file_name}' no encontrado. Asegúrate de que los archivos CSV estén en la carpeta correcta.")
+        st.error(f"Error: Archivo '{file_name}' no encontrado. Asegúrate de que los archivos de datos (CSV o xlsx) estén en la carpeta correcta.")
         return pd.DataFrame()
 
-def formatear_tabla_anova(anova_df):
+@st.cache_data(show_spinner=False)
+def _huella_tabla(file_name, columnas, firma):
+    """Huella del contenido que devuelve `load_data`; una vez por versión del archivo."""
+    return huella_dataframe(_cargar_tabla(file_name, columnas, firma))
+
+def huella_datos(file_name, columnas=None):
+    """Huella de `load_data(file_name, columnas)` sin recorrer el DataFrame en cada rerun."""
+    return _huella_tabla(file_name, columnas, firma_archivo(file_name))
+
+def mostrar_plotly(fig, **kwargs):
+    """`st.plotly_chart` cronometrado: la serialización de la figura a JSON es parte del rerun."""
+    with instrumentacion.etapa("Plotly"):
+        st.plotly_chart(fig, **kwargs)
+
+@st.cache_data(show_spinner=False)
+def _almacen_cacheado(file_name, dvs, firma):
+    """Estadísticos suficientes persistidos; si el CSV creció, solo se leen las filas nuevas."""
+    instrumentacion.anotar_cache(False)
+    return actualizar_almacen(file_name, list(dvs))[0]
+
+def almacen_incremental(file_name, dvs):
+    """Almacén del CSV, o None si no existe o es un archivo de ensayos o un libro de Excel."""
+    try:
+        if es_libro_excel(file_name) or es_archivo_ensayos(file_name):
+            return None
+        with instrumentacion.etapa("Almacén incremental") as medicion:
+            almacen = _almacen_cacheado(file_name, tuple(dvs), firma_archivo(file_name))
+            medicion.acierto_si_no_calculado()
+        return almacen
+    except FileNotFoundError:
+        return None
+
+def seccion_permutacion(data, dv, clave):
+    """Expander con la prueba de permutación sign-flip de la interacción prime × target."""
+    with st.expander("🎲 Prueba de Permutación (sign-flip) de la Interacción", expanded=False):
+        st.markdown(
+            "Alternativa no paramétrica a la F de la interacción: se invierte al azar el signo "
+            "del contraste de interacción de cada sujeto. Útil cuando los residuos no son normales."
+        )
+        n_perm = st.select_slider(
+            "Número de remuestreos", options=[10000, 20000, 50000, 100000, 500000],
+            value=10000, key=f"n_perm_{clave}"
+        )
+        if not st.toggle("Calcular prueba de permutación", key=f"perm_{clave}"):
+            planificador.cancelar_ranura(ranura(f"perm_{clave}"))
+            return
+        # Cambiar el número de remuestreos cancela el cálculo anterior de esta sesión
+        trabajo = planificador.enviar(
+            (huella_dataframe(data[['id', 'prime', 'target', dv]]), 'sign_flip', dv, n_perm),
+            prueba_signos_cacheada, data, dv, n_perm=n_perm, ranura=ranura(f"perm_{clave}"), con_progreso=True
+        )
+        resultado = resultado_o_espera(trabajo, "Remuestreando...")
+        if resultado is None:
+            return
+
+        col_f, col_param, col_exacto, col_mc = st.columns(4)
+        with col_f:
+            st.metric("F interacción", f"{resultado['F']:.3f}")
+        with col_param:
+            st.metric("p paramétrico", f"{resultado['p_parametrico']:.4f}")
+        with col_exacto:
+            p_exacto = resultado['p_exacto']
+            st.metric("p exacto", f"{p_exacto:.4f}" if p_exacto is not None else "—",
+                      help="Las 2^n asignaciones de signo (solo para n ≤ 40 sujetos).")
+        with col_mc:
+            st.metric("p Monte Carlo", f"{resultado['p_montecarlo']:.4f}",
+                      help=f"{resultado['n_perm']:,} remuestreos.")
+
+def trabajo_supuestos(df, dv, seccion):
     """
-    Formatea la salida de Pingouin para que coincida con la tabla estilo Minitab/SAS:
-    Source | DF | Adj SS | Adj MS | F-Value | P-Value
+    Residuos y supuestos de `df` como trabajo en segundo plano (el mismo que lanza el precálculo).
+
+    El trabajo ocupa la ranura `supuestos_<seccion>` de la sesión: si los datos
+    cambian (p. ej. con el filtro de ensayos) se suelta el anterior.
     """
-    # 1. Mapeo de nombres de columnas de Pingouin a tu formato deseado
-    nombres_nuevos = {
-        'Source': 'Source',
-        'DF': 'DF',      # Pingouin ya devuelve 'DF' cuando detailed=True
-        'SS': 'Adj SS',  # Sum of Squares -> Adj SS
-        'MS': 'Adj MS',  # Mean Square -> Adj MS
-        'F': 'F-Value',
-        'p-unc': 'P-Value'
-    }
-    
-    # 2. Seleccionar solo las columnas que existen en el mapeo
-    # (Filtramos np2 o eps que no están en tu imagen)
-    cols_a_mantener = [col for col in nombres_nuevos.keys() if col in anova_df.columns]
-    df_final = anova_df[cols_a_mantener].rename(columns=nombres_nuevos)
-    
-    # 3. Redondeo para estética (opcional, puedes ajustar los decimales)
-    # P-Value suele requerir más precisión, el resto 2 o 3 decimales.
-    return df_final
+    huella = huella_dataframe(df[['id', 'prime', 'target', dv]])
+    return planificador.enviar((huella, 'supuestos', dv), supuestos_cacheados, df, dv, ['prime', 'target'], 'id',
+                               ranura=ranura(f"supuestos_{seccion}"))
+
+@st.cache_data(show_spinner=False)
+def anova_voxeles_cacheado(ruta, mtime, _memoria_max_mb):
+    """
+    ANOVA voxel a voxel por bloques; `mtime` invalida la caché si cambia el archivo.
+
+    El presupuesto de memoria solo cambia el tamaño de bloque, no el resultado,
+    así que no forma parte de la clave (el guion bajo lo excluye de `st.cache_data`).
+    """
+    dir_salida = os.path.splitext(ruta)[0] + "_mapas"
+    resumen = anova_searchlight_voxeles(ruta, dir_salida, memoria_max_mb=_memoria_max_mb)
+    return resumen, dir_salida
 
 # Carga de todos los dataframes
-data_raw = load_data("ANOVA beh RT.csv")
-data_mvpa = load_data("ANOVA object-sensitive_WIT.csv")
-data_search = load_data("ANOVA searchlight_WIT.csv")
+# Datos conductuales: medias por run o un CSV de ensayos (también .gz / .zst)
+ARCHIVO_RT = os.environ.get("ARCHIVO_RT", "ANOVA beh RT.csv")
+
+data_raw = load_data(ARCHIVO_RT, COLUMNAS_RT)
+data_mvpa = load_data("ANOVA object-sensitive_WIT.csv", COLUMNAS_NEURO)
+data_search = load_data("ANOVA searchlight_WIT.csv", COLUMNAS_NEURO)
 
 # --- 2. PRE-PROCESAMIENTO Y FILTRADO (Manteniendo la lógica original) ---
 
 if not data_raw.empty:
-    data_limpia = data_raw.copy()
-    
-    # Filtrado de Outliers Conductuales
-    data_limpia_filtrada = data_limpia[
-        (data_limpia['rt_raw'] > 200) & (data_limpia['rt_raw'] < 2000)
-    ].copy()
+    # Filtrado de outliers conductuales: índice por RT para los controles de la barra lateral
+    huella_rt = huella_datos(ARCHIVO_RT, COLUMNAS_RT)
+    indice_rt = indice_cacheado(data_raw, huella=huella_rt)
     
     # Si los datos neuro están presentes, aplicar lógica de limpieza original (conversión de 'value')
-    def clean_neuro_data(df):
-        if not df.empty and 'value' in df.columns:
-            data = df.copy()
-            data['value'] = (data['value'].astype(str)
-                             .str.replace(r'\s+', '', regex=True)
-                             .str.replace(r'\.(?=.*\.)', '', regex=True)
-                             .astype(float))
-            # Asegurar factores
-            data['id'] = data['id'].astype('category')
-            data['prime'] = data['prime'].astype('category')
-            data['target'] = data['target'].astype('category')
-            return data
-        return df
-
     data_limpiamvpa = clean_neuro_data(data_mvpa)
     data_limpiasearch = clean_neuro_data(data_search)
 else:
@@ -177,6 +257,41 @@ with st.sidebar:
     st.markdown(" - Laura Camila Rodríguez G.")
     st.markdown("---")
     st.caption(f"Última Actualización: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M')}")
+    st.markdown("---")
+    # Estado de la caché de análisis (se rellena al final del script)
+    estado_cache = st.empty()
+    # Tiempos por pestaña y etapas del proceso (se rellenan al final del script)
+    estado_tiempos = st.empty()
+    estado_instrumentacion = st.empty()
+    if st.button("🔄 Invalidar caché de análisis"):
+        cache_analisis.invalidar()
+        st.rerun()
+    st.markdown("---")
+    # Filtro de ensayos: rango de RT, sujetos y runs (alimenta todas las pestañas)
+    data_limpia = filtrar_cacheado(data_raw, huella=huella_rt, **controles_filtros(indice_rt))
+    st.caption(f"{len(data_limpia):,} de {len(data_raw):,} filas tras el filtro.")
+    # Modo ligero: cajas calculadas en el servidor, puntos diezmados y WebGL
+    modo_ligero = st.toggle(
+        "⚡ Modo ligero (WebGL)",
+        value=len(data_limpia) > UMBRAL_FILAS_LIGERO,
+        help="Calcula las cajas en el servidor y envía al navegador como máximo el número de puntos indicado por gráfico.",
+    )
+    presupuesto_puntos = st.number_input(
+        "Máx. puntos por gráfico", min_value=500, max_value=200000,
+        value=PRESUPUESTO_PUNTOS, step=500, disabled=not modo_ligero,
+    )
+    presupuesto_qq = presupuesto_puntos if modo_ligero else None
+
+if data_limpia.empty:
+    st.warning("El filtro de ensayos no deja ninguna fila; amplía el rango de RT o incluye más sujetos / runs.")
+    st.stop()
+
+# Precálculo en segundo plano: los supuestos de las tres pestañas de ANOVA se
+# calculan mientras se pintan los KPIs y la pestaña visible (ver `trabajos.py`)
+for datos_previos, dv_previo, seccion in [(data_limpia, 'rt_log', 'rt'), (data_limpiamvpa, 'value', 'mvpa'),
+                                          (data_limpiasearch, 'value', 'search')]:
+    if not datos_previos.empty:
+        trabajo_supuestos(datos_previos, dv_previo, seccion)
 
 # --- 4. TÍTULO PRINCIPAL Y TABS ---
 st.markdown("# Sesgos Raciales en la Percepción de Objetos")
@@ -188,11 +303,21 @@ st.markdown("## Juan David Roa - Laura Camila Rodríguez G.")
 st.markdown("---")
 st.subheader("🎯 Indicadores Clave de Desempeño (KPIs) Conductuales")
 
-# Calcular métricas importantes
-total_participantes = data_limpia['id'].nunique()
-media_rt_general = data_limpia['rt_raw'].mean()
-media_rt_log_general = data_limpia['rt_log'].mean()
-desviacion_estandar_rt = data_limpia['rt_raw'].std()
+# Calcular métricas importantes (desde el almacén incremental cuando existe y el
+# filtro no descarta filas: el almacén resume el CSV completo)
+almacen_rt = almacen_incremental(ARCHIVO_RT, ['rt_raw', 'rt_log']) if len(data_limpia) == len(data_raw) else None
+if almacen_rt is not None:
+    kpis_rt = almacen_rt.kpis()
+    total_participantes = kpis_rt['total_participantes']
+    media_rt_general = kpis_rt['media']['rt_raw']
+    media_rt_log_general = kpis_rt['media']['rt_log']
+    desviacion_estandar_rt = kpis_rt['std']['rt_raw']
+else:
+    kpis_rt = cubo_cacheado(data_limpia).kpis()
+    total_participantes = kpis_rt['total_participantes']
+    media_rt_general = kpis_rt['media']['rt_raw']
+    media_rt_log_general = kpis_rt['media']['rt_log']
+    desviacion_estandar_rt = kpis_rt['std']['rt_raw']
 
 # Crear columnas para las métricas
 col_p, col_rt_mean, col_rt_log_mean, col_rt_std = st.columns(4)
@@ -210,19 +335,38 @@ st.markdown("---")
 # ==============================================================================
 # === FIN DE LA SECCIÓN KPI ===
 # ==============================================================================
+segundos_kpis = time.perf_counter() - inicio_script
+registrar_tiempo("Datos + KPIs", segundos_kpis)
+if almacen_rt is None:
+    # Sin almacén incremental la pestaña de ANOVA conductual usará este mismo cálculo
+    planificador.enviar(
+        (huella_dataframe(data_limpia[['id', 'prime', 'target', 'rt_log']]), 'rm_anova_rt'), rm_anova_cacheado,
+        data_limpia, dv='rt_log', within=['prime', 'target'], subject='id', postproceso=formatear_tabla_anova,
+        ranura=ranura("rm_anova_rt")
+    )
+else:
+    planificador.cancelar_ranura(ranura("rm_anova_rt"))
+instrumentacion.registrar("Datos + KPIs", segundos_kpis)
 
-tab_intro, tab_viz, tab_anova_beh, tab_anova_mvpa, tab_anova_search = st.tabs([
-    "📝 Introducción y Exploración", 
-    "📈 Visualización de Interacción", 
-    "📊 ANOVA Conductual (RT)", 
+# Solo se ejecuta la pestaña visible (ver `pestanas.py`)
+NOMBRES_PESTANAS = [
+    "📝 Introducción y Exploración",
+    "📈 Visualización de Interacción",
+    "📊 ANOVA Conductual (RT)",
     "🧠 ANOVA MVPA (Sensitive WIT)",
-    "🔍 ANOVA Searchlight (WIT)"
-])
+    "🔍 ANOVA Searchlight (WIT)",
+    "🔁 Réplicas Conductuales",
+    "🔋 Análisis de Potencia",
+    "🧮 Modelo Mixto"
+]
+pestana_activa = selector_pestanas(NOMBRES_PESTANAS)
+contenedor_pestana = st.container()
 
 # ==============================================================================
 # === TAB 1: INTRODUCCIÓN Y EXPLORACIÓN ===
 # ==============================================================================
-with tab_intro:
+@pestana("📝 Introducción y Exploración")
+def pestana_intro():
     st.header("Introducción y Contexto Experimental")
     st.write(
         "Este informe presenta un análisis exploratorio de datos (EDA) " 
@@ -243,18 +387,20 @@ with tab_intro:
     
     # Resumen Estadístico
     st.markdown("### Resumen Estadístico")
-    st.dataframe(data_raw.describe().round(2))
+    st.dataframe(describir_cacheado(data_raw).round(2))
     st.markdown("**Comentario**: Se verifican las variables y la ausencia de valores faltantes. El conjunto de datos contiene las columnas `prime`, `target`, `rt_raw` y `rt_log`, listas para el análisis.")
     
     # Balance
     st.markdown("### Balance del Diseño")
-    tabla = pd.crosstab(data_limpia['prime'], data_limpia['target'])
+    tabla = cubo_cacheado(data_limpia).balance()
     st.dataframe(tabla)
     st.markdown("**Comentario**: El diseño está balanceado: cada combinación de `prime` y `target` tiene el mismo número de observaciones, lo cual es necesario para un análisis de varianza válido.")
     
     st.markdown("---")
     
     st.header("Distribución de los Tiempos de Reacción (RT)")
+    # Sketches de cuantiles (cacheados) para los Q-Q plots
+    sketches_rt = sketches_cacheados(data_limpia, ['rt_raw', 'rt_log'])
     
     # --- Distribución Datos Brutos y Transformados ---
     col_raw_dist, col_log_dist = st.columns(2)
@@ -280,22 +426,25 @@ with tab_intro:
             template='plotly_white',
             height=300
         )
-        st.plotly_chart(fig_hist_raw, use_container_width=True, key="hist_raw")
+        mostrar_plotly(fig_hist_raw, use_container_width=True, key="hist_raw")
         
         # Q-Q Plot
-        qq_data = stats.probplot(data_limpia['rt_raw'], dist="norm")
+        qq_x, qq_y, qq_pendiente, qq_intercepto, _ = qq_desde_sketch(
+            sketches_rt['rt_raw'], presupuesto_qq or PUNTOS_QQ
+        )
         fig_qq_raw = go.Figure()
-        fig_qq_raw.add_trace(go.Scatter(
-            x=qq_data[0][0],
-            y=qq_data[0][1],
+        fig_qq_raw.add_trace(traza_puntos(
+            qq_x,
+            qq_y,
+            webgl=modo_ligero,
             mode='markers',
             marker=dict(color=COLOR_AZULITO, size=6),
             name='Datos'
         ))
         # Línea teórica
         fig_qq_raw.add_trace(go.Scatter(
-            x=qq_data[0][0],
-            y=qq_data[1][0] * qq_data[0][0] + qq_data[1][1],
+            x=qq_x,
+            y=qq_pendiente * qq_x + qq_intercepto,
             mode='lines',
             line=dict(color='black', width=2),
             name='Teórica'
@@ -311,7 +460,7 @@ with tab_intro:
             showlegend=False,
             height=300
         )
-        st.plotly_chart(fig_qq_raw, use_container_width=True, key="qq_raw")
+        mostrar_plotly(fig_qq_raw, use_container_width=True, key="qq_raw")
         st.markdown("**Comentario**: Los tiempos de reacción brutos muestran una fuerte asimetría positiva, lo que viola el supuesto de normalidad. Se justifica la transformación logarítmica.")
 
     with col_log_dist:
@@ -335,22 +484,25 @@ with tab_intro:
             template='plotly_white',
             height=300
         )
-        st.plotly_chart(fig_hist_log, use_container_width=True, key="hist_log")
+        mostrar_plotly(fig_hist_log, use_container_width=True, key="hist_log")
         
         # Q-Q Plot
-        qq_data = stats.probplot(data_limpia['rt_log'], dist="norm")
+        qq_x, qq_y, qq_pendiente, qq_intercepto, _ = qq_desde_sketch(
+            sketches_rt['rt_log'], presupuesto_qq or PUNTOS_QQ
+        )
         fig_qq_log = go.Figure()
-        fig_qq_log.add_trace(go.Scatter(
-            x=qq_data[0][0],
-            y=qq_data[0][1],
+        fig_qq_log.add_trace(traza_puntos(
+            qq_x,
+            qq_y,
+            webgl=modo_ligero,
             mode='markers',
             marker=dict(color=COLOR_ROSITA, size=6),
             name='Datos'
         ))
         # Línea teórica
         fig_qq_log.add_trace(go.Scatter(
-            x=qq_data[0][0],
-            y=qq_data[1][0] * qq_data[0][0] + qq_data[1][1],
+            x=qq_x,
+            y=qq_pendiente * qq_x + qq_intercepto,
             mode='lines',
             line=dict(color='black', width=2),
             name='Teórica'
@@ -366,13 +518,14 @@ with tab_intro:
             showlegend=False,
             height=300
         )
-        st.plotly_chart(fig_qq_log, use_container_width=True, key="qq_log")
+        mostrar_plotly(fig_qq_log, use_container_width=True, key="qq_log")
         st.markdown("**Comentario**: La transformación logarítmica mejora significativamente la normalidad de los datos, haciendo que la distribución se aproxime más a una normal. Es adecuada para análisis paramétricos posteriores.")
 
 # ==============================================================================
 # === TAB 2: VISUALIZACIÓN DE INTERACCIÓN (Mann-Whitney ELIMINADO) ===
 # ==============================================================================
-with tab_viz:
+@pestana("📈 Visualización de Interacción")
+def pestana_viz():
     st.header("Visualización Detallada de la Interacción Esperada")
 
     # --- Boxplot y Estadísticas ---
@@ -382,27 +535,43 @@ with tab_viz:
         st.subheader("Diagrama de Cajas de Tiempo de Respuesta (log)")
         # Generación del Boxplot con Plotly
         
-        fig_box = px.box(
-            data_limpia, 
-            x='prime', 
-            y='rt_log', 
-            color='target',
-            color_discrete_map={"gun": COLOR_PRIME_BLACK, "tool": COLOR_PRIME_WHITE},
-            title='Diagrama de cajas de tiempo de respuesta (log)',
-            labels={
-                'prime': 'Raza del prime',
-                'rt_log': 'Tiempo de respuesta (log)',
-                'target': 'Target'
-            },
-            points='all',  # Muestra todos los puntos
-            category_orders={'target': ['gun', 'tool']}
-        )
-        
-        fig_box.update_traces(
-            marker=dict(size=3, opacity=0.5),
-            boxmean=True
-        )
-        
+        if modo_ligero:
+            fig_box = figura_caja_ligera(
+                data_limpia, x='prime', y='rt_log', color='target',
+                colores={"gun": COLOR_PRIME_BLACK, "tool": COLOR_PRIME_WHITE},
+                nombres={'gun': 'Arma', 'tool': 'Herramienta'},
+                orden_color=['gun', 'tool'],
+                presupuesto=presupuesto_puntos,
+            )
+            fig_box.update_layout(
+                title='Diagrama de cajas de tiempo de respuesta (log)',
+                xaxis_title='Raza del prime',
+                yaxis_title='Tiempo de respuesta (log)',
+            )
+        else:
+            fig_box = px.box(
+                data_limpia, 
+                x='prime', 
+                y='rt_log', 
+                color='target',
+                color_discrete_map={"gun": COLOR_PRIME_BLACK, "tool": COLOR_PRIME_WHITE},
+                title='Diagrama de cajas de tiempo de respuesta (log)',
+                labels={
+                    'prime': 'Raza del prime',
+                    'rt_log': 'Tiempo de respuesta (log)',
+                    'target': 'Target'
+                },
+                points='all',  # Muestra todos los puntos
+                category_orders={'target': ['gun', 'tool']}
+            )
+            
+            fig_box.update_traces(
+                marker=dict(size=3, opacity=0.5),
+                boxmean=True
+            )
+            # Actualizar nombres en leyenda
+            fig_box.for_each_trace(lambda t: t.update(name='Arma' if t.name == 'gun' else 'Herramienta'))
+
         fig_box.update_layout(
             title_font_size=16,
             title_font_family="Times New Roman",
@@ -421,10 +590,7 @@ with tab_viz:
             yaxis=dict(title_font_size=14, gridcolor='rgba(0,0,0,0.1)')
         )
         
-        # Actualizar nombres en leyenda
-        fig_box.for_each_trace(lambda t: t.update(name='Arma' if t.name == 'gun' else 'Herramienta'))
-        
-        st.plotly_chart(fig_box, use_container_width=True, key="boxplot_main")
+        mostrar_plotly(fig_box, use_container_width=True, key="boxplot_main")
 
         # INTERPRETACIÓN MOVIDA AQUÍ (Bajo el Boxplot)
         st.markdown(
@@ -437,9 +603,11 @@ with tab_viz:
 
     with col2:
         st.subheader("Estadísticas por Grupo")
-        stats_df = data_limpia.groupby(['prime', 'target'])['rt_log'].agg([
-            'count', 'mean', 'std', 'median'
-        ]).round(3)
+        stats_df = resumen_por_grupo_cacheado(data_limpia, 'rt_log', ['prime', 'target'])
+        if almacen_rt is not None:
+            # count, mean y std actualizados incrementalmente (alineados por celda); la mediana sale del sketch
+            stats_df[['count', 'mean', 'std']] = almacen_rt.tabla_celdas('rt_log').reindex(stats_df.index)
+        stats_df = stats_df.round(3)
         st.dataframe(stats_df, use_container_width=True)
         
         st.subheader("Tests de Inferencia Univariados")
@@ -449,8 +617,42 @@ with tab_viz:
     
     st.header("Gráfico de Interacción - Prime vs Target")
     
-    # Calcular medias y errores estándar para el gráfico de interacción
-    interaction_data = data_limpia.groupby(['target', 'prime'])['rt_log'].agg(['mean', 'sem']).reset_index()
+    # Dataset y fuente de las barras de error
+    datasets_interaccion = {
+        "Conductual (RT)": (data_limpia, 'rt_log', 'Tiempo de respuesta (log)', 'TR (log)'),
+        "MVPA (Sensitive WIT)": (data_limpiamvpa, 'value', 'Valor MVPA', 'MVPA'),
+        "Searchlight (WIT)": (data_limpiasearch, 'value', 'Valor Searchlight', 'Searchlight'),
+    }
+    datasets_interaccion = {k: v for k, v in datasets_interaccion.items() if not v[0].empty}
+    col_ds, col_err, col_boot = st.columns(3)
+    with col_ds:
+        nombre_ds = st.selectbox("Datos", list(datasets_interaccion.keys()), key="interaccion_dataset")
+    with col_err:
+        fuente_error = st.selectbox(
+            "Barras de error",
+            ["Error estándar (SEM)", "IC 95% bootstrap (percentil)", "IC 95% bootstrap (BCa)"],
+            key="interaccion_error"
+        )
+    with col_boot:
+        n_boot = st.select_slider("Remuestreos bootstrap", options=[2000, 5000, 10000, 20000], value=10000,
+                                  key="interaccion_n_boot", disabled=fuente_error.startswith("Error"))
+    data_inter, dv_inter, etiqueta_y, etiqueta_titulo = datasets_interaccion[nombre_ds]
+
+    # Medias y errores estándar para el gráfico de interacción (del cubo del dataset)
+    interaction_data = (cubo_cacheado(data_inter).tabla_celdas(dv_inter, grupos=['target', 'prime'])
+                        [['mean', 'sem']].reset_index())
+    interaction_data['error_sup'] = interaction_data['sem']
+    interaction_data['error_inf'] = interaction_data['sem']
+
+    ic_boot = None
+    if not fuente_error.startswith("Error"):
+        # IC bootstrap por sujeto (una matriz de índices para las 4 celdas y el contraste)
+        metodo = 'bca' if 'BCa' in fuente_error else 'percentil'
+        ic_boot = ic_bootstrap_cacheado(data_inter, dv_inter, n_boot=n_boot)
+        celdas = ic_boot[ic_boot['prime'] != 'Interacción'][['prime', 'target', f'ic_inf_{metodo}', f'ic_sup_{metodo}']]
+        interaction_data = interaction_data.merge(celdas, on=['prime', 'target'], how='left')
+        interaction_data['error_sup'] = interaction_data[f'ic_sup_{metodo}'] - interaction_data['mean']
+        interaction_data['error_inf'] = interaction_data['mean'] - interaction_data[f'ic_inf_{metodo}']
     
     fig_interaction = go.Figure()
     
@@ -464,7 +666,8 @@ with tab_viz:
         fig_interaction.add_trace(go.Scatter(
             x=subset['target'],
             y=subset['mean'],
-            error_y=dict(type='data', array=subset['sem'], visible=True, width=4, thickness=2),
+            error_y=dict(type='data', symmetric=False, array=subset['error_sup'], arrayminus=subset['error_inf'],
+                         visible=True, width=4, thickness=2),
             mode='lines+markers',
             name=prime_val,
             line=dict(color=color, width=2),
@@ -479,8 +682,9 @@ with tab_viz:
         for idx, row in subset.iterrows():
             fig_interaction.add_annotation(
                 x=row['target'],
-                y=row['mean'] + 0.03,
-                text=f"{row['mean']:.2f}",
+                y=row['mean'],
+                yshift=24,
+                text=f"{row['mean']:.2f}" if dv_inter == 'rt_log' else f"{row['mean']:.4f}",
                 showarrow=False,
                 font=dict(size=10, family="Times New Roman", color='black'),
                 bgcolor='white',
@@ -489,12 +693,12 @@ with tab_viz:
             )
     
     fig_interaction.update_layout(
-        title='Interacción entre Prime y Target en TR (log)',
+        title=f'Interacción entre Prime y Target en {etiqueta_titulo}',
         title_font_size=18,
         title_font_family="Times New Roman",
         font_family="Times New Roman",
         xaxis_title='Target',
-        yaxis_title='Tiempo de respuesta (log)',
+        yaxis_title=etiqueta_y,
         xaxis=dict(title_font_size=14),
         yaxis=dict(title_font_size=14, gridcolor='rgba(0,0,0,0.1)'),
         template='plotly_white',
@@ -511,29 +715,43 @@ with tab_viz:
         hovermode='closest'
     )
     
-    st.plotly_chart(fig_interaction, use_container_width=True, key="interaction_plot")
+    mostrar_plotly(fig_interaction, use_container_width=True, key="interaction_plot")
     
-    st.markdown(
-        "**Comentario**: Este gráfico muestra claramente la no-paralelidad, indicando una interacción significativa entre prime y target: la línea para el prime Black (**Azul**) muestra una mayor separación entre herramientas y armas, mientras que la del prime White (**Rosa**) es más plana. Este patrón refleja que los participantes responden más lentamente a herramientas tras un prime Black, pero su velocidad para identificar armas no varía significativamente según el prime — evidencia conductual del sesgo racial implícito."
-    )
+    if ic_boot is not None:
+        fila_inter = ic_boot[ic_boot['prime'] == 'Interacción']
+        if not fila_inter.empty:
+            fila_inter = fila_inter.iloc[0]
+            st.caption(
+                f"Contraste de interacción (Black: gun − tool) − (White: gun − tool) = {fila_inter['mean']:.4f} · "
+                f"IC 95% percentil [{fila_inter['ic_inf_percentil']:.4f}, {fila_inter['ic_sup_percentil']:.4f}] · "
+                f"IC 95% BCa [{fila_inter['ic_inf_bca']:.4f}, {fila_inter['ic_sup_bca']:.4f}] "
+                f"({n_boot:,} remuestreos de sujetos)"
+            )
+    
+    if dv_inter == 'rt_log':
+        st.markdown(
+            "**Comentario**: Este gráfico muestra claramente la no-paralelidad, indicando una interacción significativa entre prime y target: la línea para el prime Black (**Azul**) muestra una mayor separación entre herramientas y armas, mientras que la del prime White (**Rosa**) es más plana. Este patrón refleja que los participantes responden más lentamente a herramientas tras un prime Black, pero su velocidad para identificar armas no varía significativamente según el prime — evidencia conductual del sesgo racial implícito."
+        )
 
 # ==============================================================================
 # === TAB 3: ANOVA CONDUCTUAL (RT) ===
 # ==============================================================================
-with tab_anova_beh:
+@pestana("📊 ANOVA Conductual (RT)")
+def pestana_anova_beh():
     st.header("📊 ANOVA de Medidas Repetidas: Tiempos de Reacción ($RT_{log}$)")
     
-    # --- CAMBIO 1: detailed=True para obtener SS y MS ---
-    anova_rt = pg.rm_anova(
-        data=data_limpia, 
-        dv='rt_log', 
-        within=['prime', 'target'], 
-        subject='id', 
-        detailed=True  # <--- IMPORTANTE: Esto genera las columnas SS, MS y DF
-    )
-    
-    # --- CAMBIO 2: Formatear usando la función auxiliar ---
-    tabla_final = formatear_tabla_anova(anova_rt)
+    # ANOVA desde el almacén incremental (o la caché de análisis para archivos de ensayos)
+    if almacen_rt is not None:
+        anova_rt = almacen_rt.anova('rt_log')
+        tabla_final = formatear_tabla_anova(anova_rt)
+    else:
+        anova_rt, tabla_final = rm_anova_cacheado(
+            data_limpia,
+            dv='rt_log',
+            within=['prime', 'target'],
+            subject='id',
+            postproceso=formatear_tabla_anova
+        )
     
     # Mostrar tabla
     st.subheader("Resultados ANOVA: Conductual")
@@ -565,144 +783,31 @@ with tab_anova_beh:
     
     st.markdown("---")
     
+    seccion_permutacion(data_limpia, 'rt_log', 'rt')
+    
     with st.expander("🔍 Ver Análisis de Supuestos (Residuos)", expanded=False):
         st.markdown("### Verificación de Supuestos del Modelo")
         
-        # CÁLCULO DE RESIDUOS 
-        y_bar_total = data_limpia['rt_log'].mean()
-        mean_sujeto = data_limpia.groupby('id')['rt_log'].mean().reset_index().rename(columns={'rt_log': 'y_bar_sujeto'})
-        mean_celda = data_limpia.groupby(['prime', 'target'])['rt_log'].mean().reset_index().rename(columns={'rt_log': 'y_bar_celda'})
-        
-        data_resid = data_limpia.merge(mean_sujeto, on='id').merge(mean_celda, on=['prime', 'target'])
-        data_resid['residual'] = data_resid['rt_log'] - data_resid['y_bar_celda'] - data_resid['y_bar_sujeto'] + y_bar_total
-        residuos = data_resid['residual']
-        
-        col_test, col_qq = st.columns([1, 2])
-        
-        with col_test:
-            st.markdown("#### Pruebas Estadísticas")
-            # Shapiro-Wilk
-            shapiro_stat, shapiro_p = shapiro(residuos)
-            st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
-            # Levene
-            grupos = [grupo['residual'].values for _, grupo in data_resid.groupby(['prime', 'target'])]
-            levene_stat, levene_p = levene(*grupos)
-            st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
-            
-            # Interpretación automática
-            st.markdown("---")
-            normalidad_ok = shapiro_p > 0.05
-            homogeneidad_ok = levene_p > 0.05
-            
-            if normalidad_ok and homogeneidad_ok:
-                st.success("✓ Los supuestos se cumplen adecuadamente")
-            elif normalidad_ok:
-                st.warning("⚠️ Normalidad OK, pero revisar homogeneidad")
-            elif homogeneidad_ok:
-                st.warning("⚠️ Homogeneidad OK, pero revisar normalidad")
-            else:
-                st.info("ℹ️ Considerar transformaciones adicionales")
-        
-        with col_qq:
-            st.markdown("#### Q-Q Plot de Residuos")
-            # Q-Q Plot Residuos con Plotly
-            qq_data = stats.probplot(residuos, dist="norm")
-            fig_qq = go.Figure()
-            fig_qq.add_trace(go.Scatter(
-                x=qq_data[0][0],
-                y=qq_data[0][1],
-                mode='markers',
-                marker=dict(color=COLOR_AZULITO, size=6),
-                name='Residuos'
-            ))
-            # Línea teórica
-            fig_qq.add_trace(go.Scatter(
-                x=qq_data[0][0],
-                y=qq_data[1][0] * qq_data[0][0] + qq_data[1][1],
-                mode='lines',
-                line=dict(color='black', width=2),
-                name='Teórica'
-            ))
-            fig_qq.update_layout(
-                title='',
-                title_font_family="Times New Roman",
-                font_family="Times New Roman",
-                xaxis_title='Cuantiles teóricos',
-                yaxis_title='Cuantiles muestrales',
-                template='plotly_white',
-                showlegend=False,
-                height=350
-            )
-            st.plotly_chart(fig_qq, use_container_width=True, key="qq_residuos_beh")
-
-# ==============================================================================
-# === TAB 4: ANOVA MVPA (Sensitive WIT) ===
-# ==============================================================================
-with tab_anova_mvpa:
-    st.header("🧠 ANOVA de Medidas Repetidas: MVPA - Sensitive WIT")
-    
-    if not data_limpiamvpa.empty:
-        # --- CAMBIO 1 ---
-        anova_mvpa = pg.rm_anova(
-            data=data_limpiamvpa, 
-            dv='value', 
-            within=['prime', 'target'], 
-            subject='id', 
-            detailed=True # <--- Activado
-        )
-        
-        # --- CAMBIO 2 ---
-        tabla_final_mvpa = formatear_tabla_anova(anova_mvpa)
-        
-        st.subheader("Resultados ANOVA: MVPA")
-        st.dataframe(
-            tabla_final_mvpa.style.format({
-                'Adj SS': '{:.3f}',
-                'Adj MS': '{:.3f}',
-                'F-Value': '{:.3f}',
-                'P-Value': '{:.4f}'
-            }),
-            hide_index=True,
-            use_container_width=True
-        )
+        # CÁLCULO DE RESIDUOS Y SUPUESTOS (motor compartido y cacheado)
+        supuestos_rt = resultado_o_espera(trabajo_supuestos(data_limpia, 'rt_log', 'rt'), "Calculando residuos y supuestos...")
+        if supuestos_rt is not None:
         
-        st.markdown("---")
+            col_test, col_qq = st.columns([1, 2])
         
-        with st.expander("🔍 Ver Análisis de Supuestos (Residuos)", expanded=False):
-            st.markdown("### Verificación de Supuestos del Modelo")
-            
-            # CÁLCULO DE RESIDUOS 
-            y_bar_total_mvpa = data_limpiamvpa['value'].mean()
-            mean_sujeto_mvpa = data_limpiamvpa.groupby('id')['value'].mean().reset_index().rename(columns={'value': 'y_bar_sujeto_mvpa'})
-            mean_celda_mvpa = data_limpiamvpa.groupby(['prime', 'target'])['value'].mean().reset_index().rename(columns={'value': 'y_bar_celda_mvpa'})
-            
-            data_resid_mvpa = (data_limpiamvpa
-                                .merge(mean_sujeto_mvpa, on='id')
-                                .merge(mean_celda_mvpa, on=['prime', 'target']))
-            
-            data_resid_mvpa['residual_mvpa'] = (data_resid_mvpa['value'] - 
-                                                data_resid_mvpa['y_bar_celda_mvpa'] - 
-                                                data_resid_mvpa['y_bar_sujeto_mvpa'] + 
-                                                y_bar_total_mvpa)
-            residuos_mvpa = data_resid_mvpa['residual_mvpa']
-            
-            col_test_mvpa, col_qq_mvpa = st.columns([1, 2])
-            
-            with col_test_mvpa:
+            with col_test:
                 st.markdown("#### Pruebas Estadísticas")
                 # Shapiro-Wilk
-                shapiro_stat, shapiro_p = shapiro(residuos_mvpa)
+                shapiro_p = supuestos_rt['shapiro_p']
                 st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
                 # Levene
-                grupos = [grupo['residual_mvpa'].values for _, grupo in data_resid_mvpa.groupby(['prime', 'target'])]
-                levene_stat, levene_p = levene(*grupos)
+                levene_p = supuestos_rt['levene_p']
                 st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
-                
+            
                 # Interpretación automática
                 st.markdown("---")
                 normalidad_ok = shapiro_p > 0.05
                 homogeneidad_ok = levene_p > 0.05
-                
+            
                 if normalidad_ok and homogeneidad_ok:
                     st.success("✓ Los supuestos se cumplen adecuadamente")
                 elif normalidad_ok:
@@ -711,28 +816,29 @@ with tab_anova_mvpa:
                     st.warning("⚠️ Homogeneidad OK, pero revisar normalidad")
                 else:
                     st.info("ℹ️ Considerar transformaciones adicionales")
-            
-            with col_qq_mvpa:
+        
+            with col_qq:
                 st.markdown("#### Q-Q Plot de Residuos")
-                # Q-Q Plot Residuos MVPA con Plotly
-                qq_data = stats.probplot(residuos_mvpa, dist="norm")
-                fig_qq_mvpa = go.Figure()
-                fig_qq_mvpa.add_trace(go.Scatter(
-                    x=qq_data[0][0],
-                    y=qq_data[0][1],
+                # Q-Q Plot Residuos con Plotly
+                qq_x, qq_y = puntos_qq(supuestos_rt['qq_teoricos'], supuestos_rt['qq_muestrales'], presupuesto_qq)
+                fig_qq = go.Figure()
+                fig_qq.add_trace(traza_puntos(
+                    qq_x,
+                    qq_y,
+                    webgl=modo_ligero,
                     mode='markers',
-                    marker=dict(color=COLOR_PRIME_BLACK, size=6),
+                    marker=dict(color=COLOR_AZULITO, size=6),
                     name='Residuos'
                 ))
                 # Línea teórica
-                fig_qq_mvpa.add_trace(go.Scatter(
-                    x=qq_data[0][0],
-                    y=qq_data[1][0] * qq_data[0][0] + qq_data[1][1],
+                fig_qq.add_trace(go.Scatter(
+                    x=qq_x,
+                    y=supuestos_rt['qq_pendiente'] * qq_x + supuestos_rt['qq_intercepto'],
                     mode='lines',
                     line=dict(color='black', width=2),
                     name='Teórica'
                 ))
-                fig_qq_mvpa.update_layout(
+                fig_qq.update_layout(
                     title='',
                     title_font_family="Times New Roman",
                     font_family="Times New Roman",
@@ -742,31 +848,142 @@ with tab_anova_mvpa:
                     showlegend=False,
                     height=350
                 )
-                st.plotly_chart(fig_qq_mvpa, use_container_width=True, key="qq_residuos_mvpa")
+                mostrar_plotly(fig_qq, use_container_width=True, key="qq_residuos_beh")
+
+# ==============================================================================
+# === TAB 4: ANOVA MVPA (Sensitive WIT) ===
+# ==============================================================================
+@pestana("🧠 ANOVA MVPA (Sensitive WIT)")
+def pestana_anova_mvpa():
+    st.header("🧠 ANOVA de Medidas Repetidas: MVPA - Sensitive WIT")
+    
+    if not data_limpiamvpa.empty:
+        almacen_mvpa = almacen_incremental("ANOVA object-sensitive_WIT.csv", ['value'])
+        if almacen_mvpa is not None:
+            anova_mvpa = almacen_mvpa.anova('value')
+            tabla_final_mvpa = formatear_tabla_anova(anova_mvpa)
+        else:
+            anova_mvpa, tabla_final_mvpa = rm_anova_cacheado(
+                data_limpiamvpa,
+                dv='value',
+                within=['prime', 'target'],
+                subject='id',
+                postproceso=formatear_tabla_anova
+            )
+        
+        st.subheader("Resultados ANOVA: MVPA")
+        reporte_value = data_limpiamvpa.attrs.get('reparacion_value')
+        if reporte_value:
+            st.caption(f"Limpieza de `value`: {reporte_value['reparadas']} de {reporte_value['celdas']} celdas reparadas.")
+        st.dataframe(
+            tabla_final_mvpa.style.format({
+                'Adj SS': '{:.3f}',
+                'Adj MS': '{:.3f}',
+                'F-Value': '{:.3f}',
+                'P-Value': '{:.4f}'
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+        
+        st.markdown("---")
+        
+        seccion_permutacion(data_limpiamvpa, 'value', 'mvpa')
+        
+        with st.expander("🔍 Ver Análisis de Supuestos (Residuos)", expanded=False):
+            st.markdown("### Verificación de Supuestos del Modelo")
+            
+            # CÁLCULO DE RESIDUOS Y SUPUESTOS (motor compartido y cacheado)
+            supuestos_mvpa = resultado_o_espera(trabajo_supuestos(data_limpiamvpa, 'value', 'mvpa'), "Calculando residuos y supuestos...")
+            if supuestos_mvpa is not None:
+            
+                col_test_mvpa, col_qq_mvpa = st.columns([1, 2])
+            
+                with col_test_mvpa:
+                    st.markdown("#### Pruebas Estadísticas")
+                    # Shapiro-Wilk
+                    shapiro_p = supuestos_mvpa['shapiro_p']
+                    st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
+                    # Levene
+                    levene_p = supuestos_mvpa['levene_p']
+                    st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
+                
+                    # Interpretación automática
+                    st.markdown("---")
+                    normalidad_ok = shapiro_p > 0.05
+                    homogeneidad_ok = levene_p > 0.05
+                
+                    if normalidad_ok and homogeneidad_ok:
+                        st.success("✓ Los supuestos se cumplen adecuadamente")
+                    elif normalidad_ok:
+                        st.warning("⚠️ Normalidad OK, pero revisar homogeneidad")
+                    elif homogeneidad_ok:
+                        st.warning("⚠️ Homogeneidad OK, pero revisar normalidad")
+                    else:
+                        st.info("ℹ️ Considerar transformaciones adicionales")
+            
+                with col_qq_mvpa:
+                    st.markdown("#### Q-Q Plot de Residuos")
+                    # Q-Q Plot Residuos MVPA con Plotly
+                    qq_x, qq_y = puntos_qq(supuestos_mvpa['qq_teoricos'], supuestos_mvpa['qq_muestrales'], presupuesto_qq)
+                    fig_qq_mvpa = go.Figure()
+                    fig_qq_mvpa.add_trace(traza_puntos(
+                        qq_x,
+                        qq_y,
+                        webgl=modo_ligero,
+                        mode='markers',
+                        marker=dict(color=COLOR_PRIME_BLACK, size=6),
+                        name='Residuos'
+                    ))
+                    # Línea teórica
+                    fig_qq_mvpa.add_trace(go.Scatter(
+                        x=qq_x,
+                        y=supuestos_mvpa['qq_pendiente'] * qq_x + supuestos_mvpa['qq_intercepto'],
+                        mode='lines',
+                        line=dict(color='black', width=2),
+                        name='Teórica'
+                    ))
+                    fig_qq_mvpa.update_layout(
+                        title='',
+                        title_font_family="Times New Roman",
+                        font_family="Times New Roman",
+                        xaxis_title='Cuantiles teóricos',
+                        yaxis_title='Cuantiles muestrales',
+                        template='plotly_white',
+                        showlegend=False,
+                        height=350
+                    )
+                    mostrar_plotly(fig_qq_mvpa, use_container_width=True, key="qq_residuos_mvpa")
     else:
         st.warning("Datos MVPA no cargados o no disponibles.")
 
 # ==============================================================================
 # === TAB 5: ANOVA SEARCHLIGHT (WIT) ===
 # ==============================================================================
-with tab_anova_search:
+@pestana("🔍 ANOVA Searchlight (WIT)")
+def pestana_anova_search():
     st.header("🔍 ANOVA de Medidas Repetidas: Searchlight WIT")
     
     if not data_limpiasearch.empty:
-        # CÁLCULO ANOVA
-        anova_search = pg.rm_anova(
-            data=data_limpiasearch, 
-            dv='value', 
-            within=['prime', 'target'], 
-            subject='id',
-            detailed=True
-        )
-        
-        # Formatear tabla usando la función auxiliar
-        tabla_final = formatear_tabla_anova(anova_search)
+        # CÁLCULO ANOVA (cacheado) y formato de tabla
+        almacen_search = almacen_incremental("ANOVA searchlight_WIT.csv", ['value'])
+        if almacen_search is not None:
+            anova_search = almacen_search.anova('value')
+            tabla_final = formatear_tabla_anova(anova_search)
+        else:
+            anova_search, tabla_final = rm_anova_cacheado(
+                data_limpiasearch,
+                dv='value',
+                within=['prime', 'target'],
+                subject='id',
+                postproceso=formatear_tabla_anova
+            )
         
         # Mostrar tabla
         st.subheader("Resultados ANOVA: Searchlight")
+        reporte_value = data_limpiasearch.attrs.get('reparacion_value')
+        if reporte_value:
+            st.caption(f"Limpieza de `value`: {reporte_value['reparadas']} de {reporte_value['celdas']} celdas reparadas.")
         st.dataframe(
             tabla_final.style.format({
                 'Adj SS': '{:.3f}',
@@ -780,80 +997,461 @@ with tab_anova_search:
         
         st.markdown("---")
         
+        seccion_permutacion(data_limpiasearch, 'value', 'search')
+        
         with st.expander("🔍 Ver Análisis de Supuestos (Residuos)", expanded=False):
             st.markdown("### Verificación de Supuestos del Modelo")
             
-            # CÁLCULO DE RESIDUOS 
-            y_bar_total_search = data_limpiasearch['value'].mean()
-            mean_sujeto_search = data_limpiasearch.groupby('id')['value'].mean().reset_index().rename(columns={'value': 'y_bar_sujeto_search'})
-            mean_celda_search = data_limpiasearch.groupby(['prime', 'target'])['value'].mean().reset_index().rename(columns={'value': 'y_bar_celda_search'})
-            
-            data_resid_search = (data_limpiasearch
-                                .merge(mean_sujeto_search, on='id')
-                                .merge(mean_celda_search, on=['prime', 'target']))
+            # CÁLCULO DE RESIDUOS Y SUPUESTOS (motor compartido y cacheado)
+            supuestos_search = resultado_o_espera(trabajo_supuestos(data_limpiasearch, 'value', 'search'), "Calculando residuos y supuestos...")
+            if supuestos_search is not None:
             
-            data_resid_search['residual_search'] = (data_resid_search['value'] - 
-                                                    data_resid_search['y_bar_celda_search'] - 
-                                                    data_resid_search['y_bar_sujeto_search'] + 
-                                                    y_bar_total_search)
-            residuos_search = data_resid_search['residual_search']
+                col_test_search, col_qq_search = st.columns([1, 2])
             
-            col_test_search, col_qq_search = st.columns([1, 2])
-            
-            with col_test_search:
-                st.markdown("#### Pruebas Estadísticas")
-                # Shapiro-Wilk
-                shapiro_stat, shapiro_p = shapiro(residuos_search)
-                st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
-                # Levene
-                grupos = [grupo['residual_search'].values for _, grupo in data_resid_search.groupby(['prime', 'target'])]
-                levene_stat, levene_p = levene(*grupos)
-                st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
+                with col_test_search:
+                    st.markdown("#### Pruebas Estadísticas")
+                    # Shapiro-Wilk
+                    shapiro_p = supuestos_search['shapiro_p']
+                    st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
+                    # Levene
+                    levene_p = supuestos_search['levene_p']
+                    st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
                 
-                # Interpretación automática
-                st.markdown("---")
-                normalidad_ok = shapiro_p > 0.05
-                homogeneidad_ok = levene_p > 0.05
+                    # Interpretación automática
+                    st.markdown("---")
+                    normalidad_ok = shapiro_p > 0.05
+                    homogeneidad_ok = levene_p > 0.05
                 
-                if normalidad_ok and homogeneidad_ok:
-                    st.success("✓ Los supuestos se cumplen adecuadamente")
-                elif normalidad_ok:
-                    st.warning("⚠️ Normalidad OK, pero revisar homogeneidad")
-                elif homogeneidad_ok:
-                    st.warning("⚠️ Homogeneidad OK, pero revisar normalidad")
-                else:
-                    st.info("ℹ️ Considerar transformaciones adicionales")
+                    if normalidad_ok and homogeneidad_ok:
+                        st.success("✓ Los supuestos se cumplen adecuadamente")
+                    elif normalidad_ok:
+                        st.warning("⚠️ Normalidad OK, pero revisar homogeneidad")
+                    elif homogeneidad_ok:
+                        st.warning("⚠️ Homogeneidad OK, pero revisar normalidad")
+                    else:
+                        st.info("ℹ️ Considerar transformaciones adicionales")
             
-            with col_qq_search:
-                st.markdown("#### Q-Q Plot de Residuos")
-                # Q-Q Plot Residuos Searchlight con Plotly
-                qq_data = stats.probplot(residuos_search, dist="norm")
-                fig_qq_search = go.Figure()
-                fig_qq_search.add_trace(go.Scatter(
-                    x=qq_data[0][0],
-                    y=qq_data[0][1],
-                    mode='markers',
-                    marker=dict(color=COLOR_PRIME_WHITE, size=6),
-                    name='Residuos'
-                ))
-                # Línea teórica
-                fig_qq_search.add_trace(go.Scatter(
-                    x=qq_data[0][0],
-                    y=qq_data[1][0] * qq_data[0][0] + qq_data[1][1],
-                    mode='lines',
-                    line=dict(color='black', width=2),
-                    name='Teórica'
-                ))
-                fig_qq_search.update_layout(
-                    title='',
-                    title_font_family="Times New Roman",
-                    font_family="Times New Roman",
-                    xaxis_title='Cuantiles teóricos',
-                    yaxis_title='Cuantiles muestrales',
-                    template='plotly_white',
-                    showlegend=False,
-                    height=350
-                )
-                st.plotly_chart(fig_qq_search, use_container_width=True, key="qq_residuos_search")
+                with col_qq_search:
+                    st.markdown("#### Q-Q Plot de Residuos")
+                    # Q-Q Plot Residuos Searchlight con Plotly
+                    qq_x, qq_y = puntos_qq(supuestos_search['qq_teoricos'], supuestos_search['qq_muestrales'], presupuesto_qq)
+                    fig_qq_search = go.Figure()
+                    fig_qq_search.add_trace(traza_puntos(
+                        qq_x,
+                        qq_y,
+                        webgl=modo_ligero,
+                        mode='markers',
+                        marker=dict(color=COLOR_PRIME_WHITE, size=6),
+                        name='Residuos'
+                    ))
+                    # Línea teórica
+                    fig_qq_search.add_trace(go.Scatter(
+                        x=qq_x,
+                        y=supuestos_search['qq_pendiente'] * qq_x + supuestos_search['qq_intercepto'],
+                        mode='lines',
+                        line=dict(color='black', width=2),
+                        name='Teórica'
+                    ))
+                    fig_qq_search.update_layout(
+                        title='',
+                        title_font_family="Times New Roman",
+                        font_family="Times New Roman",
+                        xaxis_title='Cuantiles teóricos',
+                        yaxis_title='Cuantiles muestrales',
+                        template='plotly_white',
+                        showlegend=False,
+                        height=350
+                    )
+                    mostrar_plotly(fig_qq_search, use_container_width=True, key="qq_residuos_search")
     else:
         st.warning("Datos Searchlight no cargados o no disponibles.")
+
+    st.markdown("---")
+
+    with st.expander("🧩 Modo voxel a voxel (mapas searchlight completos)", expanded=False):
+        st.markdown(
+            "Analiza un archivo `.npy` con forma `(voxeles, sujetos, prime, target)` "
+            "sin cargarlo completo en memoria: la interacción prime × target se calcula "
+            "por bloques y los mapas F/p se guardan en disco."
+        )
+        ruta_voxeles = st.text_input("Archivo de voxeles (.npy)", value="searchlight_voxeles.npy")
+        memoria_max_mb = st.slider("Memoria máxima por bloque (MB)", 32, 1024, 256, step=32)
+
+        if os.path.exists(ruta_voxeles):
+            try:
+                resumen_vox, dir_mapas = anova_voxeles_cacheado(
+                    ruta_voxeles, os.path.getmtime(ruta_voxeles), memoria_max_mb
+                )
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                col_v1, col_v2, col_v3, col_v4 = st.columns(4)
+                with col_v1:
+                    st.metric("Voxeles válidos", f"{resumen_vox['n_validos']:,}")
+                with col_v2:
+                    st.metric("F máxima", f"{resumen_vox['f_max']:.2f}" if resumen_vox['f_max'] is not None else "—")
+                with col_v3:
+                    st.metric("F media", f"{resumen_vox['f_media']:.2f}" if resumen_vox['f_media'] is not None else "—")
+                with col_v4:
+                    st.metric("p mínima", f"{resumen_vox['p_min']:.2e}" if resumen_vox['p_min'] is not None else "—")
+
+                alpha_vox = st.select_slider(
+                    "Umbral p (sin corregir)", options=[0.05, 0.01, 0.005, 0.001, 0.0001], value=0.001
+                )
+                n_umbral = contar_voxeles_umbral(os.path.join(dir_mapas, "p_interaccion.npy"), alpha_vox)
+                st.metric(f"Voxeles con p < {alpha_vox}", f"{n_umbral:,}")
+                st.caption(
+                    f"F({resumen_vox['ddof1']}, {resumen_vox['ddof2']}) · "
+                    f"Bonferroni (p < {resumen_vox['alpha']}): {resumen_vox['n_significativos_bonferroni']:,} voxeles · "
+                    f"Mapas guardados en `{dir_mapas}`"
+                )
+        else:
+            st.info("No se encontró el archivo de voxeles indicado.")
+
+# ==============================================================================
+# === TAB 6: RÉPLICAS CONDUCTUALES ===
+# ==============================================================================
+@pestana("🔁 Réplicas Conductuales")
+def pestana_replicas():
+    st.header("🔁 Réplicas Conductuales: Interacción Prime × Target")
+
+    rutas_replicas = descubrir_replicaciones()
+    if not rutas_replicas:
+        st.info(
+            f"No se encontraron réplicas (`{PATRON}`) en `{DIR_REPLICACIONES}`. "
+            "Indica otra carpeta con la variable de entorno `DIR_REPLICACIONES`."
+        )
+        return
+
+    dv_rep = st.radio(
+        "Variable dependiente", ['rt_log', 'rt_raw'], horizontal=True,
+        format_func={'rt_log': 'RT (log)', 'rt_raw': 'RT (ms)'}.get, key="dv_replicas"
+    )
+
+    # Estudio principal y réplicas (cada réplica se analiza una vez por versión del archivo)
+    columnas_principal = [c for c in ['id', 'prime', 'target', 'rt_raw', 'rt_log', 'n_ensayos'] if c in data_limpia.columns]
+    principal = cache_analisis.obtener(
+        (huella_dataframe(data_limpia[columnas_principal]), 'resumen_interaccion'),
+        lambda: resumen_interaccion(data_limpia)
+    )
+    with st.spinner(f"Analizando {len(rutas_replicas)} réplicas..."):
+        replicas = analizar_replicaciones(rutas_replicas)
+    estudios = [('Estudio principal', principal)] + [(r['nombre'], r) for r in replicas]
+
+    # Tabla comparativa de la interacción
+    comparacion = pd.DataFrame([
+        {'Estudio': nombre, 'N': r['interaccion'][dv_rep]['n_sujetos'],
+         'F': r['interaccion'][dv_rep]['F'], 'P-Value': r['interaccion'][dv_rep]['p'],
+         'η²G': r['interaccion'][dv_rep]['ng2'], 'Contraste': r['interaccion'][dv_rep]['contraste'],
+         'IC 95% inf': r['interaccion'][dv_rep]['ic_inf'], 'IC 95% sup': r['interaccion'][dv_rep]['ic_sup'],
+         'dz': r['interaccion'][dv_rep]['dz']}
+        for nombre, r in estudios
+    ])
+    st.subheader("Comparación de la Interacción")
+    st.dataframe(
+        comparacion.style.format({
+            'F': '{:.3f}', 'P-Value': '{:.4f}', 'η²G': '{:.4f}', 'Contraste': '{:.4f}',
+            'IC 95% inf': '{:.4f}', 'IC 95% sup': '{:.4f}', 'dz': '{:.3f}'
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption(
+        "Contraste por sujeto: (Black-gun − Black-tool) − (White-gun − White-tool). "
+        "dz = media del contraste / su desviación estándar."
+    )
+
+    col_forest, col_celdas = st.columns(2)
+
+    with col_forest:
+        # Forest plot del contraste de interacción
+        fig_forest = go.Figure(go.Scatter(
+            x=comparacion['Contraste'],
+            y=comparacion['Estudio'],
+            mode='markers',
+            marker=dict(color=[COLOR_PRIME_BLACK] + [COLOR_PRIME_WHITE] * len(replicas), size=12, symbol='square'),
+            error_x=dict(
+                type='data', symmetric=False,
+                array=comparacion['IC 95% sup'] - comparacion['Contraste'],
+                arrayminus=comparacion['Contraste'] - comparacion['IC 95% inf'],
+                color='black', thickness=1.5, width=6
+            )
+        ))
+        fig_forest.add_vline(x=0, line_dash='dash', line_color='gray')
+        fig_forest.update_layout(
+            title='Contraste de interacción (IC 95%)',
+            title_font_family="Times New Roman",
+            font_family="Times New Roman",
+            xaxis_title='Contraste de interacción',
+            yaxis=dict(autorange='reversed'),
+            template='plotly_white',
+            height=400
+        )
+        mostrar_plotly(fig_forest, use_container_width=True, key="forest_replicas")
+
+    with col_celdas:
+        # Medias por celda de cada estudio
+        celdas = pd.concat(
+            [r['celdas'].assign(Estudio=nombre) for nombre, r in estudios], ignore_index=True
+        )
+        fig_celdas = px.line(
+            celdas, x='target', y=dv_rep, color='prime', facet_col='Estudio',
+            markers=True,
+            color_discrete_map={'Black': COLOR_PRIME_BLACK, 'White': COLOR_PRIME_WHITE}
+        )
+        fig_celdas.update_layout(
+            title='Medias por celda',
+            title_font_family="Times New Roman",
+            font_family="Times New Roman",
+            template='plotly_white',
+            height=400
+        )
+        mostrar_plotly(fig_celdas, use_container_width=True, key="celdas_replicas")
+
+    for r in replicas:
+        with st.expander(f"📄 ANOVA completo: {r['nombre']} (`{os.path.basename(r['archivo'])}`)", expanded=False):
+            anova_rep = r['anova'][r['anova']['DV'] == dv_rep]
+            st.dataframe(
+                formatear_tabla_anova(anova_rep).style.format({
+                    'Adj SS': '{:.3f}',
+                    'Adj MS': '{:.3f}',
+                    'F-Value': '{:.3f}',
+                    'P-Value': '{:.4f}'
+                }),
+                hide_index=True,
+                use_container_width=True
+            )
+            if 'n_ensayos' in r:
+                st.caption(f"{r['n_ensayos']:,} ensayos tras el filtro 200 < RT < 2000 ms.")
+
+# ==============================================================================
+# === TAB 7: ANÁLISIS DE POTENCIA ===
+# ==============================================================================
+@pestana("🔋 Análisis de Potencia")
+def pestana_potencia():
+    st.header("🔋 Análisis de Potencia: Interacción Prime × Target")
+    st.markdown(
+        "¿Cuántos participantes necesita una réplica para detectar la interacción observada? "
+        "Las medias por celda y las covarianzas entre celdas se estiman del dataset actual; "
+        "para cada tamaño muestral se simulan miles de estudios y se cuenta la proporción "
+        "con interacción significativa."
+    )
+
+    col_dv, col_metodo = st.columns(2)
+    with col_dv:
+        dv_pot = st.radio(
+            "Variable dependiente", ['rt_log', 'rt_raw'], horizontal=True,
+            format_func={'rt_log': 'RT (log)', 'rt_raw': 'RT (ms)'}.get, key="dv_potencia"
+        )
+    with col_metodo:
+        metodo = st.radio(
+            "Generación de sujetos", METODOS, horizontal=True, key="metodo_potencia",
+            format_func={'normal': 'Normal multivariante', 'remuestreo': 'Remuestreo de sujetos'}.get,
+            help="El remuestreo conserva la asimetría y las colas de los sujetos observados."
+        )
+
+    col_rango, col_paso, col_sims = st.columns(3)
+    with col_rango:
+        n_min, n_max = st.slider("Rango de participantes", 6, 300, (10, 120), key="rango_potencia")
+    with col_paso:
+        paso = st.number_input("Paso", min_value=1, max_value=50, value=10, key="paso_potencia")
+    with col_sims:
+        n_sims = st.select_slider(
+            "Simulaciones por tamaño", options=[1000, 2000, 5000, 10000], value=2000, key="sims_potencia"
+        )
+
+    col_alpha, col_escala = st.columns(2)
+    with col_alpha:
+        alpha = st.select_slider("α", options=[0.001, 0.005, 0.01, 0.05, 0.1], value=0.05, key="alpha_potencia")
+    with col_escala:
+        escala = st.slider(
+            "Escala del efecto de interacción", 0.25, 2.0, 1.0, 0.05, key="escala_potencia",
+            help="1 = efecto observado; < 1 simula un efecto real menor (p. ej. por sesgo de publicación)."
+        )
+
+    if not st.toggle("Calcular curva de potencia", key="calcular_potencia"):
+        planificador.cancelar_ranura(ranura("potencia"))
+        return
+
+    tamanos = list(range(n_min, n_max + 1, int(paso)))
+    # Cambiar cualquier parámetro cancela la simulación anterior de esta sesión
+    trabajo = planificador.enviar(
+        (huella_dataframe(data_limpia[['id', 'prime', 'target', dv_pot]]), 'potencia', dv_pot, tuple(tamanos),
+         n_sims, metodo, escala, alpha),
+        curva_potencia_cacheada, data_limpia, dv_pot, tamanos, n_sims=n_sims, metodo=metodo, escala=escala,
+        alpha=alpha, ranura=ranura("potencia"), con_progreso=True
+    )
+    tabla = resultado_o_espera(trabajo, "Simulando...")
+    if tabla is None:
+        return
+
+    interaccion = tabla[tabla['efecto'] == 'prime * target']
+    n_necesario = n_para_potencia(tabla, 0.8)
+    col_n, col_obs = st.columns(2)
+    with col_n:
+        st.metric("N para potencia 0.80", f"{n_necesario}" if n_necesario is not None else f"> {n_max}")
+    with col_obs:
+        n_actual = data_limpia['id'].nunique()
+        fila = interaccion.iloc[(interaccion['n_sujetos'] - n_actual).abs().argmin()]
+        st.metric(f"Potencia con N ≈ {fila['n_sujetos']}", f"{fila['potencia']:.2f}",
+                  help=f"El estudio principal tiene {n_actual} participantes.")
+
+    fig_potencia = go.Figure([
+        go.Scatter(
+            x=list(interaccion['n_sujetos']) + list(interaccion['n_sujetos'][::-1]),
+            y=list(interaccion['ic_sup']) + list(interaccion['ic_inf'][::-1]),
+            fill='toself', fillcolor='rgba(31, 119, 180, 0.2)', line=dict(width=0),
+            hoverinfo='skip', name='IC 95%'
+        ),
+        go.Scatter(
+            x=interaccion['n_sujetos'], y=interaccion['potencia'], mode='lines+markers',
+            line=dict(color=COLOR_PRIME_BLACK), name='Simulada'
+        ),
+        go.Scatter(
+            x=interaccion['n_sujetos'], y=interaccion['potencia_analitica'], mode='lines',
+            line=dict(color=COLOR_PRIME_WHITE, dash='dash'), name='Analítica (t no central)'
+        ),
+    ])
+    fig_potencia.add_hline(y=0.8, line_dash='dot', line_color='gray')
+    fig_potencia.update_layout(
+        title='Curva de potencia de la interacción',
+        title_font_family="Times New Roman",
+        font_family="Times New Roman",
+        xaxis_title='Número de participantes',
+        yaxis=dict(title='Potencia', range=[0, 1.02]),
+        template='plotly_white',
+        height=450
+    )
+    mostrar_plotly(fig_potencia, use_container_width=True, key="curva_potencia")
+
+    with st.expander("📄 Potencia de todos los efectos", expanded=False):
+        st.dataframe(
+            tabla.pivot(index='n_sujetos', columns='efecto', values='potencia').style.format('{:.3f}'),
+            use_container_width=True
+        )
+
+# ==============================================================================
+# === TAB 8: MODELO MIXTO ===
+# ==============================================================================
+@pestana("🧮 Modelo Mixto")
+def pestana_mixto():
+    st.header("🧮 Modelo Lineal Mixto: RT ~ Prime × Target")
+    st.markdown(
+        "A diferencia del RM-ANOVA, que usa las medias por celda, el modelo mixto usa todas las "
+        "observaciones (runs o ensayos) con interceptos y pendientes aleatorias por participante. "
+        "Los factores se codifican ±0.5: cada coeficiente es una diferencia de medias y el de la "
+        "interacción, la diferencia de diferencias."
+    )
+
+    rutas_replicas = descubrir_replicaciones()
+    col_fuente, col_dv = st.columns(2)
+    with col_fuente:
+        fuente = st.selectbox(
+            "Datos", [None] + rutas_replicas, key="fuente_mixto",
+            format_func=lambda r: "Estudio principal (nivel run)" if r is None
+            else f"{nombre_replicacion(r)} (nivel ensayo)"
+        )
+    with col_dv:
+        dv_mixto = st.radio(
+            "Variable dependiente", ['rt_log', 'rt_raw'], horizontal=True,
+            format_func={'rt_log': 'RT (log)', 'rt_raw': 'RT (ms)'}.get, key="dv_mixto"
+        )
+    col_estructura, col_reml = st.columns(2)
+    with col_estructura:
+        estructura = st.radio(
+            "Efectos aleatorios por participante", list(ESTRUCTURAS), key="estructura_mixto",
+            format_func={'intercepto': 'Intercepto', 'pendientes': 'Intercepto + pendientes de prime y target',
+                         'maxima': 'Máxima (incluye la interacción)'}.get
+        )
+    with col_reml:
+        reml = st.radio("Estimación", [True, False], horizontal=True, key="reml_mixto",
+                        format_func={True: 'REML', False: 'Máxima verosimilitud'}.get)
+
+    if not st.toggle("Ajustar modelo mixto", key="ajustar_mixto"):
+        planificador.cancelar_ranura(ranura("modelo_mixto"))
+        return
+
+    datos = data_limpia if fuente is None else load_data(fuente)
+    if datos.empty:
+        return
+    trabajo = ajustar_en_segundo_plano(datos, dv_mixto, estructura, reml, ranura=ranura("modelo_mixto"))
+    modelo = resultado_o_espera(trabajo, "Ajustando el modelo mixto en segundo plano...")
+    if modelo is None:
+        return
+
+    col_obs, col_suj, col_ll, col_aic = st.columns(4)
+    with col_obs:
+        st.metric("Observaciones", f"{modelo['n_obs']:,}", help=f"{modelo['n_celdas']} celdas sujeto × condición.")
+    with col_suj:
+        st.metric("Participantes", modelo['n_sujetos'])
+    with col_ll:
+        st.metric("log-verosimilitud", f"{modelo['loglik']:.2f}")
+    with col_aic:
+        st.metric("AIC", f"{modelo['aic']:.2f}", help=f"BIC = {modelo['bic']:.2f}")
+    if modelo['singular']:
+        st.warning("⚠️ Ajuste singular: alguna varianza aleatoria es prácticamente cero. "
+                   "Considera una estructura más simple.")
+
+    st.subheader("Efectos Fijos")
+    st.dataframe(
+        modelo['fijos'].style.format({
+            'Estimación': '{:.4f}', 'EE': '{:.4f}', 'z': '{:.3f}', 'P-Value': '{:.4f}',
+            'IC 95% inf': '{:.4f}', 'IC 95% sup': '{:.4f}'
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+    col_aleatorios, col_blups = st.columns(2)
+    with col_aleatorios:
+        st.subheader("Efectos Aleatorios")
+        st.dataframe(modelo['aleatorios'].style.format({'DE': '{:.4f}'}), hide_index=True, use_container_width=True)
+        if len(modelo['correlaciones']) > 1:
+            st.caption("Correlaciones entre efectos aleatorios")
+            st.dataframe(modelo['correlaciones'].style.format('{:.3f}'), use_container_width=True)
+    with col_blups:
+        efecto = st.selectbox("Efecto aleatorio", list(modelo['blups'].columns), key="blup_mixto")
+        blups = modelo['blups'][efecto].sort_values().reset_index()
+        blups['orden'] = range(len(blups))
+        fig_blups = px.scatter(blups, x=efecto, y='orden', hover_data=['id'])
+        fig_blups.update_traces(marker=dict(color=COLOR_PRIME_BLACK, size=8))
+        fig_blups.add_vline(x=0, line_dash='dash', line_color='gray')
+        fig_blups.update_layout(
+            title='Efectos aleatorios predichos por participante',
+            title_font_family="Times New Roman",
+            font_family="Times New Roman",
+            yaxis=dict(title='Participante (ordenado)', showticklabels=False),
+            template='plotly_white',
+            height=400
+        )
+        mostrar_plotly(fig_blups, use_container_width=True, key="blups_mixto")
+
+    st.caption(
+        f"Ajuste en {modelo['segundos']:.2f} s ({modelo['evaluaciones']} evaluaciones de la desviación); "
+        "p-valores de Wald (z)."
+    )
+
+with contenedor_pestana:
+    dict(zip(NOMBRES_PESTANAS, [
+        pestana_intro, pestana_viz, pestana_anova_beh, pestana_anova_mvpa, pestana_anova_search,
+        pestana_replicas, pestana_potencia, pestana_mixto
+    ]))[pestana_activa]()
+
+# Tiempos: datos + KPIs frente a la pestaña visible
+estado_tiempos.dataframe(tabla_tiempos().round(3), use_container_width=True)
+
+# Contadores de la caché tras ejecutar la pestaña visible
+stats_cache = cache_analisis.estadisticas()
+stats_trabajos = planificador.estadisticas()
+estado_cache.caption(
+    f"Caché de análisis: {stats_cache['aciertos']} aciertos · "
+    f"{stats_cache['fallos']} fallos · {stats_cache['entradas']} entradas  \n"
+    f"Trabajos: {stats_trabajos['en_curso']} en curso · {stats_trabajos['en_cola']} en cola · "
+    f"{stats_trabajos['cancelados']} cancelados"
+)
+
+# Etapas del proceso y latencia del rerun completo
+instrumentacion.registrar("Rerun completo", time.perf_counter() - inicio_script)
+instrumentacion.volcar_prometheus()
+with estado_instrumentacion.container():
+    panel_instrumentacion()
@@ -0,0 +1,259 @@
+"""
+Benchmarks del camino de cálculo del dashboard.
+
+Mide tiempo (mínimo y mediana de varias repeticiones) y memoria máxima
+(`tracemalloc`, en una pasada aparte para no contaminar los tiempos) de:
+
+* `load_data` (lo que ejecuta en un fallo de caché: `cargar_tabla`, en frío
+  desde el CSV y en caliente desde el Parquet de `.cache_datos/`),
+* `clean_neuro_data`,
+* `pg.rm_anova` (un DV por llamada) y el motor vectorizado `rm_anova_rapido`,
+* los residuos y supuestos (`residuos_y_supuestos`),
+* `formatear_tabla_anova`,
+* los constructores de figuras de `figuras_mpl` y `graficos_ligeros`.
+
+Los datos son sintéticos: un diseño prime × target con una fila por sujeto y
+celda. Se recorren dos ejes por separado, número de sujetos (con un DV) y
+número de DVs (con 30 sujetos); la combinación 100k sujetos × 10k DVs
+ocuparía decenas de GB. `tracemalloc` solo ve la memoria reservada a través
+de Python/NumPy, no la del pool de Arrow.
+
+Uso:
+    python benchmark.py [--salida bench.json] [--sujetos 30 300 ...] [--dvs 1 10 ...]
+    python benchmark.py --comparar anterior.json nuevo.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+import pingouin as pg
+
+from anova_vectorizado import rm_anova_rapido
+from figuras_mpl import (caja_con_puntos, histograma_y_qq, interaccion_puntos,
+                         pedido_qq_residuos, renderizar)
+from graficos_ligeros import figura_caja_ligera
+from ingesta import DIR_CACHE
+from preparacion import cargar_tabla, clean_neuro_data, formatear_tabla_anova
+from sketch_cuantiles import qq_desde_sketch, sketch_de
+from supuestos import residuos_y_supuestos
+
+SUJETOS = [30, 300, 3000, 30000, 100000]
+DVS = [1, 10, 100, 1000, 10000]
+SUJETOS_EJE_DVS = 30
+REPETICIONES = 3
+# pg.rm_anova se llama una vez por DV: por encima de este número se omite
+MAX_DVS_PINGOUIN = 100
+UMBRAL_REGRESION = 1.2
+PAQUETES = ['numpy', 'pandas', 'pyarrow', 'pingouin', 'scipy', 'matplotlib', 'seaborn', 'plotly']
+
+
+def datos_sinteticos(n_sujetos, n_dvs, semilla=0):
+    """
+    DataFrame largo `id, run, prime, target, rt_raw, rt_log, value` más `dv_1 ... dv_{n_dvs-1}`.
+
+    `rt_log` tiene un efecto de target y una interacción pequeña; `value` es
+    texto con algunos valores sucios (espacios, dobles puntos) como en los CSV
+    de MVPA, para que `clean_neuro_data` tenga trabajo.
+    """
+    rng = np.random.default_rng(semilla)
+    n = n_sujetos * 4
+    prime = np.tile(['Black', 'Black', 'White', 'White'], n_sujetos)
+    target = np.tile(['gun', 'tool', 'gun', 'tool'], n_sujetos)
+    efecto = np.tile([0.0, 0.06, 0.0, 0.03], n_sujetos)
+    sujeto = np.repeat(rng.normal(0, 0.1, n_sujetos), 4)
+    rt_log = 6.2 + sujeto + efecto + rng.normal(0, 0.05, n)
+    valores = rng.normal(0.55, 0.05, n)
+
+    value = np.char.mod('%.6f', valores).astype(object)
+    sucias = rng.random(n) < 0.05
+    value[sucias] = [f' {v[:3]}.{v[3:]} ' for v in value[sucias]]
+
+    columnas = {
+        'id': np.repeat(np.arange(n_sujetos), 4), 'run': 1, 'prime': prime, 'target': target,
+        'rt_raw': np.exp(rt_log), 'rt_log': rt_log, 'value': value,
+    }
+    if n_dvs > 1:
+        extra = sujeto[:, None] + rng.normal(0, 0.05, (n, n_dvs - 1))
+        columnas.update({f'dv_{i}': extra[:, i - 1] for i in range(1, n_dvs)})
+    return pd.DataFrame(columnas)
+
+
+def medir(funcion, repeticiones=REPETICIONES, preparar=None):
+    """Tiempos de `repeticiones` llamadas y pico de memoria (MB) de una llamada más."""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    if preparar is not None:
+        preparar()
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'segundos_min': min(tiempos),
+        'segundos_mediana': float(np.median(tiempos)),
+        'repeticiones': repeticiones,
+        'memoria_pico_mb': pico / 2**20,
+    }
+
+
+def casos(df, dvs, ruta_csv):
+    """Pares `(nombre, funcion, preparar)` a medir sobre un dataset."""
+    within, subject = ['prime', 'target'], 'id'
+    anova = rm_anova_rapido(df, dvs, within, subject)
+    datos_fig = df[['prime', 'target', 'rt_log']]
+    sup = residuos_y_supuestos(df, 'rt_log', within, subject)
+
+    def borrar_cache():
+        shutil.rmtree(DIR_CACHE, ignore_errors=True)
+
+    def cargar_en_caliente():
+        if not os.path.exists(DIR_CACHE):
+            cargar_tabla(ruta_csv)
+
+    lista = [
+        ('load_data (frío)', lambda: cargar_tabla(ruta_csv), borrar_cache),
+        ('load_data (caliente)', lambda: cargar_tabla(ruta_csv), cargar_en_caliente),
+        ('clean_neuro_data', lambda: clean_neuro_data(df[['id', 'prime', 'target', 'value']]), None),
+        ('rm_anova_rapido', lambda: rm_anova_rapido(df, dvs, within, subject), None),
+    ]
+    if len(dvs) <= MAX_DVS_PINGOUIN:
+        lista.append(('pg.rm_anova', lambda: [
+            pg.rm_anova(data=df, dv=dv, within=within, subject=subject, detailed=True) for dv in dvs
+        ], None))
+    lista += [
+        ('residuos_y_supuestos', lambda: residuos_y_supuestos(df, dvs, within, subject), None),
+        ('formatear_tabla_anova', lambda: formatear_tabla_anova(anova), None),
+    ]
+    if len(dvs) == 1:
+        qq = qq_desde_sketch(sketch_de(df['rt_log'].to_numpy()))[:4]
+        colores = {"gun": '#3949AB', "tool": '#E91E63'}
+        lista += [
+            ('fig histograma_y_qq', lambda: renderizar(histograma_y_qq, dict(
+                valores=df['rt_log'].to_numpy(), qq=qq, color='#F8BBD0',
+                titulo='Datos Transformados', etiqueta_x='log(Tiempo de reacción)')), None),
+            ('fig caja_con_puntos', lambda: renderizar(caja_con_puntos, dict(datos=datos_fig, colores=colores)), None),
+            ('fig interaccion_puntos', lambda: renderizar(interaccion_puntos, dict(
+                datos=datos_fig, colores={"Black": '#3949AB', "White": '#E91E63'})), None),
+            ('fig qq_residuos', lambda: renderizar(*pedido_qq_residuos(sup, '#A5D6A7', 'Q-Q')), None),
+            ('fig figura_caja_ligera', lambda: figura_caja_ligera(
+                df, x='prime', y='rt_log', color='target', colores=colores).to_json(), None),
+        ]
+    return lista
+
+
+def ejecutar(sujetos=SUJETOS, dvs=DVS, repeticiones=REPETICIONES, progreso=print):
+    """Recorre los dos ejes (sujetos con 1 DV, DVs con 30 sujetos) y devuelve los resultados."""
+    configuraciones = [(n, 1) for n in sujetos] + [(SUJETOS_EJE_DVS, k) for k in dvs if k > 1]
+    resultados = []
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # La caché Parquet de `ingesta` es relativa al directorio de trabajo
+        os.chdir(tmp)
+        try:
+            for n_sujetos, n_dvs in configuraciones:
+                df = datos_sinteticos(n_sujetos, n_dvs)
+                dvs_df = ['rt_log'] + [f'dv_{i}' for i in range(1, n_dvs)]
+                ruta_csv = os.path.join(tmp, f'sintetico_{n_sujetos}_{n_dvs}.csv')
+                df.to_csv(ruta_csv, index=False)
+                for nombre, funcion, preparar in casos(df, dvs_df, ruta_csv):
+                    medida = medir(funcion, repeticiones, preparar)
+                    resultados.append({'funcion': nombre, 'n_sujetos': n_sujetos, 'n_dvs': n_dvs,
+                                       'filas': len(df), **medida})
+                    if progreso is not None:
+                        progreso(f"{nombre:<26} sujetos={n_sujetos:<7} dvs={n_dvs:<6} "
+                                 f"{medida['segundos_min']:9.4f} s {medida['memoria_pico_mb']:9.1f} MB")
+                shutil.rmtree(DIR_CACHE, ignore_errors=True)
+        finally:
+            os.chdir(directorio_original)
+    return resultados
+
+
+def version_codigo():
+    """`git describe` del árbol actual, o None fuera de un repositorio."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(anterior, nuevo, umbral=UMBRAL_REGRESION):
+    """
+    Cociente nuevo / anterior de `segundos_min` y memoria por función y tamaño.
+
+    Devuelve un DataFrame con una columna `regresion` que marca los casos en
+    que el tiempo empeora más de `umbral` veces.
+    """
+    clave = ['funcion', 'n_sujetos', 'n_dvs']
+    a = pd.DataFrame(anterior['resultados']).set_index(clave)
+    b = pd.DataFrame(nuevo['resultados']).set_index(clave)
+    comunes = a.index.intersection(b.index)
+    tabla = pd.DataFrame({
+        'segundos_antes': a.loc[comunes, 'segundos_min'],
+        'segundos_despues': b.loc[comunes, 'segundos_min'],
+        'memoria_antes_mb': a.loc[comunes, 'memoria_pico_mb'],
+        'memoria_despues_mb': b.loc[comunes, 'memoria_pico_mb'],
+    })
+    tabla['ratio_tiempo'] = tabla['segundos_despues'] / tabla['segundos_antes']
+    tabla['ratio_memoria'] = tabla['memoria_despues_mb'] / tabla['memoria_antes_mb']
+    tabla['regresion'] = tabla['ratio_tiempo'] > umbral
+    return tabla.sort_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de carga, limpieza, ANOVA, residuos y figuras.")
+    parser.add_argument('--salida', default='bench_resultados.json', help="Archivo JSON de resultados")
+    parser.add_argument('--sujetos', type=int, nargs='+', default=SUJETOS, help="Tamaños del eje de sujetos (1 DV)")
+    parser.add_argument('--dvs', type=int, nargs='+', default=DVS, help=f"Tamaños del eje de DVs ({SUJETOS_EJE_DVS} sujetos)")
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTERIOR', 'NUEVO'),
+                        help="Compara dos JSON de resultados en lugar de ejecutar")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION,
+                        help="Cociente de tiempo a partir del cual se marca una regresión")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        with open(args.comparar[0]) as fa, open(args.comparar[1]) as fb:
+            tabla = comparar(json.load(fa), json.load(fb), args.umbral)
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+            print(tabla.round(3))
+        return 1 if tabla['regresion'].any() else 0
+
+    warnings.filterwarnings("ignore")
+    resultados = ejecutar(args.sujetos, args.dvs, args.repeticiones)
+    informe = {
+        'version': version_codigo(),
+        'fecha': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'paquetes': {p: version(p) for p in PAQUETES},
+        'resultados': resultados,
+    }
+    with open(args.salida, 'w', encoding='utf-8') as fh:
+        json.dump(informe, fh, ensure_ascii=False, indent=2)
+    print(f"{len(resultados)} mediciones -> {args.salida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Intervalos de confianza bootstrap (percentil y BCa) a nivel de sujeto.
+
+Se remuestrean sujetos con reemplazo mediante una única matriz de índices
+`(n_boot, n_sujetos)` aplicada al array de medias de celda, y se obtienen a la
+vez los IC de las cuatro medias prime × target y del contraste de interacción.
+"""
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from cache_analisis import cache_analisis, huella_dataframe, medias_sujeto_celda
+
+
+def _cuantiles_por_columna(ordenado, probs):
+    """Cuantil (interpolación lineal) de cada columna de `ordenado` con su propia probabilidad."""
+    n = ordenado.shape[0]
+    pos = np.clip(probs, 0.0, 1.0) * (n - 1)
+    bajo = np.floor(pos).astype(int)
+    alto = np.minimum(bajo + 1, n - 1)
+    peso = pos - bajo
+    cols = np.arange(ordenado.shape[1])
+    return ordenado[bajo, cols] * (1 - peso) + ordenado[alto, cols] * peso
+
+
+def ic_bootstrap(valores, n_boot=10000, confianza=0.95, semilla=0):
+    """
+    IC bootstrap de la media de cada columna de `valores` (sujetos × estadísticos).
+
+    Devuelve un diccionario con la estimación, los límites percentil y los BCa.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    n = valores.shape[0]
+    rng = np.random.default_rng(semilla)
+
+    # Remuestreo de sujetos: una sola matriz de índices para todos los estadísticos
+    indices = rng.integers(0, n, size=(n_boot, n))
+    boot = valores[indices].mean(axis=1)
+    estimacion = valores.mean(axis=0)
+    ordenado = np.sort(boot, axis=0)
+
+    alpha = (1 - confianza) / 2
+    percentil = (
+        _cuantiles_por_columna(ordenado, np.full(valores.shape[1], alpha)),
+        _cuantiles_por_columna(ordenado, np.full(valores.shape[1], 1 - alpha)),
+    )
+
+    # BCa: sesgo (z0) desde la distribución bootstrap y aceleración por jackknife
+    proporcion = ((boot < estimacion).sum(axis=0) + 0.5 * (boot == estimacion).sum(axis=0)) / n_boot
+    z0 = norm.ppf(np.clip(proporcion, 1 / (n_boot + 1), n_boot / (n_boot + 1)))
+    jack = (valores.sum(axis=0) - valores) / (n - 1)
+    dif = jack.mean(axis=0) - jack
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acel = (dif ** 3).sum(axis=0) / (6 * ((dif ** 2).sum(axis=0)) ** 1.5)
+    acel = np.nan_to_num(acel)
+
+    def _ajustar(z_alpha):
+        return norm.cdf(z0 + (z0 + z_alpha) / (1 - acel * (z0 + z_alpha)))
+
+    bca = (
+        _cuantiles_por_columna(ordenado, _ajustar(norm.ppf(alpha))),
+        _cuantiles_por_columna(ordenado, _ajustar(norm.ppf(1 - alpha))),
+    )
+    return {'estimacion': estimacion, 'percentil': percentil, 'bca': bca, 'n_boot': n_boot}
+
+
+def ic_celdas_e_interaccion(df, dv, within=('prime', 'target'), subject='id',
+                            n_boot=10000, confianza=0.95, semilla=0):
+    """
+    Tabla con la media y los IC bootstrap de cada celda y del contraste de interacción.
+
+    Columnas: `prime`, `target` (vacías en la fila de interacción), `mean`,
+    `ic_inf_percentil`, `ic_sup_percentil`, `ic_inf_bca`, `ic_sup_bca`.
+    """
+    a, b = within
+    cubo, coords = medias_sujeto_celda(df, dv, within=within, subject=subject)
+    medias = cubo[..., 0].reshape(cubo.shape[0], -1)
+    columnas = [medias]
+    if cubo.shape[1:3] == (2, 2):
+        c = cubo[..., 0]
+        columnas.append(((c[:, 0, 0] - c[:, 0, 1]) - (c[:, 1, 0] - c[:, 1, 1]))[:, None])
+    res = ic_bootstrap(np.hstack(columnas), n_boot=n_boot, confianza=confianza, semilla=semilla)
+
+    etiquetas_a = np.repeat(coords[a], len(coords[b])).tolist()
+    etiquetas_b = np.tile(coords[b], len(coords[a])).tolist()
+    if len(columnas) == 2:
+        etiquetas_a.append('Interacción')
+        etiquetas_b.append('')
+    return pd.DataFrame({
+        a: etiquetas_a,
+        b: etiquetas_b,
+        'mean': res['estimacion'],
+        'ic_inf_percentil': res['percentil'][0],
+        'ic_sup_percentil': res['percentil'][1],
+        'ic_inf_bca': res['bca'][0],
+        'ic_sup_bca': res['bca'][1],
+    })
+
+
+def ic_bootstrap_cacheado(df, dv, n_boot=10000, confianza=0.95, within=('prime', 'target'), subject='id', semilla=0):
+    """`ic_celdas_e_interaccion` memoizado por huella del dataset y número de remuestreos."""
+    within = list(within)
+    huella = huella_dataframe(df[[subject, *within, dv]])
+    clave = (huella, 'bootstrap', dv, tuple(within), subject, n_boot, confianza, semilla)
+    tabla = cache_analisis.obtener(
+        clave,
+        lambda: ic_celdas_e_interaccion(df, dv, within, subject, n_boot=n_boot,
+                                        confianza=confianza, semilla=semilla),
+    )
+    return tabla.copy()
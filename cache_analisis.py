@@ -0,0 +1,197 @@
+"""
+Caché en memoria de resultados de análisis (ANOVA, tablas formateadas, ...).
+
+Las entradas se indexan con la huella de contenido del DataFrame limpio más la
+especificación del análisis (dv / within / subject), de modo que los reruns de
+Streamlit reutilizan el resultado mientras los datos no cambien.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import pingouin as pg
+
+from anova_vectorizado import cubo_celdas, rm_anova2_vectorizado
+from cubo_datos import DIMS, DVS, construir_cubo
+from instrumentacion import instrumentacion
+
+
+def huella_dataframe(df):
+    """Devuelve un hash SHA-256 del contenido, columnas y tipos del DataFrame."""
+    h = hashlib.sha256()
+    h.update(repr(list(df.columns)).encode())
+    h.update(repr([str(t) for t in df.dtypes]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+class CacheAnalisis:
+    """Caché LRU segura entre hilos con contadores de aciertos y fallos."""
+
+    def __init__(self, max_entradas=128):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, calcular):
+        """
+        Devuelve el valor cacheado para `clave` o lo calcula con `calcular()`.
+
+        Si otro hilo ya está calculando la misma clave (p. ej. un trabajo en
+        segundo plano de `trabajos.py`), se espera a su resultado en lugar de
+        repetir el cálculo.
+        """
+        while True:
+            with self._lock:
+                if clave in self._entradas:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    instrumentacion.anotar_cache(True)
+                    return self._entradas[clave]
+                en_curso = self._en_curso.get(clave)
+                if en_curso is None:
+                    self.fallos += 1
+                    en_curso = self._en_curso[clave] = threading.Event()
+                    break
+            # Si el otro cálculo falla no deja entrada y se vuelve a intentar aquí
+            en_curso.wait()
+        instrumentacion.anotar_cache(False)
+
+        # El cálculo se hace fuera del lock para no bloquear a otras sesiones
+        try:
+            valor = calcular()
+            with self._lock:
+                self._entradas[clave] = valor
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            en_curso.set()
+        return valor
+
+    def obtener_lote(self, claves, calcular_lote):
+        """
+        Valores de varias claves; `calcular_lote(indices)` recibe las posiciones
+        de los fallos y devuelve sus valores en ese orden (p. ej. desde un pool).
+        """
+        valores = [None] * len(claves)
+        fallos = []
+        with self._lock:
+            for i, clave in enumerate(claves):
+                if clave in self._entradas:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    valores[i] = self._entradas[clave]
+                else:
+                    self.fallos += 1
+                    fallos.append(i)
+        instrumentacion.anotar_cache(True, len(claves) - len(fallos))
+        instrumentacion.anotar_cache(False, len(fallos))
+        if not fallos:
+            return valores
+
+        calculados = calcular_lote(fallos)
+        with self._lock:
+            for i, valor in zip(fallos, calculados):
+                valores[i] = valor
+                self._entradas[claves[i]] = valor
+                self._entradas.move_to_end(claves[i])
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valores
+
+    def invalidar(self, huella=None):
+        """
+        Elimina entradas de la caché. Sin argumentos vacía todo; con `huella`
+        solo borra los resultados calculados sobre ese dataset.
+        Devuelve el número de entradas eliminadas.
+        """
+        with self._lock:
+            if huella is None:
+                n = len(self._entradas)
+                self._entradas.clear()
+                return n
+            claves = [c for c in self._entradas if c[0] == huella]
+            for c in claves:
+                del self._entradas[c]
+            return len(claves)
+
+    def reiniciar_contadores(self):
+        with self._lock:
+            self.aciertos = 0
+            self.fallos = 0
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'entradas': len(self._entradas),
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+            }
+
+
+# Instancia compartida por todas las sesiones del servidor
+cache_analisis = CacheAnalisis()
+
+
+def cubo_cacheado(df):
+    """Cubo de agregados (`cubo_datos.py`) del dataset, construido una vez por huella."""
+    columnas = [c for c in DIMS + DVS if c in df.columns]
+    return cache_analisis.obtener((huella_dataframe(df[columnas]), 'cubo'), lambda: construir_cubo(df))
+
+
+def medias_sujeto_celda(df, dv, within=('prime', 'target'), subject='id'):
+    """
+    `cubo_celdas` leído del cubo compartido del dataset; si los factores o la DV
+    no son los del cubo se agrupa el DataFrame como antes.
+    """
+    dvs = [dv] if isinstance(dv, str) else list(dv)
+    if {subject, *within} <= set(DIMS) and set(dvs) <= set(DVS):
+        return cubo_cacheado(df).medias_sujeto_celda(dv, within, subject)
+    return cubo_celdas(df, dv, within=within, subject=subject)
+
+
+def rm_anova_desde_cubo(data, dv, within, subject):
+    """`rm_anova_rapido` sobre las medias sujeto × celda del cubo compartido."""
+    cubo, coords = medias_sujeto_celda(data, dv, within=within, subject=subject)
+    return rm_anova2_vectorizado(cubo, within=within, dvs=None if isinstance(dv, str) else coords['dv'])
+
+
+def rm_anova_cacheado(data, dv, within, subject, postproceso=None):
+    """
+    `pg.rm_anova(..., detailed=True)` memoizado por huella del dataset.
+
+    Los diseños de dos factores se resuelven con el motor NumPy de
+    `anova_vectorizado` sobre el cubo del dataset, con la misma tabla que Pingouin.
+
+    Si se pasa `postproceso` (p. ej. `formatear_tabla_anova`) se devuelve la
+    tupla `(anova, postproceso(anova))`, también cacheada.
+    """
+    within = list(within)
+    huella = huella_dataframe(data[[subject, *within, dv]])
+    clave = (huella, 'rm_anova', dv, tuple(within), subject,
+             getattr(postproceso, '__qualname__', None))
+
+    def calcular():
+        if len(within) == 2:
+            anova = rm_anova_desde_cubo(data, dv=dv, within=within, subject=subject)
+        else:
+            anova = pg.rm_anova(data=data, dv=dv, within=within, subject=subject, detailed=True)
+        if postproceso is None:
+            return anova
+        return anova, postproceso(anova)
+
+    with instrumentacion.etapa("rm_anova"):
+        resultado = cache_analisis.obtener(clave, calcular)
+    # Copias para que ningún rerun modifique el resultado compartido
+    if postproceso is None:
+        return resultado.copy()
+    return tuple(r.copy() if isinstance(r, pd.DataFrame) else r for r in resultado)
@@ -0,0 +1,169 @@
+"""
+Cubo etiquetado sujeto × run × prime × target con los agregados de cada dataset.
+
+Las pestañas recalculaban los mismos agregados del DataFrame largo en cada
+rerun (medias por celda para el gráfico de interacción, tabla de balance,
+medias sujeto × celda del ANOVA, medias de celda y de sujeto de los
+residuos, KPIs). Aquí se recorre el DataFrame una sola vez y se guarda, en un
+`xarray.Dataset` con dimensiones `(dv, id, run, prime, target)`, el
+recuento, la media y la suma de cuadrados centrada (M2) de cada celda. Cualquier
+agregado sobre un subconjunto de dimensiones se obtiene fusionando momentos
+(Chan et al.) sin volver a agrupar filas, y las lecturas de una DV son
+vistas del array subyacente. `cache_analisis.cubo_cacheado` lo construye una
+vez por huella del dataset.
+"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+DIMS = ['id', 'run', 'prime', 'target']
+DVS = ['rt_raw', 'rt_log', 'value']
+
+
+def _categorias(columna):
+    """Niveles observados (ordenados) y código de cada fila."""
+    if isinstance(columna.dtype, pd.CategoricalDtype):
+        categorica = columna.cat.remove_unused_categories()
+        if not categorica.cat.ordered:
+            categorica = categorica.cat.reorder_categories(sorted(categorica.cat.categories))
+    else:
+        categorica = pd.Categorical(columna, categories=sorted(columna.dropna().unique()))
+        categorica = pd.Series(categorica, index=columna.index)
+    return categorica.cat.categories, categorica.cat.codes.to_numpy()
+
+
+def construir_cubo(df, dvs=None, dims=None):
+    """
+    Recuento, media y M2 de cada DV por celda de `dims` (por defecto las de `DIMS` presentes).
+
+    Las filas con algún factor ausente se ignoran; los valores no finitos de
+    una DV no cuentan para esa DV. Devuelve un `CuboDatos`.
+    """
+    dims = [d for d in (dims or DIMS) if d in df.columns]
+    dvs = [dv for dv in (dvs or DVS) if dv in df.columns]
+    niveles, codigos = zip(*(_categorias(df[d]) for d in dims))
+    forma = tuple(len(n) for n in niveles)
+    completas = np.all([c >= 0 for c in codigos], axis=0)
+    plano = np.ravel_multi_index([c[completas] for c in codigos], forma)
+    tamano = int(np.prod(forma))
+
+    y = df[dvs].to_numpy(dtype=np.float64)[completas]
+    validos = np.isfinite(y)
+    y = np.where(validos, y, 0.0)
+    n = np.empty((len(dvs), tamano))
+    media = np.empty((len(dvs), tamano))
+    m2 = np.empty((len(dvs), tamano))
+    for j in range(len(dvs)):
+        n[j] = np.bincount(plano, weights=validos[:, j], minlength=tamano)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media[j] = np.bincount(plano, weights=y[:, j], minlength=tamano) / n[j]
+        # Segunda pasada con la media de la celda: M2 numéricamente estable
+        desvio = np.where(validos[:, j], y[:, j] - np.nan_to_num(media[j])[plano], 0.0)
+        m2[j] = np.bincount(plano, weights=desvio ** 2, minlength=tamano)
+    filas = np.bincount(plano, minlength=tamano).reshape(forma)
+
+    dims_dv = ('dv', *dims)
+    ds = xr.Dataset(
+        {
+            'n': (dims_dv, n.reshape(len(dvs), *forma)),
+            'media': (dims_dv, media.reshape(len(dvs), *forma)),
+            'm2': (dims_dv, m2.reshape(len(dvs), *forma)),
+            'filas': (tuple(dims), filas),
+        },
+        coords={'dv': dvs, **{d: np.asarray(nivel) for d, nivel in zip(dims, niveles)}},
+    )
+    return CuboDatos(ds)
+
+
+class CuboDatos:
+    """Agregados de un dataset sobre un `xarray.Dataset` (variables `n`, `media`, `m2`, `filas`)."""
+
+    def __init__(self, ds):
+        self.ds = ds
+
+    @property
+    def dims(self):
+        return list(self.ds['filas'].dims)
+
+    @property
+    def dvs(self):
+        return list(self.ds['dv'].values)
+
+    def reducir(self, conservar):
+        """Momentos agrupados solo por `conservar` (fusión de n, media y M2 del resto)."""
+        otras = [d for d in self.dims if d not in conservar]
+        n, media, m2 = self.ds['n'], self.ds['media'], self.ds['m2']
+        n_total = n.sum(otras)
+        suma = (n * media.fillna(0)).sum(otras)
+        media_total = (suma / n_total).where(n_total > 0)
+        desvio = (media.fillna(0) - media_total.fillna(0)).where(n > 0, 0)
+        m2_total = (m2 + n * desvio ** 2).sum(otras)
+        return xr.Dataset({'n': n_total, 'media': media_total, 'm2': m2_total,
+                           'filas': self.ds['filas'].sum(otras)})
+
+    def balance(self, within=('prime', 'target')):
+        """Número de filas por celda, como `pd.crosstab(df[a], df[b])`."""
+        a, b = within
+        filas = self.ds['filas'].sum([d for d in self.dims if d not in within]).transpose(a, b)
+        return pd.DataFrame(filas.values, index=pd.Index(filas[a].values, name=a),
+                            columns=pd.Index(filas[b].values, name=b))
+
+    def tabla_celdas(self, dv, within=('prime', 'target'), grupos=None):
+        """
+        count, mean, std y sem de `dv` por combinación de `grupos` (como
+        `groupby(grupos)[dv].agg(...)`); por defecto los factores `within`.
+        """
+        grupos = list(grupos or within)
+        r = self.reducir(grupos).sel(dv=dv).transpose(*grupos)
+        n = r['n'].values.ravel()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(r['m2'].values.ravel() / (n - 1))
+        indice = pd.MultiIndex.from_product([r[g].values for g in grupos], names=grupos)
+        tabla = pd.DataFrame({'count': n.astype(np.int64), 'mean': r['media'].values.ravel(),
+                              'std': std, 'sem': std / np.sqrt(n)}, index=indice)
+        return tabla[tabla['count'] > 0]
+
+    def medias_sujeto_celda(self, dv, within=('prime', 'target'), subject='id'):
+        """
+        Array `(sujetos, niveles_a, niveles_b, n_dv)` y coordenadas, como
+        `anova_vectorizado.cubo_celdas`: las filas repetidas de una celda
+        (runs) se promedian y se descartan los sujetos con alguna celda vacía.
+        """
+        dvs = [dv] if isinstance(dv, str) else list(dv)
+        a, b = within
+        r = self.reducir([subject, a, b])['media'].sel(dv=dvs).transpose(subject, a, b, 'dv')
+        cubo = r.values
+        completos = ~np.isnan(cubo).any(axis=(1, 2, 3))
+        coords = {subject: r[subject].values[completos], a: r[a].values, b: r[b].values, 'dv': dvs}
+        return np.ascontiguousarray(cubo[completos]), coords
+
+    def kpis(self, subject='id'):
+        """Número de sujetos y media / desviación típica (ddof=1) por fila de cada DV."""
+        r = self.reducir([])
+        n = r['n'].values
+        return {
+            'total_participantes': int((self.ds['filas'].sum([d for d in self.dims if d != subject]) > 0).sum()),
+            'media': dict(zip(self.dvs, r['media'].values.tolist())),
+            'std': dict(zip(self.dvs, np.sqrt(r['m2'].values / (n - 1)).tolist())),
+        }
+
+    def codigos(self, df, dims):
+        """Posición de cada fila de `df` en las coordenadas de `dims` (-1 si el nivel no está)."""
+        return [pd.Categorical(df[d], categories=self.ds[d].values).codes for d in dims]
+
+    def residuos(self, df, dv, within=('prime', 'target'), subject='id'):
+        """
+        Residuos `y - ȳ_celda - ȳ_sujeto + ȳ` de cada fila de `df` (el dataset del cubo).
+
+        Devuelve un DataFrame con el mismo índice que `df` y una columna por DV.
+        """
+        dvs = [dv] if isinstance(dv, str) else list(dv)
+        a, b = within
+        celda = self.reducir([a, b])['media'].sel(dv=dvs).transpose(a, b, 'dv').values
+        sujeto = self.reducir([subject])['media'].sel(dv=dvs).transpose(subject, 'dv').values
+        global_ = self.reducir([])['media'].sel(dv=dvs).values
+        cod_a, cod_b, cod_s = self.codigos(df, [a, b, subject])
+        y = df[dvs].to_numpy(dtype=np.float64)
+        residuos = y - celda[cod_a, cod_b] - sujeto[cod_s] + global_
+        residuos[(cod_a < 0) | (cod_b < 0) | (cod_s < 0)] = np.nan
+        return pd.DataFrame(residuos, index=df.index, columns=dvs)
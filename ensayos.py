@@ -0,0 +1,124 @@
+"""
+Ingesta en streaming de archivos a nivel de ensayo (p. ej. `beh_replication1.csv`).
+
+Los CSV de ensayos (opcionalmente `.gz` / `.zst`) se leen por bloques con el
+lector incremental de Arrow. En cada bloque se repara la columna de RT como en
+los scripts R, se aplica el filtro 200 < RT < 2000 ms y se acumulan, por
+sujeto × run × prime × target, el recuento, la suma y la suma de cuadrados de
+RT y de log(RT). La memoria máxima depende del tamaño de bloque y del número
+de celdas, no del número de ensayos. El resultado tiene las columnas de
+`ANOVA beh RT.csv` (`id`, `run`, `prime`, `target`, `rt_raw`, `rt_log`).
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from ingesta import leer_tabla, reparar_numeros, tipar_tabla
+
+RT_MIN = 200
+RT_MAX = 2000
+TAM_BLOQUE = 1 << 22  # bytes de CSV (descomprimido) por bloque
+
+# Nombres de los archivos de ensayos -> nombres del dashboard
+ALIAS = {'subjID': 'id', 'RT': 'rt_raw', 'rt': 'rt_raw'}
+COLUMNAS_RT = [n for n, destino in ALIAS.items() if destino == 'rt_raw'] + ['rt_raw']
+CLAVES = ['id', 'run', 'prime', 'target']
+SUMAS = ['n', 'suma_rt', 'suma_rt2', 'suma_log', 'suma_log2']
+
+
+def abrir_csv(ruta, tam_bloque=TAM_BLOQUE):
+    """Lector incremental de Arrow; la compresión (gzip, zstd...) se deduce de la extensión."""
+    return pacsv.open_csv(
+        pa.input_stream(ruta, compression='detect'),
+        read_options=pacsv.ReadOptions(block_size=tam_bloque),
+        # RT como texto para poder repararlo (vacíos y `NA` como nulos); el resto con inferencia normal
+        convert_options=pacsv.ConvertOptions(column_types={n: pa.string() for n in COLUMNAS_RT},
+                                             strings_can_be_null=True),
+    )
+
+
+def es_archivo_ensayos(ruta):
+    """True si la cabecera de `ruta` tiene el formato de ensayos (RT sin `rt_log`)."""
+    nombres = abrir_csv(ruta, tam_bloque=1 << 16).schema.names
+    return 'rt_log' not in nombres and any(n in COLUMNAS_RT for n in nombres)
+
+
+def sumas_bloque(bloque, rt_min=RT_MIN, rt_max=RT_MAX):
+    """
+    Sumas suficientes de un bloque de ensayos ya renombrado.
+
+    Devuelve `(sumas, reporte)`: un DataFrame indexado por `CLAVES` con las
+    columnas de `SUMAS`, y el reporte de la reparación de RT con el número de
+    ensayos descartados por el filtro. Como en los scripts R (`as.numeric` y
+    después el filtro), los RT vacíos, `NA` o no numéricos pasan a NaN y el
+    filtro los descarta.
+    """
+    if 'run' not in bloque.columns:
+        bloque['run'] = 1
+    rt, reporte = reparar_numeros(bloque['rt_raw'], forzar_nan=True)
+    valido = (rt > rt_min) & (rt < rt_max)
+    reporte['filtrados'] = int((~valido).sum())
+    rt = rt[valido].to_numpy()
+    log_rt = np.log(rt)
+    parcial = pd.DataFrame({
+        'n': np.ones(rt.size, dtype=np.int64),
+        'suma_rt': rt, 'suma_rt2': rt ** 2,
+        'suma_log': log_rt, 'suma_log2': log_rt ** 2,
+    })
+    claves = [bloque.loc[valido, c].to_numpy() for c in CLAVES]
+    return parcial.groupby(claves).sum().rename_axis(CLAVES), reporte
+
+
+def acumular_ensayos(ruta, rt_min=RT_MIN, rt_max=RT_MAX, tam_bloque=TAM_BLOQUE):
+    """
+    Recorre `ruta` por bloques y acumula las sumas por sujeto × celda.
+
+    Devuelve `(sumas, reporte)` con el total de ensayos leídos, reparados,
+    no numéricos (`invalidos`) y filtrados (incluidos los no numéricos).
+    """
+    acumulado = None
+    reporte = {'ensayos': 0, 'reparados': 0, 'invalidos': 0, 'filtrados': 0}
+    for lote in abrir_csv(ruta, tam_bloque):
+        bloque = lote.to_pandas().rename(columns=ALIAS)
+        parcial, rep = sumas_bloque(bloque, rt_min, rt_max)
+        reporte['ensayos'] += rep['celdas']
+        reporte['reparados'] += rep['reparadas']
+        reporte['invalidos'] += rep['invalidas']
+        reporte['filtrados'] += rep['filtrados']
+        # Solo se guardan tantas filas como celdas distintas haya
+        acumulado = parcial if acumulado is None else acumulado.add(parcial, fill_value=0)
+    if acumulado is None:
+        acumulado = pd.DataFrame(columns=SUMAS, index=pd.MultiIndex.from_tuples([], names=CLAVES))
+    acumulado['n'] = acumulado['n'].astype(np.int64)
+    return acumulado.sort_index(), reporte
+
+
+def marco_desde_sumas(sumas):
+    """Medias por celda con las columnas de `ANOVA beh RT.csv` más `n_ensayos` y las DE."""
+    n = sumas['n'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media_rt = sumas['suma_rt'].to_numpy() / n
+        media_log = sumas['suma_log'].to_numpy() / n
+        var_rt = (sumas['suma_rt2'].to_numpy() - n * media_rt ** 2) / (n - 1)
+        var_log = (sumas['suma_log2'].to_numpy() - n * media_log ** 2) / (n - 1)
+    marco = sumas.index.to_frame(index=False)
+    marco['rt_raw'] = media_rt
+    marco['rt_log'] = media_log
+    marco['rt_sd'] = np.sqrt(np.maximum(var_rt, 0))
+    marco['rt_log_sd'] = np.sqrt(np.maximum(var_log, 0))
+    marco['n_ensayos'] = sumas['n'].to_numpy()
+    return marco
+
+
+def leer_ensayos(ruta, columnas=None):
+    """
+    Marco agregado de un archivo de ensayos, con la misma caché Parquet que `leer_tabla`.
+
+    Solo se recorre el archivo completo cuando cambia su contenido.
+    """
+    def convertir():
+        sumas, _ = acumular_ensayos(ruta)
+        return tipar_tabla(pa.Table.from_pandas(marco_desde_sumas(sumas), preserve_index=False))
+
+    return leer_tabla(ruta, columnas, convertir=convertir)
@@ -0,0 +1,293 @@
+"""
+Capa de renderizado de las figuras matplotlib de `hello.py`.
+
+Cada figura se construye con un constructor de nivel de módulo (serializable,
+para poder ejecutarse en otro proceso) sobre un `Figure` propio, sin pasar por
+el registro global de pyplot ni tocar su estilo. Se guarda como PNG/SVG y se
+descarta en el momento, así que el servidor no acumula figuras abiertas. Los
+bytes se guardan en una caché LRU acotada por tamaño, indexada por la huella de
+los datos y los parámetros; en un rerun sin cambios no se dibuja nada. Los
+fallos se dibujan en un pool de procesos.
+
+El estilo de cada constructor se aplica con `plt.style.context`, que cambia
+los `rcParams` globales del proceso. En los workers del pool eso es seguro
+(cada uno dibuja una figura a la vez); cuando no hay pool y se dibuja en el
+hilo del script, el dibujo se serializa con `_lock_estilo` para que varias
+sesiones no mezclen sus estilos a mitad de figura.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+from matplotlib.figure import Figure
+
+from cache_analisis import huella_dataframe
+from instrumentacion import instrumentacion
+
+ESTILO = 'seaborn-v0_8-whitegrid'
+DPI = 200  # el mismo que usa `st.pyplot`
+MAX_BYTES_CACHE = int(os.environ.get("FIGURAS_MAX_MB", "64")) << 20
+N_PROCESOS = int(os.environ.get("FIGURAS_PROCESOS", min(4, os.cpu_count() or 1)))
+
+
+class CacheBytes:
+    """Caché LRU de imágenes acotada por el total de bytes, segura entre hilos."""
+
+    def __init__(self, max_bytes=MAX_BYTES_CACHE):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        """Bytes cacheados para `clave` o None (cuenta acierto / fallo)."""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                imagen = self._entradas[clave]
+            else:
+                self.fallos += 1
+                imagen = None
+        instrumentacion.anotar_cache(imagen is not None)
+        return imagen
+
+    def guardar(self, clave, imagen):
+        with self._lock:
+            if clave in self._entradas:
+                self.bytes -= len(self._entradas.pop(clave))
+            if len(imagen) > self.max_bytes:
+                return
+            self._entradas[clave] = imagen
+            self.bytes += len(imagen)
+            while self.bytes > self.max_bytes:
+                _, expulsada = self._entradas.popitem(last=False)
+                self.bytes -= len(expulsada)
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            return {'aciertos': self.aciertos, 'fallos': self.fallos,
+                    'entradas': len(self._entradas), 'bytes': self.bytes}
+
+
+cache_figuras = CacheBytes()
+
+_pool = None
+_pool_lock = threading.Lock()
+# Todo el dibujo matplotlib del proceso del servidor pasa por `renderizar`
+_lock_estilo = threading.Lock()
+
+
+def _obtener_pool():
+    """Pool de procesos compartido, creado en el primer fallo de la caché."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver precargando este módulo: los workers nacen con
+            # matplotlib y seaborn ya importados y sin heredar hilos de Streamlit
+            contexto = multiprocessing.get_context('forkserver')
+            contexto.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=N_PROCESOS, mp_context=contexto)
+        return _pool
+
+
+def _reiniciar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _huella_argumento(valor, h):
+    if isinstance(valor, pd.DataFrame):
+        h.update(huella_dataframe(valor).encode())
+    elif isinstance(valor, np.ndarray):
+        h.update(repr((valor.dtype.str, valor.shape)).encode())
+        h.update(np.ascontiguousarray(valor).tobytes())
+    elif isinstance(valor, dict):
+        for k in sorted(valor):
+            h.update(repr(k).encode())
+            _huella_argumento(valor[k], h)
+    elif isinstance(valor, (list, tuple)):
+        h.update(repr((type(valor).__name__, len(valor))).encode())
+        for v in valor:
+            _huella_argumento(v, h)
+    else:
+        h.update(repr(valor).encode())
+
+
+def clave_figura(constructor, kwargs, formato='png', dpi=DPI):
+    """Clave de caché: constructor, formato y huella de datos y parámetros."""
+    h = hashlib.sha256()
+    _huella_argumento(kwargs, h)
+    return (constructor.__name__, formato, dpi, h.hexdigest())
+
+
+def renderizar(constructor, kwargs, formato='png', dpi=DPI):
+    """Dibuja en el hilo actual, sin que otra sesión cambie el estilo a la vez (ver `_dibujar`)."""
+    with _lock_estilo:
+        return _dibujar(constructor, kwargs, formato, dpi)
+
+
+def _dibujar(constructor, kwargs, formato='png', dpi=DPI):
+    """
+    Construye la figura, la guarda como `formato` y la descarta. Devuelve los bytes.
+
+    Cambia temporalmente los `rcParams` del proceso: se llama directamente solo
+    en los workers del pool, o bajo `_lock_estilo` desde `renderizar`.
+    """
+    with warnings.catch_warnings(), plt.style.context(getattr(constructor, 'estilo', ESTILO)):
+        warnings.simplefilter('ignore')
+        fig = constructor(**kwargs)
+        buf = io.BytesIO()
+        try:
+            fig.savefig(buf, format=formato, dpi=dpi, bbox_inches='tight')
+        finally:
+            fig.clear()
+    return buf.getvalue()
+
+
+@instrumentacion.etapa("Figuras matplotlib")
+def renderizar_lote(pedidos, formato='png', dpi=DPI):
+    """
+    Bytes de cada `(constructor, kwargs)` de `pedidos`, en el mismo orden.
+
+    Los aciertos salen de `cache_figuras`; los fallos se dibujan en el pool
+    de procesos (en paralelo si son varios) y, sin pool, en el propio hilo.
+    """
+    claves = [clave_figura(c, kw, formato, dpi) for c, kw in pedidos]
+    imagenes = [cache_figuras.obtener(clave) for clave in claves]
+    fallos = [i for i, img in enumerate(imagenes) if img is None]
+
+    if fallos and N_PROCESOS > 1:
+        try:
+            pool = _obtener_pool()
+            futuros = {i: pool.submit(_dibujar, *pedidos[i], formato, dpi) for i in fallos}
+            for i, futuro in futuros.items():
+                imagenes[i] = futuro.result()
+        except BrokenProcessPool:
+            _reiniciar_pool()
+    for i in fallos:
+        if imagenes[i] is None:
+            imagenes[i] = renderizar(*pedidos[i], formato, dpi)
+        cache_figuras.guardar(claves[i], imagenes[i])
+    return imagenes
+
+
+def con_estilo(estilo):
+    """Decorador: estilo de matplotlib (nombre o dict de rc) con el que se dibuja el constructor."""
+    def decorador(constructor):
+        constructor.estilo = estilo
+        return constructor
+    return decorador
+
+
+# ==============================================================================
+# === CONSTRUCTORES ===
+# ==============================================================================
+def _qq_en_eje(ax, teoricos, muestrales, pendiente, intercepto, color):
+    ax.plot(teoricos, muestrales, 'o', color=color)
+    ax.plot(teoricos, pendiente * teoricos + intercepto, '-', color='black')
+    ax.set_xlabel('Theoretical quantiles')
+    ax.set_ylabel('Ordered Values')
+
+
+def histograma_y_qq(valores, qq, color, titulo, etiqueta_x):
+    """Histograma (30 bins) y Q-Q normal lado a lado; `qq` = (teóricos, muestrales, pendiente, intercepto)."""
+    fig = Figure(figsize=(16, 6))
+    ax1, ax2 = fig.subplots(1, 2)
+    sns.histplot(x=valores, bins=30, color=color, edgecolor='black', ax=ax1)
+    ax1.set_title(f'Histograma: {titulo}', fontsize=14, fontweight='bold')
+    ax1.set_xlabel(etiqueta_x, fontsize=12)
+    _qq_en_eje(ax2, *qq, color)
+    ax2.set_title(f'Q-Q Plot: {titulo}', fontsize=14, fontweight='bold', pad=20)
+    fig.tight_layout()
+    return fig
+
+
+def caja_con_puntos(datos, colores):
+    """Cajas de `rt_log` por prime y target con los puntos individuales superpuestos."""
+    fig = Figure(figsize=(14, 8))
+    ax = fig.subplots()
+    sns.boxplot(data=datos, x='prime', y='rt_log', hue='target', palette=colores,
+                dodge=True, width=0.8, ax=ax, showfliers=False)
+    sns.stripplot(data=datos, x='prime', y='rt_log', hue='target', palette=colores,
+                  dodge=True, ax=ax, size=3, alpha=0.5, jitter=True, legend=False)
+    ax.set_title('Diagrama de cajas de tiempo de respuesta (log)\\n', fontsize=16, fontweight='bold')
+    ax.set_xlabel('Raza del prime', fontsize=14, labelpad=10)
+    ax.set_ylabel('Tiempo de respuesta (log)', fontsize=14, labelpad=10)
+    handles, _ = ax.get_legend_handles_labels()
+    ax.legend(handles[:2], ['Arma', 'Herramienta'], title='Target', loc='upper right', framealpha=0.9)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.grid(True, alpha=0.3, axis='y')
+    fig.tight_layout()
+    return fig
+
+
+@con_estilo(sns.axes_style('whitegrid'))
+def interaccion_puntos(datos, colores):
+    """Medias de `rt_log` (IC 95 %) por target y prime, anotadas con su valor."""
+    fig = Figure(figsize=(12, 7))
+    ax = fig.subplots()
+    sns.pointplot(data=datos, x='target', y='rt_log', hue='prime', palette=colores,
+                  dodge=0.2, join=True, errwidth=2, capsize=0.1,
+                  markers=['o', 's'], markersize=8, linestyles=['-', '-'], ax=ax)
+    ax.set_title('Interacción entre Prime y Target en TR (log)\\n', fontsize=18, fontweight='bold', pad=20)
+    ax.set_xlabel('Target', fontsize=14, labelpad=15)
+    ax.set_ylabel('Tiempo de respuesta (log)', fontsize=14, labelpad=15)
+    handles, labels = ax.get_legend_handles_labels()
+    ax.legend(handles, labels, title='Raza', loc='upper right', framealpha=0.9, fontsize=12)
+
+    # Anotaciones con los valores medios
+    medias = datos.groupby(['target', 'prime'], sort=False)['rt_log'].mean()
+    primes = datos['prime'].unique()
+    for target_idx, target_val in enumerate(datos['target'].unique()):
+        for prime_idx, prime_val in enumerate(primes):
+            if (target_val, prime_val) in medias.index:
+                mean_val = medias[(target_val, prime_val)]
+                x_pos = target_idx + (prime_idx - 0.5) * 0.2
+                ax.text(x_pos, mean_val + 0.02, f'{mean_val:.2f}',
+                        ha='center', va='bottom', fontsize=10, fontweight='bold',
+                        bbox=dict(boxstyle='round,pad=0.2', facecolor='white', alpha=0.8))
+    fig.tight_layout()
+    return fig
+
+
+def qq_residuos(teoricos, muestrales, pendiente, intercepto, color, titulo):
+    """Q-Q normal de los residuos del ANOVA con su recta de referencia."""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    _qq_en_eje(ax, teoricos, muestrales, pendiente, intercepto, color)
+    ax.set_title(titulo)
+    fig.tight_layout()
+    return fig
+
+
+def pedido_qq_residuos(supuestos, color, titulo):
+    """Pedido `(qq_residuos, kwargs)` a partir del diccionario de `supuestos_cacheados`."""
+    return qq_residuos, dict(
+        teoricos=supuestos['qq_teoricos'], muestrales=supuestos['qq_muestrales'],
+        pendiente=supuestos['qq_pendiente'], intercepto=supuestos['qq_intercepto'],
+        color=color, titulo=titulo,
+    )
@@ -0,0 +1,115 @@
+"""
+Filtros interactivos de filas conductuales (rango de RT, sujetos y runs).
+
+Las apps filtraban con una máscara booleana sobre todo el DataFrame (O(n) por
+rerun) y, de hecho, el resultado no llegaba a ninguna pestaña. Aquí el
+DataFrame se indexa una vez por huella: las filas se preordenan por RT y se
+guardan el código de sujeto y de run de cada posición del orden. Un rango de
+RT es entonces un par de `searchsorted` y las inclusiones de sujetos / runs
+se resuelven con un mapa de bits por nivel (un booleano por sujeto o run)
+indexado por esos códigos: localizar las k filas de un rango cuesta
+O(log n + k). Para devolverlas en el orden original se marcan en una máscara
+booleana y se leen con `np.flatnonzero`, una pasada O(n) sin ordenar (mucho
+más barata que la máscara por comparaciones que sustituye, y sin el
+O(k log k) de ordenar las posiciones).
+
+El DataFrame filtrado se memoiza en `cache_analisis` por la especificación
+del filtro: las cachés posteriores (cubo, ANOVA, supuestos...) se indexan por
+la huella del contenido, de modo que solo se recalculan cuando el filtro
+cambia de verdad lo que queda, y volver a un filtro anterior es un acierto.
+"""
+import numpy as np
+import pandas as pd
+
+from cache_analisis import cache_analisis, huella_dataframe
+
+# Límites del filtro de outliers conductuales original (exclusivos)
+RT_MINIMO = 200.0
+RT_MAXIMO = 2000.0
+
+
+def _codigos(columna):
+    """Niveles (ordenados) y código int32 de cada fila; -1 para valores ausentes."""
+    categorica = pd.Categorical(columna)
+    if not categorica.ordered:
+        categorica = categorica.reorder_categories(sorted(categorica.categories))
+    return np.asarray(categorica.categories), categorica.codes.astype(np.int32)
+
+
+class IndiceEnsayos:
+    """Filas de un DataFrame preordenadas por `columna` con los códigos de sujeto y run."""
+
+    def __init__(self, df, columna='rt_raw', subject='id', run='run'):
+        valores = df[columna].to_numpy(dtype=np.float64)
+        # Orden estable: los NaN quedan al final y nunca caen dentro de un rango
+        self.orden = np.argsort(valores, kind='stable')
+        self.valores = valores[self.orden]
+        self.n_filas = len(valores)
+        self.sujetos, cod_sujeto = _codigos(df[subject])
+        self.cod_sujeto = cod_sujeto[self.orden]
+        if run in df.columns:
+            self.runs, cod_run = _codigos(df[run])
+            self.cod_run = cod_run[self.orden]
+        else:
+            self.runs, self.cod_run = np.array([]), None
+
+    def limites(self):
+        """Mínimo y máximo finitos de la columna indexada."""
+        finitos = self.valores[np.isfinite(self.valores)]
+        return (float(finitos[0]), float(finitos[-1])) if finitos.size else (0.0, 0.0)
+
+    def _mapa_bits(self, niveles, incluidos):
+        mapa = np.zeros(len(niveles) + 1, dtype=bool)  # la última posición es el código -1
+        mapa[:-1] = np.isin(niveles, np.asarray(list(incluidos), dtype=niveles.dtype))
+        return mapa
+
+    def filas(self, minimo=RT_MINIMO, maximo=RT_MAXIMO, sujetos=None, runs=None):
+        """
+        Posiciones (en el orden original) de las filas con `minimo < valor < maximo`
+        cuyo sujeto y run están en `sujetos` / `runs` (None = todos).
+        """
+        inicio = np.searchsorted(self.valores, minimo, side='right')
+        fin = np.searchsorted(self.valores, maximo, side='left')
+        seleccion = self.orden[inicio:fin]
+        conservar = None
+        if sujetos is not None:
+            conservar = self._mapa_bits(self.sujetos, sujetos)[self.cod_sujeto[inicio:fin]]
+        if runs is not None and self.cod_run is not None:
+            por_run = self._mapa_bits(self.runs, runs)[self.cod_run[inicio:fin]]
+            conservar = por_run if conservar is None else conservar & por_run
+        if conservar is not None:
+            seleccion = seleccion[conservar]
+        # Volver al orden original (tablas y gráficos no cambian de aspecto) sin ordenar
+        marca = np.zeros(self.n_filas, dtype=bool)
+        marca[seleccion] = True
+        return np.flatnonzero(marca)
+
+
+def indice_cacheado(df, columna='rt_raw', huella=None):
+    """`IndiceEnsayos` de `df`, construido una vez por huella del contenido."""
+    huella = huella or huella_dataframe(df)
+    return cache_analisis.obtener((huella, 'indice_ensayos', columna), lambda: IndiceEnsayos(df, columna))
+
+
+def filtrar_cacheado(df, minimo=RT_MINIMO, maximo=RT_MAXIMO, sujetos=None, runs=None, columna='rt_raw',
+                     huella=None):
+    """
+    Filas de `df` que pasan el filtro; el resultado se memoiza por la especificación.
+
+    Si el filtro no descarta nada se devuelve `df` tal cual, así las cachés
+    que dependen del dataset completo siguen sirviendo. Conviene pasar la
+    `huella` de `df` ya calculada (p. ej. una vez por versión del archivo):
+    recalcularla recorre todo el DataFrame en cada rerun.
+    """
+    huella = huella or huella_dataframe(df)
+    sujetos = None if sujetos is None else tuple(sorted(sujetos))
+    runs = None if runs is None else tuple(sorted(runs))
+    clave = (huella, 'filtro', columna, float(minimo), float(maximo), sujetos, runs)
+
+    def calcular():
+        filas = indice_cacheado(df, columna, huella).filas(minimo, maximo, sujetos, runs)
+        # None = sin descartes (no se guarda una copia del dataset completo)
+        return None if len(filas) == len(df) else df.take(filas).reset_index(drop=True)
+
+    filtrado = cache_analisis.obtener(clave, calcular)
+    return df if filtrado is None else filtrado
@@ -0,0 +1,324 @@
+"""
+Generador de datasets sintéticos con los mismos esquemas que los archivos reales.
+
+* `rt`: como `ANOVA beh RT.csv` (`"","id","run","prime","target","rt_raw","rt_log"`,
+  formato de `write.csv` de R): medias por sujeto × run × celda de los ensayos
+  simulados que pasan el filtro 200 < RT < 2000 ms.
+* `ensayos`: ensayos individuales como `beh_replication*.csv`
+  (`subjID,run,prime,target,RT`), opcionalmente `.gz` / `.zst`.
+* `neuro`: como `ANOVA object-sensitive_WIT.csv` (`id,prime,target,value`),
+  promedio de `n_voxeles` voxeles por sujeto y celda.
+* `voxeles`: `.npy` `(voxeles, sujetos, prime, target)` para el modo voxel a
+  voxel de `searchlight_voxel.py`, y opcionalmente el CSV `neuro` con su media.
+
+El modelo es un diseño 2 × 2 de medidas repetidas con codificación de efectos
+(prime: +½ Black / −½ White; target: +½ tool / −½ gun): `efecto_prime` es
+Black − White, `efecto_target` es tool − gun y `efecto_interaccion` es la
+diferencia del efecto de target entre Black y White. Cada sujeto tiene
+intercepto y pendiente de target aleatorios, y cada run un desplazamiento. Los
+RT son log-normales más una cola exponencial (`sesgo_ms`) y una fracción
+`tasa_atipicos` de respuestas anticipadas o tardías; `tasa_malformados`
+estropea los números con los patrones que repara `reparar_numeros` (espacios y
+puntos sobrantes). Todo se escribe por bloques de sujetos (o de voxeles), así
+que el tamaño del archivo no está limitado por la memoria; con la misma
+`semilla` y el mismo tamaño de bloque la salida es reproducible.
+
+Uso:
+    python generador_sintetico.py rt "ANOVA beh RT grande.csv" --sujetos 100000
+    python generador_sintetico.py ensayos beh_replication3.csv.gz --sujetos 5000 --ensayos 40
+    python generador_sintetico.py voxeles voxeles.npy --voxeles 20000 --csv neuro.csv
+"""
+import argparse
+import csv
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ensayos import RT_MAX, RT_MIN
+
+NIVELES_PRIME = np.array(['Black', 'White'], dtype=object)
+NIVELES_TARGET = np.array(['gun', 'tool'], dtype=object)
+CODIGO_PRIME = np.array([0.5, -0.5])
+CODIGO_TARGET = np.array([-0.5, 0.5])
+FILAS_POR_BLOQUE = 1 << 20
+
+
+def _celdas(orden_prime_primero=True):
+    """Índices de prime y target de las 4 celdas en el orden de filas del archivo."""
+    if orden_prime_primero:
+        # ANOVA beh RT.csv: Black-gun, Black-tool, White-gun, White-tool
+        return np.repeat([0, 1], 2), np.tile([0, 1], 2)
+    # Archivos neuro: Black-gun, White-gun, Black-tool, White-tool
+    return np.tile([0, 1], 2), np.repeat([0, 1], 2)
+
+
+def malformar(textos, tasa, rng):
+    """
+    Estropea una fracción `tasa` de `textos` (array de objetos) con espacios,
+    puntos duplicados o un punto inicial, de forma que `reparar_numeros`
+    recupere exactamente el número original.
+    """
+    if tasa <= 0:
+        return textos
+    indices = np.flatnonzero(rng.random(textos.size) < tasa)
+    patrones = rng.integers(0, 4, indices.size)
+    for i, patron in zip(indices, patrones):
+        v = textos[i]
+        if patron == 0 or '.' not in v:
+            textos[i] = f' {v} '
+        elif patron == 1:
+            corte = rng.integers(1, len(v)) if len(v) > 1 else 1
+            textos[i] = f'{v[:corte]}\t{v[corte:]}'
+        elif patron == 2:
+            textos[i] = v.replace('.', '..', 1)
+        else:
+            textos[i] = '.' + v
+    return textos
+
+
+class Simulador:
+    """Parámetros del diseño simulado y escritura en streaming de cada tipo de archivo."""
+
+    def __init__(self, n_sujetos=30, n_runs=6, n_ensayos=20, n_voxeles=100,
+                 media_log=6.15, efecto_prime=0.0, efecto_target=0.03, efecto_interaccion=0.02,
+                 sd_sujeto=0.12, sd_pendiente=0.02, sd_run=0.03, sd_ensayo=0.2, sesgo_ms=60.0,
+                 tasa_atipicos=0.02, tasa_malformados=0.0,
+                 media_valor=1.0, efectos_valor=(0.0, 0.01, 0.01), sd_sujeto_valor=0.03,
+                 sd_celda_valor=0.01, sd_voxel=0.05, fraccion_activos=0.1,
+                 semilla=0, filas_por_bloque=FILAS_POR_BLOQUE):
+        self.n_sujetos = n_sujetos
+        self.n_runs = n_runs
+        self.n_ensayos = n_ensayos
+        self.n_voxeles = n_voxeles
+        self.media_log = media_log
+        self.efectos = (efecto_prime, efecto_target, efecto_interaccion)
+        self.sd_sujeto = sd_sujeto
+        self.sd_pendiente = sd_pendiente
+        self.sd_run = sd_run
+        self.sd_ensayo = sd_ensayo
+        self.sesgo_ms = sesgo_ms
+        self.tasa_atipicos = tasa_atipicos
+        self.tasa_malformados = tasa_malformados
+        self.media_valor = media_valor
+        self.efectos_valor = tuple(efectos_valor)
+        self.sd_sujeto_valor = sd_sujeto_valor
+        self.sd_celda_valor = sd_celda_valor
+        self.sd_voxel = sd_voxel
+        self.fraccion_activos = fraccion_activos
+        self.semilla = semilla
+        self.filas_por_bloque = filas_por_bloque
+
+    # --- utilidades ---------------------------------------------------------
+    def _bloques(self, filas_por_sujeto):
+        """Rangos `[inicio, fin)` de sujetos con ~`filas_por_bloque` filas cada uno."""
+        paso = max(1, self.filas_por_bloque // max(filas_por_sujeto, 1))
+        for inicio in range(0, self.n_sujetos, paso):
+            yield inicio, min(inicio + paso, self.n_sujetos)
+
+    def _rng(self, *clave):
+        return np.random.default_rng([self.semilla, *clave])
+
+    @staticmethod
+    def _medias_celda(base, efectos, pendiente, prime, target):
+        """Media de cada sujeto en cada celda: `base + efectos` con pendiente de target aleatoria."""
+        ep, et, ei = efectos
+        cp, ct = CODIGO_PRIME[prime], CODIGO_TARGET[target]
+        return base[:, None] + ep * cp + (et + pendiente[:, None]) * ct + ei * cp * ct
+
+    # --- RT ------------------------------------------------------------------
+    def _ensayos_bloque(self, inicio, fin):
+        """RT (ms) de los sujetos `[inicio, fin)`, forma `(sujetos, runs, 4 celdas, ensayos)`."""
+        rng = self._rng(0, inicio)
+        n = fin - inicio
+        prime, target = _celdas()
+        base = self.media_log + rng.normal(0, self.sd_sujeto, n)
+        media = self._medias_celda(base, self.efectos, rng.normal(0, self.sd_pendiente, n), prime, target)
+        media = media[:, None, :] + rng.normal(0, self.sd_run, (n, self.n_runs, 1))
+        forma = (n, self.n_runs, 4, self.n_ensayos)
+        rt = np.exp(media[..., None] + rng.normal(0, self.sd_ensayo, forma))
+        if self.sesgo_ms > 0:
+            rt += rng.exponential(self.sesgo_ms, forma)
+        atipicos = rng.random(forma) < self.tasa_atipicos
+        n_atipicos = int(atipicos.sum())
+        if n_atipicos:
+            rapidos = rng.random(n_atipicos) < 0.5
+            rt[atipicos] = np.where(rapidos, rng.uniform(50, RT_MIN, n_atipicos),
+                                    rng.uniform(RT_MAX, 2 * RT_MAX, n_atipicos))
+        return rt, rng
+
+    def escribir_rt(self, ruta):
+        """CSV de medias por sujeto × run × celda con el formato de `ANOVA beh RT.csv`."""
+        prime, target = _celdas()
+        fila = 0
+        with pa.output_stream(ruta, compression='detect') as salida:
+            salida.write(b'"","id","run","prime","target","rt_raw","rt_log"\n')
+            for inicio, fin in self._bloques(self.n_runs * 4 * self.n_ensayos):
+                rt, _ = self._ensayos_bloque(inicio, fin)
+                # Mismo filtro que los scripts R antes de promediar
+                validos = (rt > RT_MIN) & (rt < RT_MAX)
+                n_validos = validos.sum(axis=-1)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    rt_raw = np.where(validos, rt, 0).sum(axis=-1) / n_validos
+                    rt_log = np.where(validos, np.log(rt), 0).sum(axis=-1) / n_validos
+                n = fin - inicio
+                bloque = pd.DataFrame({
+                    'id': np.repeat(np.arange(inicio + 1, fin + 1), self.n_runs * 4),
+                    'run': np.tile(np.repeat(np.arange(1, self.n_runs + 1), 4), n),
+                    'prime': NIVELES_PRIME[np.tile(prime, n * self.n_runs)],
+                    'target': NIVELES_TARGET[np.tile(target, n * self.n_runs)],
+                    'rt_raw': rt_raw.ravel(),
+                    'rt_log': rt_log.ravel(),
+                })
+                bloque = bloque[n_validos.ravel() > 0]
+                # Nombres de fila de R: "1", "2", ... entre comillas
+                bloque.index = np.arange(fila + 1, fila + len(bloque) + 1).astype(str).astype(object)
+                fila += len(bloque)
+                salida.write(bloque.to_csv(header=False, quoting=csv.QUOTE_NONNUMERIC).encode())
+        return fila
+
+    def escribir_ensayos(self, ruta):
+        """CSV de ensayos (`subjID,run,prime,target,RT`), sin filtrar, con RT malformados."""
+        prime, target = _celdas()
+        filas = 0
+        with pa.output_stream(ruta, compression='detect') as salida:
+            salida.write(b'subjID,run,prime,target,RT\n')
+            for inicio, fin in self._bloques(self.n_runs * 4 * self.n_ensayos):
+                rt, rng = self._ensayos_bloque(inicio, fin)
+                n = fin - inicio
+                por_run = 4 * self.n_ensayos
+                texto = np.char.mod('%.2f', rt.ravel()).astype(object)
+                bloque = pd.DataFrame({
+                    'subjID': np.repeat(np.arange(inicio + 1, fin + 1), self.n_runs * por_run),
+                    'run': np.tile(np.repeat(np.arange(1, self.n_runs + 1), por_run), n),
+                    'prime': NIVELES_PRIME[np.tile(np.repeat(prime, self.n_ensayos), n * self.n_runs)],
+                    'target': NIVELES_TARGET[np.tile(np.repeat(target, self.n_ensayos), n * self.n_runs)],
+                    'RT': malformar(texto, self.tasa_malformados, rng),
+                })
+                filas += len(bloque)
+                salida.write(bloque.to_csv(header=False, index=False).encode())
+        return filas
+
+    # --- neuro ---------------------------------------------------------------
+    def _verdad_neuro(self, inicio, fin):
+        """Valor medio verdadero por sujeto y celda (orden de los archivos neuro)."""
+        rng = self._rng(1, inicio)
+        n = fin - inicio
+        prime, target = _celdas(orden_prime_primero=False)
+        base = self.media_valor + rng.normal(0, self.sd_sujeto_valor, n)
+        media = self._medias_celda(base, self.efectos_valor, np.zeros(n), prime, target)
+        return media + rng.normal(0, self.sd_celda_valor, media.shape), rng
+
+    def _filas_neuro(self, inicio, fin, valores, rng):
+        prime, target = _celdas(orden_prime_primero=False)
+        n = fin - inicio
+        valores = valores.ravel().copy()
+        atipicos = np.flatnonzero(rng.random(valores.size) < self.tasa_atipicos)
+        if atipicos.size:
+            escala = self.sd_sujeto_valor + self.sd_celda_valor
+            valores[atipicos] += rng.choice([-1, 1], atipicos.size) * rng.uniform(6, 10, atipicos.size) * escala
+        texto = malformar(np.char.mod('%.15g', valores).astype(object), self.tasa_malformados, rng)
+        return pd.DataFrame({
+            'id': np.repeat(np.arange(inicio + 1, fin + 1), 4),
+            'prime': NIVELES_PRIME[np.tile(prime, n)],
+            'target': NIVELES_TARGET[np.tile(target, n)],
+            'value': texto,
+        })
+
+    def escribir_neuro(self, ruta):
+        """CSV `id,prime,target,value`: media de `n_voxeles` voxeles con ruido `sd_voxel` (forma cerrada)."""
+        filas = 0
+        with pa.output_stream(ruta, compression='detect') as salida:
+            salida.write(b'id,prime,target,value\n')
+            for inicio, fin in self._bloques(4):
+                verdad, rng = self._verdad_neuro(inicio, fin)
+                valores = verdad + rng.normal(0, self.sd_voxel / np.sqrt(self.n_voxeles), verdad.shape)
+                bloque = self._filas_neuro(inicio, fin, valores, rng)
+                filas += len(bloque)
+                salida.write(bloque.to_csv(header=False, index=False).encode())
+        return filas
+
+    def escribir_voxeles(self, ruta, ruta_csv=None, dtype=np.float32):
+        """
+        `.npy` `(voxeles, sujetos, prime, target)` escrito por bloques de voxeles.
+
+        Solo una fracción `fraccion_activos` de voxeles tiene la interacción; el
+        resto comparte los efectos principales. Con `ruta_csv` se escribe además
+        el CSV `neuro` con la media exacta de todos los voxeles.
+        """
+        verdad = np.empty((self.n_sujetos, 4))
+        for inicio, fin in self._bloques(4):
+            verdad[inicio:fin] = self._verdad_neuro(inicio, fin)[0]
+        # Orden neuro (Black-gun, White-gun, Black-tool, White-tool) -> [prime, target]
+        verdad = verdad.reshape(self.n_sujetos, 2, 2).transpose(0, 2, 1)
+        sin_interaccion = verdad - self.efectos_valor[2] * np.multiply.outer(CODIGO_PRIME, CODIGO_TARGET)
+
+        mapa = np.lib.format.open_memmap(ruta, mode='w+', dtype=dtype,
+                                         shape=(self.n_voxeles, self.n_sujetos, 2, 2))
+        suma = np.zeros_like(verdad)
+        paso = max(1, self.filas_por_bloque // (self.n_sujetos * 4))
+        for inicio in range(0, self.n_voxeles, paso):
+            fin = min(inicio + paso, self.n_voxeles)
+            rng = self._rng(2, inicio)
+            activos = rng.random(fin - inicio) < self.fraccion_activos
+            bloque = np.where(activos[:, None, None, None], verdad, sin_interaccion)
+            bloque = bloque + rng.normal(0, self.sd_voxel, bloque.shape)
+            mapa[inicio:fin] = bloque
+            suma += bloque.sum(axis=0)
+        mapa.flush()
+        del mapa
+
+        if ruta_csv is not None:
+            media = (suma / self.n_voxeles).transpose(0, 2, 1).reshape(self.n_sujetos, 4)
+            filas = pd.concat([self._filas_neuro(inicio, fin, media[inicio:fin], self._rng(3, inicio))
+                               for inicio, fin in self._bloques(4)])
+            filas.to_csv(ruta_csv, index=False)
+        return self.n_voxeles
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datasets sintéticos con los esquemas del dashboard.")
+    parser.add_argument('tipo', choices=['rt', 'ensayos', 'neuro', 'voxeles'])
+    parser.add_argument('salida', help="Ruta de salida (.csv, .csv.gz, .csv.zst o .npy para voxeles)")
+    parser.add_argument('--sujetos', type=int, default=30)
+    parser.add_argument('--runs', type=int, default=6)
+    parser.add_argument('--ensayos', type=int, default=20, help="Ensayos por sujeto × run × celda")
+    parser.add_argument('--voxeles', type=int, default=100)
+    parser.add_argument('--efecto-prime', type=float, default=0.0, help="Black − White (log RT)")
+    parser.add_argument('--efecto-target', type=float, default=0.03, help="tool − gun (log RT)")
+    parser.add_argument('--efecto-interaccion', type=float, default=0.02, help="Diferencia del efecto de target entre primes (log RT)")
+    parser.add_argument('--efectos-valor', type=float, nargs=3, default=(0.0, 0.01, 0.01),
+                        metavar=('PRIME', 'TARGET', 'INTERACCION'), help="Efectos en `value` (neuro / voxeles)")
+    parser.add_argument('--sd-sujeto', type=float, default=0.12)
+    parser.add_argument('--sd-ensayo', type=float, default=0.2)
+    parser.add_argument('--sesgo-ms', type=float, default=60.0, help="Media de la cola exponencial de los RT")
+    parser.add_argument('--tasa-atipicos', type=float, default=0.02)
+    parser.add_argument('--tasa-malformados', type=float, default=0.0)
+    parser.add_argument('--fraccion-activos', type=float, default=0.1, help="Voxeles con interacción")
+    parser.add_argument('--csv', default=None, help="Con `voxeles`: CSV neuro con la media de los voxeles")
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    simulador = Simulador(
+        n_sujetos=args.sujetos, n_runs=args.runs, n_ensayos=args.ensayos, n_voxeles=args.voxeles,
+        efecto_prime=args.efecto_prime, efecto_target=args.efecto_target,
+        efecto_interaccion=args.efecto_interaccion, efectos_valor=args.efectos_valor,
+        sd_sujeto=args.sd_sujeto, sd_ensayo=args.sd_ensayo, sesgo_ms=args.sesgo_ms,
+        tasa_atipicos=args.tasa_atipicos, tasa_malformados=args.tasa_malformados,
+        fraccion_activos=args.fraccion_activos, semilla=args.semilla,
+    )
+    if args.tipo == 'rt':
+        n = simulador.escribir_rt(args.salida)
+    elif args.tipo == 'ensayos':
+        n = simulador.escribir_ensayos(args.salida)
+    elif args.tipo == 'neuro':
+        n = simulador.escribir_neuro(args.salida)
+    else:
+        n = simulador.escribir_voxeles(args.salida, args.csv)
+    print(f"{n:,} {'voxeles' if args.tipo == 'voxeles' else 'filas'} -> {args.salida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Figuras Plotly ligeras para datos con muchas observaciones.
+
+En lugar de enviar cada observación al navegador (`px.box(..., points='all')`,
+Q-Q con `go.Scatter`), las estadísticas de caja se calculan en el servidor y
+los puntos superpuestos se diezman hasta un presupuesto fijo con un muestreo
+estratificado por rangos, que conserva la forma de la distribución. Los puntos
+se dibujan con `Scattergl` (WebGL).
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+PRESUPUESTO_PUNTOS = 5000
+UMBRAL_FILAS_LIGERO = 20000
+
+
+def estadisticos_caja(valores):
+    """Cuartiles, media y bigotes de Tukey (1.5 · IQR) como los calcula Plotly."""
+    v = np.asarray(valores, dtype=np.float64)
+    v = v[np.isfinite(v)]
+    q1, mediana, q3 = np.quantile(v, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    dentro = v[(v >= q1 - 1.5 * iqr) & (v <= q3 + 1.5 * iqr)]
+    return {
+        'q1': q1, 'median': mediana, 'q3': q3, 'mean': v.mean(),
+        'lowerfence': dentro.min(), 'upperfence': dentro.max(),
+    }
+
+
+def indices_diezmados(valores, presupuesto, rng=None):
+    """
+    Índices de como máximo `presupuesto` observaciones que preservan la densidad.
+
+    Se ordenan los valores, se dividen en `presupuesto` estratos de igual
+    número de observaciones y se toma un elemento al azar de cada estrato; el
+    mínimo y el máximo se conservan siempre.
+    """
+    n = len(valores)
+    if presupuesto is None or n <= presupuesto:
+        return np.arange(n)
+    rng = np.random.default_rng(0) if rng is None else rng
+    orden = np.argsort(np.asarray(valores), kind='stable')
+    bordes = np.linspace(0, n, presupuesto + 1)
+    inicio = np.floor(bordes[:-1]).astype(np.int64)
+    ancho = np.maximum(np.floor(bordes[1:]).astype(np.int64) - inicio, 1)
+    elegidos = inicio + (rng.random(presupuesto) * ancho).astype(np.int64)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    return orden[np.minimum(elegidos, n - 1)]
+
+
+def puntos_qq(teoricos, muestrales, presupuesto, colas=50):
+    """
+    Diezma un Q-Q ya ordenado a `presupuesto` puntos.
+
+    Se conservan las `colas` observaciones más extremas de cada lado (donde se
+    ven las desviaciones de la normalidad) y el resto se toma a rangos
+    equiespaciados.
+    """
+    n = len(muestrales)
+    if presupuesto is None or n <= presupuesto:
+        return np.asarray(teoricos), np.asarray(muestrales)
+    colas = min(colas, presupuesto // 4)
+    centro = np.linspace(colas, n - colas - 1, presupuesto - 2 * colas).round().astype(np.int64)
+    idx = np.unique(np.concatenate([np.arange(colas), centro, np.arange(n - colas, n)]))
+    return np.asarray(teoricos)[idx], np.asarray(muestrales)[idx]
+
+
+def traza_puntos(x, y, webgl=False, **kwargs):
+    """`go.Scattergl` en modo ligero, `go.Scatter` en caso contrario."""
+    clase = go.Scattergl if webgl else go.Scatter
+    return clase(x=x, y=y, **kwargs)
+
+
+def figura_caja_ligera(df, x, y, color, colores, nombres=None, orden_color=None,
+                       presupuesto=PRESUPUESTO_PUNTOS, semilla=0):
+    """
+    Diagrama de cajas agrupado con estadísticas precalculadas y puntos diezmados.
+
+    Cada caja se envía como sus seis estadísticos y los puntos superpuestos se
+    reparten entre grupos en proporción a su tamaño (muestreo estratificado por
+    rangos dentro de cada grupo) y se dibujan con `Scattergl`.
+    """
+    rng = np.random.default_rng(semilla)
+    nombres = nombres or {}
+    niveles_x = list(df[x].cat.categories) if hasattr(df[x], 'cat') else sorted(df[x].unique())
+    niveles_c = orden_color or (list(df[color].cat.categories) if hasattr(df[color], 'cat') else sorted(df[color].unique()))
+    n_total = len(df)
+    ancho = 0.8 / len(niveles_c)
+
+    fig = go.Figure()
+    grupos = df.groupby([x, color], observed=True)[y]
+    for j, nivel_c in enumerate(niveles_c):
+        desplazamiento = -0.4 + ancho * (j + 0.5)
+        posiciones, estadisticos = [], []
+        puntos_x, puntos_y = [], []
+        for i, nivel_x in enumerate(niveles_x):
+            if (nivel_x, nivel_c) not in grupos.groups:
+                continue
+            valores = grupos.get_group((nivel_x, nivel_c)).to_numpy(dtype=np.float64)
+            posiciones.append(i + desplazamiento)
+            estadisticos.append(estadisticos_caja(valores))
+            cupo = max(1, int(round(presupuesto * len(valores) / n_total)))
+            sel = valores[indices_diezmados(valores, cupo, rng)]
+            puntos_x.append(i + desplazamiento + rng.uniform(-ancho * 0.35, ancho * 0.35, size=sel.size))
+            puntos_y.append(sel)
+
+        color_traza = colores.get(nivel_c)
+        nombre = nombres.get(nivel_c, str(nivel_c))
+        fig.add_trace(go.Box(
+            x=posiciones,
+            q1=[e['q1'] for e in estadisticos],
+            median=[e['median'] for e in estadisticos],
+            q3=[e['q3'] for e in estadisticos],
+            lowerfence=[e['lowerfence'] for e in estadisticos],
+            upperfence=[e['upperfence'] for e in estadisticos],
+            mean=[e['mean'] for e in estadisticos],
+            width=ancho * 0.9,
+            name=nombre,
+            legendgroup=nombre,
+            marker_color=color_traza,
+            boxpoints=False,
+        ))
+        if puntos_y:
+            fig.add_trace(go.Scattergl(
+                x=np.concatenate(puntos_x),
+                y=np.concatenate(puntos_y),
+                mode='markers',
+                marker=dict(size=3, opacity=0.5, color=color_traza),
+                name=nombre,
+                legendgroup=nombre,
+                showlegend=False,
+                hoverinfo='y',
+            ))
+
+    fig.update_layout(
+        xaxis=dict(tickmode='array', tickvals=list(range(len(niveles_x))), ticktext=[str(v) for v in niveles_x]),
+    )
+    return fig
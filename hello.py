@@ -1,13 +1,29 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import scipy.stats as stats
-import pingouin as pg
-from scipy.stats import shapiro, levene
+import os
+import time
 import warnings
 
+from cache_analisis import cache_analisis, cubo_cacheado, huella_dataframe, rm_anova_cacheado
+from ingesta import firma_archivo
+from ensayos import es_archivo_ensayos
+from libros_excel import es_libro_excel
+from suficientes import actualizar_almacen
+from preparacion import COLUMNAS_NEURO, COLUMNAS_RT, cargar_tabla, clean_neuro_data
+from pestanas import (controles_filtros, panel_instrumentacion, pestana, registrar_tiempo, selector_pestanas,
+                      tabla_tiempos)
+from filtros import filtrar_cacheado, indice_cacheado
+from instrumentacion import instrumentacion
+from supuestos import supuestos_cacheados
+from figuras_mpl import (cache_figuras, caja_con_puntos, histograma_y_qq, interaccion_puntos,
+                         pedido_qq_residuos, renderizar_lote)
+from sketch_cuantiles import (PUNTOS_QQ, describir_cacheado, qq_desde_sketch,
+                              resumen_por_grupo_cacheado, sketches_cacheados)
+
+# Inicio del rerun: mide el tiempo de datos + KPIs antes de la pestaña visible
+inicio_script = time.perf_counter()
+
 # Ignorar warnings (por ejemplo, de pingouin o matplotlib)
 warnings.filterwarnings("ignore")
 
@@ -73,52 +89,71 @@ COLOR_PRIME_BLACK = '#3949AB' # Azul profundo para Black prime/Gun (Clase domina
 COLOR_PRIME_WHITE = '#E91E63' # Rosa brillante para White prime/Tool (Clase contrastante)
 
 @st.cache_data
-def load_data(file_name):
+def _cargar_tabla(file_name, columnas, firma):
+    """Lectura cacheada; `firma` (mtime, tamaño) invalida la caché si cambia el archivo."""
+    instrumentacion.anotar_cache(False)
+    return cargar_tabla(file_name, columnas)
+
+def load_data(file_name, columnas=None):
     """Función para cargar y cachear datos."""
     try:
-        df = pd.read_csv(file_name)
-        # Convertir a categórico
-        if 'id' in df.columns:
-            df['id'] = df['id'].astype('category')
-        if 'prime' in df.columns:
-            df['prime'] = df['prime'].astype('category')
-        if 'target' in df.columns:
-            df['target'] = df['target'].astype('category')
-        return df
+        with instrumentacion.etapa("Carga CSV") as medicion:
+            datos = _cargar_tabla(file_name, columnas, firma_archivo(file_name))
+            medicion.acierto_si_no_calculado()
+        return datos
     except FileNotFoundError:
-        st.error(f"Error: Archivo '{file_name}' no encontrado. Asegúrate de que los archivos CSV estén en la carpeta correcta.")
+        st.error(f"Error: Archivo '{file_name}' no encontrado. Asegúrate de que los archivos de datos (CSV o xlsx) estén en la carpeta correcta.")
         return pd.DataFrame()
 
+@st.cache_data(show_spinner=False)
+def _huella_tabla(file_name, columnas, firma):
+    """Huella del contenido que devuelve `load_data`; una vez por versión del archivo."""
+    return huella_dataframe(_cargar_tabla(file_name, columnas, firma))
+
+def huella_datos(file_name, columnas=None):
+    """Huella de `load_data(file_name, columnas)` sin recorrer el DataFrame en cada rerun."""
+    return _huella_tabla(file_name, columnas, firma_archivo(file_name))
+
+@st.cache_data(show_spinner=False)
+def _almacen_cacheado(file_name, dvs, firma):
+    """Estadísticos suficientes persistidos; si el CSV creció, solo se leen las filas nuevas."""
+    instrumentacion.anotar_cache(False)
+    return actualizar_almacen(file_name, list(dvs))[0]
+
+def almacen_incremental(file_name, dvs):
+    """Almacén del CSV, o None si no existe o es un archivo de ensayos o un libro de Excel."""
+    try:
+        if es_libro_excel(file_name) or es_archivo_ensayos(file_name):
+            return None
+        with instrumentacion.etapa("Almacén incremental") as medicion:
+            almacen = _almacen_cacheado(file_name, tuple(dvs), firma_archivo(file_name))
+            medicion.acierto_si_no_calculado()
+        return almacen
+    except FileNotFoundError:
+        return None
+
+def get_significance(p_val):
+    if p_val < 0.001: return "***"
+    elif p_val < 0.01: return "**"
+    elif p_val < 0.05: return "*"
+    else: return "ns"
+
 # Carga de todos los dataframes
-data_raw = load_data("ANOVA beh RT.csv")
-data_mvpa = load_data("ANOVA object-sensitive_WIT.csv")
-data_search = load_data("ANOVA searchlight_WIT.csv")
+# Datos conductuales: medias por run o un CSV de ensayos (también .gz / .zst)
+ARCHIVO_RT = os.environ.get("ARCHIVO_RT", "ANOVA beh RT.csv")
+
+data_raw = load_data(ARCHIVO_RT, COLUMNAS_RT)
+data_mvpa = load_data("ANOVA object-sensitive_WIT.csv", COLUMNAS_NEURO)
+data_search = load_data("ANOVA searchlight_WIT.csv", COLUMNAS_NEURO)
 
 # --- 2. PRE-PROCESAMIENTO Y FILTRADO (Manteniendo la lógica original) ---
 
 if not data_raw.empty:
-    data_limpia = data_raw.copy()
-    
-    # Filtrado de Outliers Conductuales
-    data_limpia_filtrada = data_limpia[
-        (data_limpia['rt_raw'] > 200) & (data_limpia['rt_raw'] < 2000)
-    ].copy()
+    # Filtrado de outliers conductuales: índice por RT para los controles de la barra lateral
+    huella_rt = huella_datos(ARCHIVO_RT, COLUMNAS_RT)
+    indice_rt = indice_cacheado(data_raw, huella=huella_rt)
     
     # Si los datos neuro están presentes, aplicar lógica de limpieza original (conversión de 'value')
-    def clean_neuro_data(df):
-        if not df.empty and 'value' in df.columns:
-            data = df.copy()
-            data['value'] = (data['value'].astype(str)
-                             .str.replace(r'\s+', '', regex=True)
-                             .str.replace(r'\.(?=.*\.)', '', regex=True)
-                             .astype(float))
-            # Asegurar factores
-            data['id'] = data['id'].astype('category')
-            data['prime'] = data['prime'].astype('category')
-            data['target'] = data['target'].astype('category')
-            return data
-        return df
-
     data_limpiamvpa = clean_neuro_data(data_mvpa)
     data_limpiasearch = clean_neuro_data(data_search)
 else:
@@ -133,6 +168,23 @@ with st.sidebar:
     st.markdown(" - Laura Camila Rodríguez G.")
     st.markdown("---")
     st.caption(f"Última Actualización: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M')}")
+    st.markdown("---")
+    # Estado de la caché de análisis (se rellena al final del script)
+    estado_cache = st.empty()
+    # Tiempos por pestaña y etapas del proceso (se rellenan al final del script)
+    estado_tiempos = st.empty()
+    estado_instrumentacion = st.empty()
+    if st.button("🔄 Invalidar caché de análisis"):
+        cache_analisis.invalidar()
+        st.rerun()
+    st.markdown("---")
+    # Filtro de ensayos: rango de RT, sujetos y runs (alimenta todas las pestañas)
+    data_limpia = filtrar_cacheado(data_raw, huella=huella_rt, **controles_filtros(indice_rt))
+    st.caption(f"{len(data_limpia):,} de {len(data_raw):,} filas tras el filtro.")
+
+if data_limpia.empty:
+    st.warning("El filtro de ensayos no deja ninguna fila; amplía el rango de RT o incluye más sujetos / runs.")
+    st.stop()
 
 # --- 4. TÍTULO PRINCIPAL Y TABS ---
 st.markdown("# Sesgos Raciales en la Percepción de Objetos")
@@ -144,11 +196,21 @@ st.markdown("## Juan David Roa - Laura Camila Rodríguez G.")
 st.markdown("---")
 st.subheader("🎯 Indicadores Clave de Desempeño (KPIs) Conductuales")
 
-# Calcular métricas importantes
-total_participantes = data_limpia['id'].nunique()
-media_rt_general = data_limpia['rt_raw'].mean()
-media_rt_log_general = data_limpia['rt_log'].mean()
-desviacion_estandar_rt = data_limpia['rt_raw'].std()
+# Calcular métricas importantes (desde el almacén incremental cuando existe y el
+# filtro no descarta filas: el almacén resume el CSV completo)
+almacen_rt = almacen_incremental(ARCHIVO_RT, ['rt_raw', 'rt_log']) if len(data_limpia) == len(data_raw) else None
+if almacen_rt is not None:
+    kpis_rt = almacen_rt.kpis()
+    total_participantes = kpis_rt['total_participantes']
+    media_rt_general = kpis_rt['media']['rt_raw']
+    media_rt_log_general = kpis_rt['media']['rt_log']
+    desviacion_estandar_rt = kpis_rt['std']['rt_raw']
+else:
+    kpis_rt = cubo_cacheado(data_limpia).kpis()
+    total_participantes = kpis_rt['total_participantes']
+    media_rt_general = kpis_rt['media']['rt_raw']
+    media_rt_log_general = kpis_rt['media']['rt_log']
+    desviacion_estandar_rt = kpis_rt['std']['rt_raw']
 
 # Crear columnas para las métricas
 col_p, col_rt_mean, col_rt_log_mean, col_rt_std = st.columns(4)
@@ -166,19 +228,26 @@ st.markdown("---")
 # ==============================================================================
 # === FIN DE LA SECCIÓN KPI ===
 # ==============================================================================
-
-tab_intro, tab_viz, tab_anova_beh, tab_anova_mvpa, tab_anova_search = st.tabs([
-    "📝 Introducción y Exploración", 
-    "📈 Visualización de Interacción", 
-    "📊 ANOVA Conductual (RT)", 
+segundos_kpis = time.perf_counter() - inicio_script
+registrar_tiempo("Datos + KPIs", segundos_kpis)
+instrumentacion.registrar("Datos + KPIs", segundos_kpis)
+
+# Solo se ejecuta la pestaña visible (ver `pestanas.py`)
+NOMBRES_PESTANAS = [
+    "📝 Introducción y Exploración",
+    "📈 Visualización de Interacción",
+    "📊 ANOVA Conductual (RT)",
     "🧠 ANOVA MVPA (Sensitive WIT)",
     "🔍 ANOVA Searchlight (WIT)"
-])
+]
+pestana_activa = selector_pestanas(NOMBRES_PESTANAS)
+contenedor_pestana = st.container()
 
 # ==============================================================================
 # === TAB 1: INTRODUCCIÓN Y EXPLORACIÓN ===
 # ==============================================================================
-with tab_intro:
+@pestana("📝 Introducción y Exploración")
+def pestana_intro():
     st.header("Introducción y Contexto Experimental")
     st.write(
         "Este informe presenta un análisis exploratorio de datos (EDA) " 
@@ -199,98 +268,67 @@ with tab_intro:
     
     # Resumen Estadístico
     st.markdown("### Resumen Estadístico")
-    st.dataframe(data_raw.describe().round(2))
+    st.dataframe(describir_cacheado(data_raw).round(2))
     st.markdown("**Comentario**: Se verifican las variables y la ausencia de valores faltantes. El conjunto de datos contiene las columnas `prime`, `target`, `rt_raw` y `rt_log`, listas para el análisis.")
     
     # Balance
     st.markdown("### Balance del Diseño")
-    tabla = pd.crosstab(data_limpia['prime'], data_limpia['target'])
+    tabla = cubo_cacheado(data_limpia).balance()
     st.dataframe(tabla)
     st.markdown("**Comentario**: El diseño está balanceado: cada combinación de `prime` y `target` tiene el mismo número de observaciones, lo cual es necesario para un análisis de varianza válido.")
     
     st.markdown("---")
     
     st.header("Distribución de los Tiempos de Reacción (RT)")
+    # Sketches de cuantiles (cacheados) para los Q-Q plots
+    sketches_rt = sketches_cacheados(data_limpia, ['rt_raw', 'rt_log'])
     
     # --- Distribución Datos Brutos y Transformados ---
+    # Las dos figuras se dibujan (si no están en caché) en paralelo
+    img_raw, img_log = renderizar_lote([
+        (histograma_y_qq, dict(valores=data_limpia['rt_raw'].to_numpy(),
+                               qq=qq_desde_sketch(sketches_rt['rt_raw'], PUNTOS_QQ)[:4],
+                               color=COLOR_AZULITO, titulo='Datos Brutos',
+                               etiqueta_x='Tiempo de reacción (ms)')),
+        (histograma_y_qq, dict(valores=data_limpia['rt_log'].to_numpy(),
+                               qq=qq_desde_sketch(sketches_rt['rt_log'], PUNTOS_QQ)[:4],
+                               color=COLOR_ROSITA, titulo='Datos Transformados',
+                               etiqueta_x='log(Tiempo de reacción)')),
+    ])
     col_raw_dist, col_log_dist = st.columns(2)
 
     with col_raw_dist:
         st.subheader("Datos Brutos ($RT_{raw}$)")
-        # Gráficos de Datos Brutos (COLORES ACTUALIZADOS)
-        plt.style.use('seaborn-v0_8-whitegrid')
-        fig_raw, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
-        
-        sns.histplot(data=data_limpia, x='rt_raw', bins=30, color=COLOR_AZULITO, edgecolor='black', ax=ax1)
-        ax1.set_title('Histograma: Datos Brutos', fontsize=14, fontweight='bold')
-        ax1.set_xlabel('Tiempo de reacción (ms)', fontsize=12)
-        
-        stats.probplot(data_limpia['rt_raw'], dist="norm", plot=ax2)
-        ax2.get_lines()[0].set_markerfacecolor(COLOR_AZULITO)
-        ax2.get_lines()[0].set_markeredgecolor(COLOR_AZULITO)  # <-- CORREGIDO
-        ax2.get_lines()[1].set_color('black')
-        ax2.set_title('Q-Q Plot: Datos Brutos', fontsize=14, fontweight='bold', pad=20)
-        
-        plt.tight_layout()
-        st.pyplot(fig_raw)
+        st.image(img_raw, width='stretch')
         st.markdown("**Comentario**: Los tiempos de reacción brutos muestran una fuerte asimetría positiva, lo que viola el supuesto de normalidad. Se justifica la transformación logarítmica.")
 
     with col_log_dist:
         st.subheader("Datos Transformados ($RT_{log}$)")
-        # Gráficos de Datos Transformados (COLORES ACTUALIZADOS)
-        plt.style.use('seaborn-v0_8-whitegrid')
-        fig_log, (ax3, ax4) = plt.subplots(1, 2, figsize=(16, 6))
-        
-        sns.histplot(data=data_limpia, x='rt_log', bins=30, color=COLOR_ROSITA, edgecolor='black', ax=ax3)
-        ax3.set_title('Histograma: Datos Transformados', fontsize=14, fontweight='bold')
-        ax3.set_xlabel('log(Tiempo de reacción)', fontsize=12)
-
-        stats.probplot(data_limpia['rt_log'], dist="norm", plot=ax4)
-        ax4.get_lines()[0].set_markerfacecolor(COLOR_ROSITA)
-        ax4.get_lines()[0].set_markeredgecolor(COLOR_ROSITA) # <-- CORREGIDO
-        ax4.get_lines()[1].set_color('black')
-        ax4.set_title('Q-Q Plot: Datos Transformados', fontsize=14, fontweight='bold', pad=20)
-        
-        plt.tight_layout()
-        st.pyplot(fig_log)
+        st.image(img_log, width='stretch')
         st.markdown("**Comentario**: La transformación logarítmica mejora significativamente la normalidad de los datos, haciendo que la distribución se aproxime más a una normal. Es adecuada para análisis paramétricos posteriores.")
 
 # ==============================================================================
 # === TAB 2: VISUALIZACIÓN DE INTERACCIÓN (Mann-Whitney ELIMINADO) ===
 # ==============================================================================
-with tab_viz:
+@pestana("📈 Visualización de Interacción")
+def pestana_viz():
     st.header("Visualización Detallada de la Interacción Esperada")
 
+    # Cajas e interacción en un solo lote (en paralelo si falta alguna en caché)
+    datos_fig = data_limpia[['prime', 'target', 'rt_log']]
+    img_cajas, img_interaccion = renderizar_lote([
+        (caja_con_puntos, dict(datos=datos_fig,
+                               colores={"gun": COLOR_PRIME_BLACK, "tool": COLOR_PRIME_WHITE})),
+        (interaccion_puntos, dict(datos=datos_fig,
+                                  colores={"Black": COLOR_PRIME_BLACK, "White": COLOR_PRIME_WHITE})),
+    ])
+
     # --- Boxplot y Estadísticas ---
     col1, col2 = st.columns([2, 1])
 
     with col1:
         st.subheader("Diagrama de Cajas de Tiempo de Respuesta (log)")
-        # Generación del Boxplot (COLORES ACTUALIZADOS)
-        plt.style.use('seaborn-v0_8-whitegrid')
-        fig, ax = plt.subplots(figsize=(14, 8))
-        
-        sns.boxplot(data=data_limpia, x='prime', y='rt_log', hue='target', 
-                    palette={"gun": COLOR_PRIME_BLACK, "tool": COLOR_PRIME_WHITE},
-                    dodge=True, width=0.8, ax=ax, showfliers=False)
-        
-        sns.stripplot(data=data_limpia, x='prime', y='rt_log', hue='target',
-                      palette={"gun": COLOR_PRIME_BLACK, "tool": COLOR_PRIME_WHITE},
-                      dodge=True, ax=ax, size=3, alpha=0.5, jitter=True, legend=False)
-        
-        ax.set_title('Diagrama de cajas de tiempo de respuesta (log)\\n', fontsize=16, fontweight='bold')
-        ax.set_xlabel('Raza del prime', fontsize=14, labelpad=10)
-        ax.set_ylabel('Tiempo de respuesta (log)', fontsize=14, labelpad=10)
-        
-        handles, labels = ax.get_legend_handles_labels()
-        unique_labels = ['Arma', 'Herramienta']
-        ax.legend(handles[:2], unique_labels, title='Target', loc='upper right', framealpha=0.9)
-        
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.grid(True, alpha=0.3, axis='y')
-        plt.tight_layout()
-        st.pyplot(fig)
+        st.image(img_cajas, width='stretch')
 
         # INTERPRETACIÓN MOVIDA AQUÍ (Bajo el Boxplot)
         st.markdown(
@@ -303,9 +341,11 @@ with tab_viz:
 
     with col2:
         st.subheader("Estadísticas por Grupo")
-        stats_df = data_limpia.groupby(['prime', 'target'])['rt_log'].agg([
-            'count', 'mean', 'std', 'median'
-        ]).round(3)
+        stats_df = resumen_por_grupo_cacheado(data_limpia, 'rt_log', ['prime', 'target'])
+        if almacen_rt is not None:
+            # count, mean y std actualizados incrementalmente (alineados por celda); la mediana sale del sketch
+            stats_df[['count', 'mean', 'std']] = almacen_rt.tabla_celdas('rt_log').reindex(stats_df.index)
+        stats_df = stats_df.round(3)
         st.dataframe(stats_df, use_container_width=True)
         
         st.subheader("Tests de Inferencia Univariados")
@@ -315,36 +355,7 @@ with tab_viz:
     
     st.header("Gráfico de Interacción - Prime vs Target")
     
-    sns.set_style("whitegrid")
-    fig, ax = plt.subplots(figsize=(12, 7))
-    
-    # Crear gráfico de interacción con seaborn (COLORES ACTUALIZADOS)
-    sns.pointplot(data=data_limpia, x='target', y='rt_log', hue='prime',
-                  palette={"Black": COLOR_PRIME_BLACK, "White": COLOR_PRIME_WHITE},
-                  dodge=0.2, join=True, errwidth=2, capsize=0.1,
-                  markers=['o', 's'], markersize=8, linestyles=['-', '-'],
-                  ax=ax)
-    
-    ax.set_title('Interacción entre Prime y Target en TR (log)\\n', fontsize=18, fontweight='bold', pad=20)
-    ax.set_xlabel('Target', fontsize=14, labelpad=15)
-    ax.set_ylabel('Tiempo de respuesta (log)', fontsize=14, labelpad=15)
-    
-    handles, labels = ax.get_legend_handles_labels()
-    ax.legend(handles, labels, title='Raza', loc='upper right', framealpha=0.9, fontsize=12)
-    
-    # Añadir anotaciones con valores medios
-    for target_idx, target_val in enumerate(data_limpia['target'].unique()):
-        for prime_idx, prime_val in enumerate(data_limpia['prime'].unique()):
-            subset = data_limpia[(data_limpia['target'] == target_val) & (data_limpia['prime'] == prime_val)]
-            if len(subset) > 0:
-                mean_val = subset['rt_log'].mean()
-                x_pos = target_idx + (prime_idx - 0.5) * 0.2
-                ax.text(x_pos, mean_val + 0.02, f'{mean_val:.2f}', 
-                        ha='center', va='bottom', fontsize=10, fontweight='bold',
-                        bbox=dict(boxstyle='round,pad=0.2', facecolor='white', alpha=0.8))
-    
-    plt.tight_layout()
-    st.pyplot(fig)
+    st.image(img_interaccion, width='stretch')
     
     st.markdown(
         "**Comentario**: Este gráfico muestra claramente la no-paralelidad, indicando una interacción significativa entre prime y target: la línea para el prime Black (**Azul**) muestra una mayor separación entre herramientas y armas, mientras que la del prime White (**Rosa**) es más plana. Este patrón refleja que los participantes responden más lentamente a herramientas tras un prime Black, pero su velocidad para identificar armas no varía significativamente según el prime — evidencia conductual del sesgo racial implícito."
@@ -353,28 +364,25 @@ with tab_viz:
 # ==============================================================================
 # === TAB 3: ANOVA CONDUCTUAL (RT) ===
 # ==============================================================================
-with tab_anova_beh:
+@pestana("📊 ANOVA Conductual (RT)")
+def pestana_anova_beh():
     st.header("📊 ANOVA de Medidas Repetidas: Tiempos de Reacción ($RT_{log}$)")
     
-    # CÁLCULO ANOVA 
-    anova_rt = pg.rm_anova(
-        data=data_limpia, 
-        dv='rt_log', 
-        within=['prime', 'target'], 
-        subject='id', 
-        detailed=True
-    )
+    # CÁLCULO ANOVA (cacheado por huella de datos)
+    if almacen_rt is not None:
+        anova_rt = almacen_rt.anova('rt_log')
+    else:
+        anova_rt = rm_anova_cacheado(
+            data_limpia,
+            dv='rt_log',
+            within=['prime', 'target'],
+            subject='id'
+        )
     
     st.subheader("Resultados ANOVA: Conductual")
     st.dataframe(anova_rt.round(4))
     
     st.subheader("📈 Resumen de Significancia")
-    def get_significance(p_val):
-        if p_val < 0.001: return "***"
-        elif p_val < 0.01: return "**"
-        elif p_val < 0.05: return "*"
-        else: return "ns"
-        
     for _, row in anova_rt.iterrows():
         efecto = row['Source']
         p_val = row['p-unc']
@@ -388,38 +396,24 @@ with tab_anova_beh:
     
     st.header("🔍 Análisis de Supuestos (Residuos Conductuales)")
     
-    # 1. CÁLCULO DE RESIDUOS 
-    y_bar_total = data_limpia['rt_log'].mean()
-    mean_sujeto = data_limpia.groupby('id')['rt_log'].mean().reset_index().rename(columns={'rt_log': 'y_bar_sujeto'})
-    mean_celda = data_limpia.groupby(['prime', 'target'])['rt_log'].mean().reset_index().rename(columns={'rt_log': 'y_bar_celda'})
-    
-    data_resid = data_limpia.merge(mean_sujeto, on='id').merge(mean_celda, on=['prime', 'target'])
-    data_resid['residual'] = data_resid['rt_log'] - data_resid['y_bar_celda'] - data_resid['y_bar_sujeto'] + y_bar_total
-    residuos = data_resid['residual']
+    # 1. CÁLCULO DE RESIDUOS Y SUPUESTOS (motor compartido y cacheado)
+    supuestos_rt = supuestos_cacheados(data_limpia, 'rt_log', ['prime', 'target'], 'id')
     
     col_test, col_qq = st.columns([1, 2])
     
     with col_test:
         st.subheader("Pruebas Estadísticas")
         # Shapiro-Wilk
-        shapiro_stat, shapiro_p = shapiro(residuos)
+        shapiro_p = supuestos_rt['shapiro_p']
         st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
         # Levene
-        grupos = [grupo['residual'].values for _, grupo in data_resid.groupby(['prime', 'target'])]
-        levene_stat, levene_p = levene(*grupos)
+        levene_p = supuestos_rt['levene_p']
         st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
         
     with col_qq:
         st.subheader("Q-Q Plot de Residuos")
-        # Q-Q Plot Residuos (COLOR ACTUALIZADO)
-        fig, ax = plt.subplots(figsize=(10, 6))
-        stats.probplot(residuos, dist="norm", plot=ax)
-        ax.get_lines()[0].set_markerfacecolor(COLOR_AZULITO)
-        ax.get_lines()[0].set_markeredgecolor(COLOR_AZULITO) # <-- CORREGIDO
-        ax.get_lines()[1].set_color('black')
-        ax.set_title('Q-Q Plot de los residuos (ANOVA - tiempos de reacción)')
-        plt.tight_layout()
-        st.pyplot(fig)
+        (img_qq,) = renderizar_lote([pedido_qq_residuos(supuestos_rt, COLOR_AZULITO, 'Q-Q Plot de los residuos (ANOVA - tiempos de reacción)')])
+        st.image(img_qq, width='stretch')
         
     st.markdown(
         "**Comentario sobre supuestos**: La normalidad y homocedasticidad de los residuos son razonables para proseguir con el ANOVA. El diseño de medidas repetidas asume independencia de ensayos, lo cual se considera válido por la aleatorización del orden experimental."
@@ -428,20 +422,27 @@ with tab_anova_beh:
 # ==============================================================================
 # === TAB 4: ANOVA MVPA (Sensitive WIT) ===
 # ==============================================================================
-with tab_anova_mvpa:
+@pestana("🧠 ANOVA MVPA (Sensitive WIT)")
+def pestana_anova_mvpa():
     st.header("🧠 ANOVA de Medidas Repetidas: MVPA - Sensitive WIT")
     
     if not data_limpiamvpa.empty:
-        # CÁLCULO ANOVA
-        anova_mvpa = pg.rm_anova(
-            data=data_limpiamvpa, 
-            dv='value', 
-            within=['prime', 'target'], 
-            subject='id', 
-            detailed=True
-        )
+        # CÁLCULO ANOVA (cacheado por huella de datos)
+        almacen_mvpa = almacen_incremental("ANOVA object-sensitive_WIT.csv", ['value'])
+        if almacen_mvpa is not None:
+            anova_mvpa = almacen_mvpa.anova('value')
+        else:
+            anova_mvpa = rm_anova_cacheado(
+                data_limpiamvpa,
+                dv='value',
+                within=['prime', 'target'],
+                subject='id'
+            )
         
         st.subheader("Resultados ANOVA: MVPA")
+        reporte_value = data_limpiamvpa.attrs.get('reparacion_value')
+        if reporte_value:
+            st.caption(f"Limpieza de `value`: {reporte_value['reparadas']} de {reporte_value['celdas']} celdas reparadas.")
         st.dataframe(anova_mvpa.round(4))
         
         st.subheader("📈 Resumen de Significancia")
@@ -454,44 +455,24 @@ with tab_anova_mvpa:
         
         st.header("🔍 Análisis de Supuestos (Residuos MVPA)")
         
-        # 1. CÁLCULO DE RESIDUOS 
-        y_bar_total_mvpa = data_limpiamvpa['value'].mean()
-        mean_sujeto_mvpa = data_limpiamvpa.groupby('id')['value'].mean().reset_index().rename(columns={'value': 'y_bar_sujeto_mvpa'})
-        mean_celda_mvpa = data_limpiamvpa.groupby(['prime', 'target'])['value'].mean().reset_index().rename(columns={'value': 'y_bar_celda_mvpa'})
-        
-        data_resid_mvpa = (data_limpiamvpa
-                            .merge(mean_sujeto_mvpa, on='id')
-                            .merge(mean_celda_mvpa, on=['prime', 'target']))
-        
-        data_resid_mvpa['residual_mvpa'] = (data_resid_mvpa['value'] - 
-                                            data_resid_mvpa['y_bar_celda_mvpa'] - 
-                                            data_resid_mvpa['y_bar_sujeto_mvpa'] + 
-                                            y_bar_total_mvpa)
-        residuos_mvpa = data_resid_mvpa['residual_mvpa']
+        # 1. CÁLCULO DE RESIDUOS Y SUPUESTOS (motor compartido y cacheado)
+        supuestos_mvpa = supuestos_cacheados(data_limpiamvpa, 'value', ['prime', 'target'], 'id')
         
         col_test_mvpa, col_qq_mvpa = st.columns([1, 2])
         
         with col_test_mvpa:
             st.subheader("Pruebas Estadísticas")
             # Shapiro-Wilk
-            shapiro_stat, shapiro_p = shapiro(residuos_mvpa)
+            shapiro_p = supuestos_mvpa['shapiro_p']
             st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
             # Levene
-            grupos = [grupo['residual_mvpa'].values for _, grupo in data_resid_mvpa.groupby(['prime', 'target'])]
-            levene_stat, levene_p = levene(*grupos)
+            levene_p = supuestos_mvpa['levene_p']
             st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
             
         with col_qq_mvpa:
             st.subheader("Q-Q Plot de Residuos MVPA")
-            # Q-Q Plot Residuos MVPA (COLOR ACTUALIZADO)
-            fig, ax = plt.subplots(figsize=(10, 6))
-            stats.probplot(residuos_mvpa, dist="norm", plot=ax)
-            ax.get_lines()[0].set_markerfacecolor(COLOR_PRIME_BLACK)
-            ax.get_lines()[0].set_markeredgecolor(COLOR_PRIME_BLACK) # <-- CORREGIDO
-            ax.get_lines()[1].set_color('black')
-            ax.set_title('Q-Q Plot de los residuos (ANOVA - MVPA)')
-            plt.tight_layout()
-            st.pyplot(fig)
+            (img_qq,) = renderizar_lote([pedido_qq_residuos(supuestos_mvpa, COLOR_PRIME_BLACK, 'Q-Q Plot de los residuos (ANOVA - MVPA)')])
+            st.image(img_qq, width='stretch')
             
         st.markdown(
             "**Comentario**: Los supuestos del ANOVA para los datos MVPA se evalúan mediante normalidad de residuos (Shapiro-Wilk) y homocedasticidad entre celdas (Levene). Un p > 0.05 en ambas pruebas apoya la validez del modelo."
@@ -502,20 +483,27 @@ with tab_anova_mvpa:
 # ==============================================================================
 # === TAB 5: ANOVA SEARCHLIGHT (WIT) ===
 # ==============================================================================
-with tab_anova_search:
+@pestana("🔍 ANOVA Searchlight (WIT)")
+def pestana_anova_search():
     st.header("🔍 ANOVA de Medidas Repetidas: Searchlight WIT")
     
     if not data_limpiasearch.empty:
-        # CÁLCULO ANOVA
-        anova_search = pg.rm_anova(
-            data=data_limpiasearch, 
-            dv='value', 
-            within=['prime', 'target'], 
-            subject='id', 
-            detailed=True
-        )
+        # CÁLCULO ANOVA (cacheado por huella de datos)
+        almacen_search = almacen_incremental("ANOVA searchlight_WIT.csv", ['value'])
+        if almacen_search is not None:
+            anova_search = almacen_search.anova('value')
+        else:
+            anova_search = rm_anova_cacheado(
+                data_limpiasearch,
+                dv='value',
+                within=['prime', 'target'],
+                subject='id'
+            )
         
         st.subheader("Resultados ANOVA: Searchlight")
+        reporte_value = data_limpiasearch.attrs.get('reparacion_value')
+        if reporte_value:
+            st.caption(f"Limpieza de `value`: {reporte_value['reparadas']} de {reporte_value['celdas']} celdas reparadas.")
         st.dataframe(anova_search.round(4))
         
         st.subheader("📈 Resumen de Significancia")
@@ -528,34 +516,46 @@ with tab_anova_search:
         
         st.header("🔍 Análisis de Supuestos (Residuos Searchlight)")
         
-        # 1. CÁLCULO DE RESIDUOS 
-        y_bar_total_search = data_limpiasearch['value'].mean()
-        mean_sujeto_search = data_limpiasearch.groupby('id')['value'].mean().reset_index().rename(columns={'value': 'y_bar_sujeto_search'})
-        mean_celda_search = data_limpiasearch.groupby(['prime', 'target'])['value'].mean().reset_index().rename(columns={'value': 'y_bar_celda_search'})
-        
-        data_resid_search = (data_limpiasearch
-                            .merge(mean_sujeto_search, on='id')
-                            .merge(mean_celda_search, on=['prime', 'target']))
-        
-        data_resid_search['residual_search'] = (data_resid_search['value'] - 
-                                                data_resid_search['y_bar_celda_search'] - 
-                                                data_resid_search['y_bar_sujeto_search'] + 
-                                                y_bar_total_search)
-        residuos_search = data_resid_search['residual_search']
+        # 1. CÁLCULO DE RESIDUOS Y SUPUESTOS (motor compartido y cacheado)
+        supuestos_search = supuestos_cacheados(data_limpiasearch, 'value', ['prime', 'target'], 'id')
         
         col_test_search, col_qq_search = st.columns([1, 2])
         
         with col_test_search:
             st.subheader("Pruebas Estadísticas")
             # Shapiro-Wilk
-            shapiro_stat, shapiro_p = shapiro(residuos_search)
+            shapiro_p = supuestos_search['shapiro_p']
             st.metric("Normalidad (Shapiro-Wilk)", f"p = {shapiro_p:.4f}")
             # Levene
-            grupos = [grupo['residual_search'].values for _, grupo in data_resid_search.groupby(['prime', 'target'])]
-            levene_stat, levene_p = levene(*grupos)
+            levene_p = supuestos_search['levene_p']
             st.metric("Homogeneidad (Levene)", f"p = {levene_p:.4f}")
             
         with col_qq_search:
             st.subheader("Q-Q Plot de Residuos Searchlight")
             # Q-Q Plot Residuos Searchlight (COLOR ACTUALIZADO)
+            (img_qq,) = renderizar_lote([pedido_qq_residuos(supuestos_search, COLOR_PRIME_WHITE, 'Q-Q Plot de los residuos (ANOVA - Searchlight)')])
+            st.image(img_qq, width='stretch')
+
+with contenedor_pestana:
+    dict(zip(NOMBRES_PESTANAS, [
+        pestana_intro, pestana_viz, pestana_anova_beh, pestana_anova_mvpa, pestana_anova_search
+    ]))[pestana_activa]()
+
+# Tiempos: datos + KPIs frente a la pestaña visible
+estado_tiempos.dataframe(tabla_tiempos().round(3), use_container_width=True)
+
+# Contadores de la caché tras ejecutar la pestaña visible
+stats_cache = cache_analisis.estadisticas()
+stats_figuras = cache_figuras.estadisticas()
+estado_cache.caption(
+    f"Caché de análisis: {stats_cache['aciertos']} aciertos · "
+    f"{stats_cache['fallos']} fallos · {stats_cache['entradas']} entradas  \n"
+    f"Caché de figuras: {stats_figuras['aciertos']} aciertos · {stats_figuras['fallos']} fallos · "
+    f"{stats_figuras['bytes'] / 2**20:.1f} MB"
+)
 
+# Etapas del proceso y latencia del rerun completo
+instrumentacion.registrar("Rerun completo", time.perf_counter() - inicio_script)
+instrumentacion.volcar_prometheus()
+with estado_instrumentacion.container():
+    panel_instrumentacion()
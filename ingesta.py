@@ -0,0 +1,254 @@
+"""
+Capa de ingesta columnar: CSV -> Parquet tipado con factores dictionary-encoded.
+
+La primera lectura de cada CSV lo convierte a Parquet en `.cache_datos/`; las
+siguientes leen el Parquet con proyección de columnas. La copia se invalida
+por mtime/tamaño y, si estos cambian, por hash SHA-256 del contenido (un
+`touch` sin cambios no obliga a reconvertir). Los archivos de la caché se
+nombran por la ruta absoluta del origen (dos `data.csv` de carpetas distintas
+no se pisan) y se escriben a través de temporales únicos, así que varios
+procesos pueden convertir a la vez.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+DIR_CACHE = '.cache_datos'
+COLUMNAS_FACTOR = ('id', 'prime', 'target')
+
+
+def hash_archivo(ruta, tam_bloque=1 << 20):
+    """SHA-256 del archivo leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as fh:
+        for bloque in iter(lambda: fh.read(tam_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def firma_archivo(ruta):
+    """(mtime_ns, tamaño) del archivo; lanza FileNotFoundError si no existe."""
+    st = os.stat(ruta)
+    return st.st_mtime_ns, st.st_size
+
+
+def _nombres_como_pandas(nombres):
+    """Reproduce los nombres que asigna `pd.read_csv` a cabeceras vacías o repetidas."""
+    vistos = {}
+    salida = []
+    for i, nombre in enumerate(nombres):
+        if nombre == '':
+            nombre = f'Unnamed: {i}'
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombre = f'{nombre}.{vistos[nombre]}'
+        else:
+            vistos[nombre] = 0
+        salida.append(nombre)
+    return salida
+
+
+def codificar_factor(columna):
+    """Dictionary-encoding con el diccionario ordenado (mismo orden que `astype('category')`)."""
+    if pa.types.is_dictionary(columna.type):
+        columna = columna.cast(columna.type.value_type)
+    unicos = pc.unique(columna)
+    niveles = pc.drop_null(pc.take(unicos, pc.sort_indices(unicos)))
+    indices = pc.index_in(columna, value_set=niveles)
+    trozos = indices.chunks if isinstance(indices, pa.ChunkedArray) else [indices]
+    return pa.chunked_array(
+        [pa.DictionaryArray.from_arrays(t, niveles) for t in trozos],
+        type=pa.dictionary(pa.int32(), niveles.type),
+    )
+
+
+def tipar_tabla(tabla, factores=COLUMNAS_FACTOR):
+    """Normaliza nombres de columnas y codifica como diccionario los factores presentes."""
+    tabla = tabla.rename_columns(_nombres_como_pandas(tabla.column_names))
+    for nombre in factores:
+        if nombre in tabla.column_names:
+            i = tabla.column_names.index(nombre)
+            tabla = tabla.set_column(i, nombre, codificar_factor(tabla.column(nombre)))
+    return tabla
+
+
+def ruta_en_cache(ruta, sufijo):
+    """Archivo de `DIR_CACHE` para `ruta`: nombre legible más un hash de la ruta absoluta."""
+    clave = hashlib.sha256(os.path.abspath(ruta).encode()).hexdigest()[:16]
+    return os.path.join(DIR_CACHE, f"{os.path.basename(ruta)}.{clave}{sufijo}")
+
+
+def escribir_atomico(destino, escribir, sufijo='.tmp'):
+    """Llama a `escribir(ruta_temporal)` y renombra el temporal (único) a `destino`."""
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(destino) or '.', suffix=sufijo, delete=False) as fh:
+        temporal = fh.name
+    try:
+        escribir(temporal)
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _rutas_cache(ruta):
+    return ruta_en_cache(ruta, '.parquet'), ruta_en_cache(ruta, '.json')
+
+
+def _escribir_parquet(tabla, ruta, firma, sha):
+    ruta_parquet, ruta_meta = _rutas_cache(ruta)
+    escribir_atomico(ruta_parquet, lambda tmp: pq.write_table(tabla, tmp, use_dictionary=True, compression='zstd'))
+    _guardar_meta(ruta_meta, ruta, firma, sha)
+    return ruta_parquet
+
+
+def _guardar_meta(ruta_meta, ruta, firma, sha):
+    meta = {'origen': os.path.abspath(ruta), 'mtime_ns': firma[0], 'tamano': firma[1], 'sha256': sha}
+
+    def escribir(tmp):
+        with open(tmp, 'w') as fh:
+            json.dump(meta, fh)
+
+    escribir_atomico(ruta_meta, escribir)
+
+
+def _leer_meta(ruta_meta, ruta):
+    """Metadatos de la copia si son de `ruta`; None si faltan, están a medias o son de otro origen."""
+    try:
+        with open(ruta_meta) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('origen') == os.path.abspath(ruta) else None
+
+
+def parquet_vigente(ruta, convertir):
+    """
+    Devuelve la ruta del Parquet en caché para `ruta`, regenerándolo si hace falta.
+
+    `convertir()` debe devolver la `pa.Table` tipada a partir del archivo fuente.
+    """
+    firma = firma_archivo(ruta)
+    ruta_parquet, ruta_meta = _rutas_cache(ruta)
+    meta = _leer_meta(ruta_meta, ruta) if os.path.exists(ruta_parquet) else None
+    if meta is not None and (meta.get('mtime_ns'), meta.get('tamano')) == firma:
+        return ruta_parquet
+
+    sha = hash_archivo(ruta)
+    if meta is not None and meta.get('sha256') == sha:
+        # Solo cambió el mtime: el Parquet sigue siendo válido
+        _guardar_meta(ruta_meta, ruta, firma, sha)
+        return ruta_parquet
+    return _escribir_parquet(convertir(), ruta, firma, sha)
+
+
+def csv_a_tabla(ruta):
+    """
+    Lee un CSV con el lector multihilo de Arrow y lo tipa.
+
+    Las celdas vacías o `NA` son nulas también en columnas de texto (como en
+    `pd.read_csv`), así una columna numérica con algún valor mal formado no
+    arrastra `'NA'` / `''` literales hasta `reparar_numeros`.
+    """
+    return tipar_tabla(pacsv.read_csv(ruta, convert_options=pacsv.ConvertOptions(strings_can_be_null=True)))
+
+
+def leer_tabla(ruta, columnas=None, convertir=None):
+    """
+    Lee `ruta` como DataFrame pasando por la caché Parquet.
+
+    Solo se leen de disco las `columnas` pedidas (las que no existan se ignoran).
+    Los factores llegan como `category` con las categorías ordenadas.
+    `convertir()` sustituye a la lectura CSV por defecto (`csv_a_tabla`).
+    """
+    ruta_parquet = parquet_vigente(ruta, convertir or (lambda: csv_a_tabla(ruta)))
+    if columnas is not None:
+        disponibles = pq.read_schema(ruta_parquet).names
+        columnas = [c for c in columnas if c in disponibles]
+    df = pq.read_table(ruta_parquet, columns=columnas).to_pandas()
+    # Parquet solo conserva el diccionario de columnas de texto; los factores
+    # numéricos (p. ej. `id`) vuelven como enteros y se recategorizan aquí.
+    for nombre in COLUMNAS_FACTOR:
+        if nombre in df.columns and not isinstance(df[nombre].dtype, pd.CategoricalDtype):
+            df[nombre] = df[nombre].astype('category')
+    return df
+
+
+# Equivalente RE2 de `\s` de Python (str.isspace), que Arrow no soporta tal cual
+_ESPACIOS = r'[\s\v\x{1c}-\x{1f}\x{85}\p{Z}]+'
+
+
+def _solo_ultimo_punto(texto):
+    """Elimina todos los puntos salvo el último (como `\\.(?=.*\\.)` con `re.sub`)."""
+    # En la cadena invertida el último punto es el primero: se conserva el
+    # prefijo hasta él y se borran los puntos del resto.
+    invertido = pc.utf8_reverse(texto)
+    partes = pc.extract_regex(invertido, r'^(?P<cabeza>[^.]*\.?)(?P<cola>.*)$')
+    cola = pc.replace_substring(pc.struct_field(partes, 'cola'), '.', '')
+    return pc.utf8_reverse(pc.binary_join_element_wise(
+        pc.struct_field(partes, 'cabeza'), cola, pa.scalar('', texto.type)))
+
+
+def _texto_arrow(serie):
+    """Columna de texto de Arrow construida directamente desde la Series (nulos como nulos)."""
+    try:
+        return pa.array(serie, type=pa.large_string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columnas object con números y texto mezclados: se pasa por `astype(str)`
+        return pa.array(serie.astype(str).to_numpy(dtype=object), type=pa.large_string(),
+                        mask=serie.isna().to_numpy())
+
+
+def reparar_numeros(serie, forzar_nan=False):
+    """
+    Convierte una columna a float con la reparación de `clean_neuro_data` / scripts R.
+
+    Se quitan los espacios y todos los puntos excepto el último, pero con
+    funciones vectorizadas de Arrow en lugar de dos `str.replace` con regex sobre
+    objetos Python. Si la columna ya es numérica o se convierte directamente, no
+    se repara nada. Devuelve `(serie_float, reporte)`; `reporte` indica cuántas
+    celdas hubo que modificar. Las celdas nulas quedan como NaN. Si algún valor
+    no nulo sigue sin ser numérico tras la reparación se lanza `ValueError`, o,
+    con `forzar_nan=True`, se convierte en NaN (como `as.numeric` en R) y se
+    cuenta en `reporte['invalidas']`.
+    """
+    n = len(serie)
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        reporte = {'celdas': n, 'reparadas': 0, 'invalidas': 0, 'ruta': 'numerica'}
+        return serie.astype(np.float64), reporte
+
+    texto = _texto_arrow(serie)
+    try:
+        valores = pc.cast(texto, pa.float64())
+        reparadas = invalidas = 0
+        ruta = 'directa'
+    except pa.ArrowInvalid:
+        limpio = pc.replace_substring_regex(texto, _ESPACIOS, '')
+        # Solo las celdas con dos o más puntos pasan por el recorte de puntos
+        varios_puntos = pc.greater_equal(pc.count_substring(limpio, '.'), 2)
+        if pc.any(varios_puntos).as_py():
+            corregidas = _solo_ultimo_punto(pc.filter(limpio, varios_puntos))
+            limpio = pc.replace_with_mask(limpio, varios_puntos, corregidas)
+        reparadas = pc.sum(pc.not_equal(limpio, texto)).as_py() or 0
+        ruta = 'reparacion'
+        invalidas = 0
+        try:
+            valores = pc.cast(limpio, pa.float64())
+        except pa.ArrowInvalid as e:
+            if not forzar_nan:
+                raise ValueError(f"could not convert string to float: {e}") from e
+            # Arrow no tiene un cast que deje nulos los fallos: solo en este caso raro se usa pandas
+            valores = pa.array(pd.to_numeric(limpio.to_pandas(), errors='coerce'), from_pandas=True)
+            invalidas = valores.null_count - limpio.null_count
+
+    resultado = pd.Series(valores.to_numpy(zero_copy_only=False), index=serie.index, name=serie.name)
+    return resultado, {'celdas': n, 'reparadas': int(reparadas), 'invalidas': int(invalidas), 'ruta': ruta}
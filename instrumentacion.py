@@ -0,0 +1,162 @@
+"""
+Instrumentación de las etapas calientes de las apps (carga, ANOVA, residuos, gráficos).
+
+Cada etapa con nombre acumula llamadas, tiempo de pared y los aciertos / fallos
+de caché ocurridos dentro de ella; las cachés (`cache_analisis`, la caché de
+figuras y las de Streamlit) anotan sus consultas en la etapa activa del hilo.
+El registro es del proceso, compartido por todas las sesiones y por ambas
+apps, y guarda las últimas `MAX_MUESTRAS` duraciones de cada etapa para dar
+p50 / p95. Se exporta como JSON o como texto de Prometheus; con la variable
+`METRICAS_PROMETHEUS` el texto se vuelca a ese archivo al final de cada rerun
+(p. ej. para el textfile collector de node_exporter).
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+MAX_MUESTRAS = int(os.environ.get("INSTRUMENTACION_MUESTRAS", "1000"))
+ARCHIVO_PROMETHEUS = os.environ.get("METRICAS_PROMETHEUS")
+CUANTILES = (0.5, 0.95)
+COLUMNAS = ['llamadas', 'total_s', 'media_s', 'p50_s', 'p95_s', 'max_s', 'aciertos_cache', 'fallos_cache']
+
+
+class Medicion:
+    """Aciertos y fallos de caché de una ejecución concreta de una etapa."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.aciertos = 0
+        self.fallos = 0
+
+    def acierto_si_no_calculado(self):
+        """
+        Para cachés que solo ejecutan su cuerpo al fallar (`st.cache_data`):
+        si dentro de la etapa no se anotó ningún fallo, cuenta un acierto.
+        """
+        if self.fallos == 0:
+            self.aciertos += 1
+
+
+class Instrumentacion:
+    """Registro de etapas seguro entre hilos."""
+
+    def __init__(self, max_muestras=MAX_MUESTRAS):
+        self.max_muestras = max_muestras
+        self._etapas = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pila(self):
+        if not hasattr(self._local, 'pila'):
+            self._local.pila = []
+        return self._local.pila
+
+    def registrar(self, nombre, segundos, aciertos=0, fallos=0):
+        """Añade una ejecución de `nombre` que duró `segundos`."""
+        with self._lock:
+            etapa = self._etapas.get(nombre)
+            if etapa is None:
+                etapa = self._etapas[nombre] = {
+                    'llamadas': 0, 'total': 0.0, 'max': 0.0, 'aciertos': 0, 'fallos': 0,
+                    'muestras': deque(maxlen=self.max_muestras),
+                }
+            etapa['llamadas'] += 1
+            etapa['total'] += segundos
+            etapa['max'] = max(etapa['max'], segundos)
+            etapa['aciertos'] += aciertos
+            etapa['fallos'] += fallos
+            etapa['muestras'].append(segundos)
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Cronometra el bloque como una ejecución de `nombre`; también sirve de decorador."""
+        medicion = Medicion(nombre)
+        pila = self._pila()
+        pila.append(medicion)
+        inicio = time.perf_counter()
+        try:
+            yield medicion
+        finally:
+            segundos = time.perf_counter() - inicio
+            pila.pop()
+            self.registrar(nombre, segundos, medicion.aciertos, medicion.fallos)
+
+    def anotar_cache(self, acierto, n=1):
+        """Anota `n` aciertos (o fallos) de caché en la etapa activa del hilo, si la hay."""
+        pila = self._pila()
+        if not pila:
+            return
+        if acierto:
+            pila[-1].aciertos += n
+        else:
+            pila[-1].fallos += n
+
+    def reiniciar(self):
+        with self._lock:
+            self._etapas.clear()
+
+    def resumen(self):
+        """DataFrame con una fila por etapa (tiempos en segundos)."""
+        with self._lock:
+            etapas = {nombre: {**e, 'muestras': np.array(e['muestras'])} for nombre, e in self._etapas.items()}
+        filas = {}
+        for nombre, e in etapas.items():
+            p50, p95 = np.quantile(e['muestras'], CUANTILES) if e['muestras'].size else (np.nan, np.nan)
+            filas[nombre] = [e['llamadas'], e['total'], e['total'] / e['llamadas'], p50, p95, e['max'],
+                             e['aciertos'], e['fallos']]
+        return pd.DataFrame.from_dict(filas, orient='index', columns=COLUMNAS).rename_axis('etapa')
+
+    def exportar_json(self):
+        """Instantánea del registro como texto JSON."""
+        tabla = self.resumen()
+        return json.dumps({
+            'marca_tiempo': time.time(),
+            'pid': os.getpid(),
+            'etapas': json.loads(tabla.to_json(orient='index')),
+        }, ensure_ascii=False, indent=2)
+
+    def exportar_prometheus(self, prefijo='dashboard'):
+        """Instantánea en el formato de texto de Prometheus (summary + contadores)."""
+        tabla = self.resumen()
+        lineas = [
+            f"# HELP {prefijo}_etapa_segundos Tiempo de pared de cada etapa.",
+            f"# TYPE {prefijo}_etapa_segundos summary",
+        ]
+        for nombre, fila in tabla.iterrows():
+            etiqueta = f'etapa="{_escapar(nombre)}"'
+            for q, columna in zip(CUANTILES, ['p50_s', 'p95_s']):
+                lineas.append(f'{prefijo}_etapa_segundos{{{etiqueta},quantile="{q}"}} {fila[columna]:.6g}')
+            lineas.append(f'{prefijo}_etapa_segundos_sum{{{etiqueta}}} {fila["total_s"]:.6g}')
+            lineas.append(f'{prefijo}_etapa_segundos_count{{{etiqueta}}} {int(fila["llamadas"])}')
+        lineas += [
+            f"# HELP {prefijo}_cache_consultas_total Consultas de caché dentro de cada etapa.",
+            f"# TYPE {prefijo}_cache_consultas_total counter",
+        ]
+        for nombre, fila in tabla.iterrows():
+            etiqueta = f'etapa="{_escapar(nombre)}"'
+            lineas.append(f'{prefijo}_cache_consultas_total{{{etiqueta},resultado="acierto"}} {int(fila["aciertos_cache"])}')
+            lineas.append(f'{prefijo}_cache_consultas_total{{{etiqueta},resultado="fallo"}} {int(fila["fallos_cache"])}')
+        return "\n".join(lineas) + "\n"
+
+    def volcar_prometheus(self, ruta=ARCHIVO_PROMETHEUS):
+        """Escribe `exportar_prometheus()` en `ruta` de forma atómica (no hace nada sin ruta)."""
+        if not ruta:
+            return
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(self.exportar_prometheus())
+        os.replace(temporal, ruta)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Instancia compartida por todas las sesiones del servidor
+instrumentacion = Instrumentacion()
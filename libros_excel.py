@@ -0,0 +1,100 @@
+"""
+Ingesta de libros de Excel (`Bases.xlsx`, `anova1.xlsx`, `anova2.xlsx`, ...).
+
+openpyxl en modo normal construye en memoria todas las celdas (con estilos)
+antes de devolver nada. Aquí la primera hoja se recorre con el lector de solo
+lectura, que va deshaciendo el XML por partes, y las filas se agrupan en
+bloques que se convierten a columnas de Arrow según llegan; la memoria
+depende del tamaño de bloque y no del de la hoja. El resultado entra en el
+mismo camino tipado que los CSV (`tipar_tabla` + caché Parquet de
+`leer_tabla`), así que cada libro solo se analiza una vez por modificación.
+"""
+import zipfile
+
+import openpyxl
+import pyarrow as pa
+
+from ingesta import leer_tabla, tipar_tabla
+
+EXTENSIONES = ('.xlsx', '.xlsm')
+TAM_BLOQUE = 50_000  # filas por bloque
+
+
+def es_libro_excel(ruta):
+    """True si `ruta` es un libro xlsx / xlsm (por extensión y firma ZIP)."""
+    return str(ruta).lower().endswith(EXTENSIONES) and zipfile.is_zipfile(ruta)
+
+
+def bloques_filas(ruta, tam_bloque=TAM_BLOQUE):
+    """
+    Genera `(cabecera, filas)` por bloques de la primera hoja de `ruta`.
+
+    La primera fila es la cabecera; se descartan las columnas finales sin
+    nombre y las filas completamente vacías.
+    """
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        cabecera = list(next(filas, ()))
+        while cabecera and cabecera[-1] is None:
+            cabecera.pop()
+        n = len(cabecera)
+        cabecera = ['' if c is None else str(c) for c in cabecera]
+        bloque, emitidos = [], 0
+        for fila in filas:
+            fila = tuple(fila[:n]) + (None,) * (n - len(fila))
+            if all(v is None for v in fila):
+                continue
+            bloque.append(fila)
+            if len(bloque) >= tam_bloque:
+                yield cabecera, bloque
+                bloque, emitidos = [], emitidos + 1
+        if bloque or not emitidos:
+            yield cabecera, bloque
+    finally:
+        libro.close()
+
+
+def _columna(valores):
+    """Array de Arrow de una columna del bloque; las columnas mixtas quedan como texto."""
+    try:
+        return pa.array(valores)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Como en el lector CSV: si hay texto y números, todo es texto (y
+        # `reparar_numeros` se encarga después de lo que deba ser numérico)
+        return pa.array([None if v is None else str(v) for v in valores], type=pa.string())
+
+
+def _tipo_comun(tipos):
+    """Tipo al que se llevan los trozos de una columna con tipos distintos entre bloques."""
+    tipos = {t for t in tipos if not pa.types.is_null(t)}
+    if not tipos:
+        return pa.null()
+    if len(tipos) == 1:
+        return tipos.pop()
+    if all(pa.types.is_integer(t) for t in tipos):
+        return pa.int64()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in tipos):
+        return pa.float64()
+    return pa.string()
+
+
+def xlsx_a_tabla(ruta, tam_bloque=TAM_BLOQUE):
+    """Lee la primera hoja de `ruta` por bloques y la devuelve como `pa.Table` tipada."""
+    cabecera, trozos = [], []
+    for cabecera, filas in bloques_filas(ruta, tam_bloque):
+        columnas = list(zip(*filas)) or [()] * len(cabecera)
+        trozos.append([_columna(list(c)) for c in columnas])
+
+    arrays = []
+    for j in range(len(cabecera)):
+        partes = [trozo[j] for trozo in trozos]
+        tipo = _tipo_comun(p.type for p in partes)
+        arrays.append(pa.chunked_array([p.cast(tipo) for p in partes], type=tipo))
+    # Mismo criterio que `pd.read_csv` para cabeceras vacías o repetidas
+    return tipar_tabla(pa.Table.from_arrays(arrays, names=cabecera))
+
+
+def leer_libro(ruta, columnas=None):
+    """Primera hoja de un libro de Excel como DataFrame, pasando por la caché Parquet."""
+    return leer_tabla(ruta, columnas, convertir=lambda: xlsx_a_tabla(ruta))
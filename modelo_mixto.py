@@ -0,0 +1,259 @@
+"""
+Modelo lineal mixto `dv ~ prime * target + (efectos | id)` a nivel de ensayo o de run.
+
+El RM-ANOVA trabaja con medias de celda y pierde la estructura de runs y el
+número de ensayos. Aquí se ajusta el modelo mixto sobre todas las
+observaciones, pero sin materializarlas: todos los ensayos de un mismo sujeto
+y celda comparten la fila de la matriz de efectos fijos y la de efectos
+aleatorios, así que la verosimilitud solo depende, por sujeto × celda, del
+número de ensayos, de su suma y de su suma de cuadrados. Esas sumas ya las
+produce la ingesta de ensayos (`n_ensayos`, media y DE de cada celda); en los
+archivos a nivel de run cada fila cuenta como una observación.
+
+El ajuste sigue la formulación de lme4 (mínimos cuadrados penalizados con la
+desviación perfilada en el factor de Cholesky relativo θ). La matriz de
+efectos aleatorios es diagonal por bloques (un bloque q × q por sujeto), de
+modo que en lugar de una factorización dispersa genérica se factorizan todos
+los bloques a la vez con NumPy: cada evaluación cuesta O(sujetos · q³),
+independientemente del número de ensayos. El optimizador parte del último θ
+ajustado para la misma DV y estructura (reajustes en caliente) y los ajustes
+se ejecutan en un hilo de fondo, memoizados en la caché de análisis (ver `trabajos.py`).
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.stats import norm
+
+from cache_analisis import cache_analisis, huella_dataframe
+from instrumentacion import instrumentacion
+from trabajos import planificador
+
+WITHIN = ['prime', 'target']
+# Columnas de la matriz de efectos fijos con pendiente aleatoria por sujeto
+ESTRUCTURAS = {
+    'intercepto': [0],
+    'pendientes': [0, 1, 2],
+    'maxima': [0, 1, 2, 3],
+}
+# Columna de DE dentro de celda que acompaña a cada DV en los archivos de ensayos
+COLUMNA_DE = {'rt_log': 'rt_log_sd', 'rt_raw': 'rt_sd'}
+
+_theta_previo = {}
+_lock = threading.Lock()
+
+
+def sumas_por_celda(df, dv, within=WITHIN, subject='id'):
+    """
+    Recuento, suma y suma de cuadrados de `dv` por sujeto × celda.
+
+    Con `n_ensayos` y la DE de la celda (archivos de ensayos agregados) las
+    sumas son las de los ensayos originales; si no, cada fila es una
+    observación. Devuelve `(n, suma, suma2, coords)` con arrays
+    `(sujetos, 2, 2)` y las etiquetas de sujetos y niveles.
+    """
+    a, b = within
+    media = df[dv].to_numpy(dtype=np.float64)
+    if 'n_ensayos' in df.columns and COLUMNA_DE.get(dv) in df.columns:
+        n = df['n_ensayos'].to_numpy(dtype=np.float64)
+        de = np.nan_to_num(df[COLUMNA_DE[dv]].to_numpy(dtype=np.float64))
+    else:
+        n = np.ones(len(df))
+        de = np.zeros(len(df))
+    valido = np.isfinite(media) & (n > 0)
+    marco = pd.DataFrame({
+        subject: df[subject].to_numpy()[valido], a: df[a].to_numpy()[valido], b: df[b].to_numpy()[valido],
+        'n': n[valido], 'suma': (n * media)[valido],
+        'suma2': ((n - 1) * de ** 2 + n * media ** 2)[valido],
+    })
+    sumas = marco.groupby([subject, a, b], observed=True)[['n', 'suma', 'suma2']].sum()
+    sujetos = sumas.index.get_level_values(subject).unique().sort_values()
+    niveles_a = sumas.index.get_level_values(a).unique().sort_values()
+    niveles_b = sumas.index.get_level_values(b).unique().sort_values()
+    if len(niveles_a) != 2 or len(niveles_b) != 2:
+        raise ValueError("El modelo mixto requiere un diseño 2 × 2.")
+    completo = sumas.reindex(pd.MultiIndex.from_product([sujetos, niveles_a, niveles_b]), fill_value=0)
+    forma = (len(sujetos), 2, 2)
+    coords = {subject: sujetos.to_numpy(), a: niveles_a.to_numpy(), b: niveles_b.to_numpy()}
+    return tuple(completo[c].to_numpy().reshape(forma) for c in ['n', 'suma', 'suma2']) + (coords,)
+
+
+def matriz_celdas():
+    """Fila de efectos fijos de cada celda (a1b1, a1b2, a2b1, a2b2), codificación ±0.5."""
+    a = np.array([-0.5, -0.5, 0.5, 0.5])
+    b = np.array([-0.5, 0.5, -0.5, 0.5])
+    # Con códigos ±0.5 el coeficiente de a·b es la diferencia de diferencias
+    return np.column_stack([np.ones(4), a, b, a * b])
+
+
+def _lambda(theta, q):
+    matriz = np.zeros((q, q))
+    matriz[np.tril_indices(q)] = theta
+    return matriz
+
+
+class _Productos:
+    """Productos cruzados X'X, Z'Z, Z'X, ... a partir de las sumas por sujeto × celda."""
+
+    def __init__(self, n, suma, suma2, columnas_z):
+        self.x = matriz_celdas()
+        self.z = self.x[:, columnas_z]
+        n = n.reshape(len(n), 4)
+        suma = suma.reshape(len(suma), 4)
+        self.n_obs = n.sum()
+        self.n_sujetos = len(n)
+        self.yy = suma2.sum()
+        self.xtx = np.einsum('cp,sc,cr->pr', self.x, n, self.x)
+        self.xty = np.einsum('cp,sc->p', self.x, suma)
+        self.ztz = np.einsum('cq,sc,cr->sqr', self.z, n, self.z)
+        self.ztx = np.einsum('cq,sc,cp->sqp', self.z, n, self.x)
+        self.zty = np.einsum('cq,sc->sq', self.z, suma)
+
+
+def _resolver(theta, prod):
+    """Factorización por bloques para un θ; devuelve lo necesario para desviación, β y BLUPs."""
+    q = prod.z.shape[1]
+    lam = _lambda(theta, q)
+    m = np.einsum('ji,sjk,kl->sil', lam, prod.ztz, lam) + np.eye(q)
+    l_bloques = np.linalg.cholesky(m)
+    rzx = np.linalg.solve(l_bloques, lam.T @ prod.ztx)
+    cu = np.linalg.solve(l_bloques, (lam.T @ prod.zty[..., None]))[..., 0]
+    xtx_schur = prod.xtx - np.einsum('sqp,sqr->pr', rzx, rzx)
+    l_x = np.linalg.cholesky(xtx_schur)
+    c_beta = np.linalg.solve(l_x, prod.xty - np.einsum('sqp,sq->p', rzx, cu))
+    beta = np.linalg.solve(l_x.T, c_beta)
+    r2 = prod.yy - (cu ** 2).sum() - (c_beta ** 2).sum()
+    return {'lam': lam, 'l': l_bloques, 'rzx': rzx, 'cu': cu, 'l_x': l_x, 'xtx_schur': xtx_schur,
+            'beta': beta, 'r2': max(r2, 1e-300)}
+
+
+def _desviacion(theta, prod, reml):
+    try:
+        s = _resolver(theta, prod)
+    except np.linalg.LinAlgError:
+        return np.inf
+    p = prod.x.shape[1]
+    log_det_l = 2 * np.log(np.diagonal(s['l'], axis1=1, axis2=2)).sum()
+    if reml:
+        gl = prod.n_obs - p
+        return log_det_l + 2 * np.log(np.diag(s['l_x'])).sum() + gl * (1 + np.log(2 * np.pi * s['r2'] / gl))
+    return log_det_l + prod.n_obs * (1 + np.log(2 * np.pi * s['r2'] / prod.n_obs))
+
+
+def _optimizar(prod, reml, theta_inicial, limites):
+    """
+    L-BFGS-B y pulido con Powell desde su óptimo: con estructuras casi singulares
+    la desviación es muy plana cerca del borde y el gradiente numérico se detiene
+    antes de tiempo. Devuelve `(theta, desviacion, evaluaciones)`.
+    """
+    rapido = minimize(_desviacion, theta_inicial, args=(prod, reml), method='L-BFGS-B', bounds=limites)
+    pulido = minimize(_desviacion, rapido.x, args=(prod, reml), method='Powell', bounds=limites,
+                      options={'xtol': 1e-6, 'ftol': 1e-10})
+    mejor = min([rapido, pulido], key=lambda r: r.fun)
+    return mejor.x, float(mejor.fun), int(rapido.nfev + pulido.nfev)
+
+
+def ajustar_modelo_mixto(df, dv='rt_log', estructura='pendientes', reml=True, within=WITHIN,
+                         subject='id', theta_inicial=None):
+    """
+    Ajusta `dv ~ prime * target + (efectos aleatorios | subject)`.
+
+    `estructura` elige las pendientes aleatorias por sujeto (ver
+    `ESTRUCTURAS`). Devuelve un dict con la tabla de efectos fijos (estimación,
+    EE, z, p, IC 95 %), las DE y correlaciones de los efectos aleatorios, los
+    efectos aleatorios predichos por sujeto y los criterios de ajuste.
+    """
+    columnas_z = ESTRUCTURAS[estructura]
+    q = len(columnas_z)
+    n, suma, suma2, coords = sumas_por_celda(df, dv, within, subject)
+    prod = _Productos(n, suma, suma2, columnas_z)
+    p = prod.x.shape[1]
+
+    diagonal = np.tril_indices(q)[0] == np.tril_indices(q)[1]
+    if theta_inicial is None or len(theta_inicial) != diagonal.size:
+        theta_inicial = np.where(diagonal, 1.0, 0.0)
+    limites = [(0, None) if d else (None, None) for d in diagonal]
+
+    inicio = time.perf_counter()
+    theta, desviacion, evaluaciones = _optimizar(prod, reml, np.asarray(theta_inicial, dtype=np.float64), limites)
+    segundos = time.perf_counter() - inicio
+
+    s = _resolver(theta, prod)
+    gl = prod.n_obs - p if reml else prod.n_obs
+    sigma2 = s['r2'] / gl
+    cov_beta = sigma2 * np.linalg.inv(s['xtx_schur'])
+    ee = np.sqrt(np.diag(cov_beta))
+    z = s['beta'] / ee
+    a, b = within
+    nombres = ['Intercepto', f"{a} ({coords[a][1]} − {coords[a][0]})",
+               f"{b} ({coords[b][1]} − {coords[b][0]})", f"{a} × {b}"]
+    fijos = pd.DataFrame({
+        'Término': nombres, 'Estimación': s['beta'], 'EE': ee, 'z': z,
+        'P-Value': 2 * norm.sf(np.abs(z)),
+        'IC 95% inf': s['beta'] - 1.959963984540054 * ee, 'IC 95% sup': s['beta'] + 1.959963984540054 * ee,
+    })
+
+    # Covarianza de los efectos aleatorios: σ² Λ Λᵀ
+    g = sigma2 * s['lam'] @ s['lam'].T
+    de_aleatorios = np.sqrt(np.diag(g))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlaciones = g / np.outer(de_aleatorios, de_aleatorios)
+    nombres_z = [nombres[c] for c in columnas_z]
+    u = np.linalg.solve(np.swapaxes(s['l'], 1, 2), (s['cu'] - s['rzx'] @ s['beta'])[..., None])[..., 0]
+    blups = pd.DataFrame(u @ s['lam'].T, columns=nombres_z, index=pd.Index(coords[subject], name=subject))
+
+    n_parametros = p + len(theta) + 1
+    return {
+        'dv': dv, 'estructura': estructura, 'reml': reml,
+        'fijos': fijos,
+        'aleatorios': pd.DataFrame({'Efecto': nombres_z + ['Residual'],
+                                    'DE': np.append(de_aleatorios, np.sqrt(sigma2))}),
+        'correlaciones': pd.DataFrame(correlaciones, index=nombres_z, columns=nombres_z),
+        'blups': blups,
+        'theta': theta,
+        'loglik': -desviacion / 2,
+        'desviacion': desviacion,
+        'aic': desviacion + 2 * n_parametros,
+        'bic': desviacion + n_parametros * np.log(prod.n_obs),
+        'n_obs': int(prod.n_obs), 'n_sujetos': prod.n_sujetos, 'n_celdas': int((n > 0).sum()),
+        'singular': bool(np.any(np.diag(s['lam']) < 1e-4)), 'evaluaciones': evaluaciones, 'segundos': segundos,
+    }
+
+
+def _clave(df, dv, estructura, reml, within, subject):
+    columnas = [c for c in [subject, *within, dv, 'n_ensayos', COLUMNA_DE.get(dv)] if c in df.columns]
+    return (huella_dataframe(df[columnas]), 'modelo_mixto', dv, estructura, reml, tuple(within), subject)
+
+
+def modelo_mixto_cacheado(df, dv='rt_log', estructura='pendientes', reml=True, within=WITHIN, subject='id',
+                          clave=None):
+    """`ajustar_modelo_mixto` memoizado por huella; arranca desde el último θ de la misma especificación."""
+    within = list(within)
+    clave = clave or _clave(df, dv, estructura, reml, within, subject)
+
+    def calcular():
+        with _lock:
+            theta = _theta_previo.get((dv, estructura, reml))
+        resultado = ajustar_modelo_mixto(df, dv, estructura, reml, within, subject, theta_inicial=theta)
+        with _lock:
+            _theta_previo[(dv, estructura, reml)] = resultado['theta']
+        return resultado
+
+    with instrumentacion.etapa("Modelo mixto"):
+        return cache_analisis.obtener(clave, calcular)
+
+
+def ajustar_en_segundo_plano(df, dv='rt_log', estructura='pendientes', reml=True, within=WITHIN, subject='id',
+                             ranura=None):
+    """
+    Trabajo del planificador con el resultado de `modelo_mixto_cacheado`.
+
+    Los reruns que piden el mismo ajuste mientras está en curso reciben el
+    mismo trabajo en lugar de lanzar otro.
+    """
+    within = list(within)
+    clave = _clave(df, dv, estructura, reml, within, subject)
+    return planificador.enviar(clave, modelo_mixto_cacheado, df, dv, estructura, reml, within, subject, clave,
+                               ranura=ranura)
@@ -0,0 +1,154 @@
+"""
+Prueba de permutación por cambio de signo (sign-flip) para la interacción prime × target.
+
+En un diseño 2 × 2 de medidas repetidas, la F de la interacción es `t²` del
+contraste por sujeto `d = (a1b1 - a1b2) - (a2b1 - a2b2)`. Bajo H0 el signo de
+cada `d` es intercambiable, y como `Σd²` no cambia al invertir signos, la F
+remuestreada solo depende de `|Σ sᵢ dᵢ|`. Eso permite:
+
+* p exacto (las 2ⁿ asignaciones) con *meet-in-the-middle* para n ≤ ~40.
+* p de Monte Carlo con bloques matriciales de signos repartidos en procesos.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy.stats import f as dist_f
+
+from cache_analisis import cache_analisis, huella_dataframe, medias_sujeto_celda
+from trabajos import Cancelado
+
+MAX_N_EXACTO = 40
+
+
+def contraste_interaccion(df, dv, within=('prime', 'target'), subject='id'):
+    """Contraste de interacción por sujeto a partir de las medias de celda (diseño 2 × 2)."""
+    cubo, _ = medias_sujeto_celda(df, dv, within=within, subject=subject)
+    if cubo.shape[1:3] != (2, 2):
+        raise ValueError("La prueba sign-flip de la interacción requiere un diseño 2 × 2.")
+    c = cubo[..., 0]
+    return (c[:, 0, 0] - c[:, 0, 1]) - (c[:, 1, 0] - c[:, 1, 1])
+
+
+def f_desde_contraste(d):
+    """F(1, n-1) de la interacción: n · media² / varianza."""
+    n = d.shape[-1]
+    return n * d.mean(axis=-1) ** 2 / d.var(axis=-1, ddof=1)
+
+
+def _tolerancia(d):
+    return 1e-9 * max(np.abs(d).sum(), 1.0)
+
+
+def _sumas_con_signo(valores):
+    """Las 2^k sumas Σ ±vᵢ, construidas por duplicación."""
+    sumas = np.zeros(1)
+    for v in valores:
+        sumas = np.concatenate([sumas + v, sumas - v])
+    return sumas
+
+
+def p_exacto(d, max_n=MAX_N_EXACTO):
+    """
+    p exacto de la prueba sign-flip (todas las 2ⁿ asignaciones de signo).
+
+    Divide los sujetos en dos mitades, enumera las sumas con signo de cada una
+    y cuenta con `searchsorted` las parejas con `|a + b| ≥ |Σd|`.
+    Devuelve None si n supera `max_n`.
+    """
+    d = np.asarray(d, dtype=np.float64)
+    n = d.size
+    if n > max_n:
+        return None
+    umbral = abs(d.sum())
+    tol = _tolerancia(d)
+    if umbral <= tol:
+        return 1.0
+
+    mitad = n // 2
+    sumas_a = _sumas_con_signo(d[:mitad])
+    sumas_b = np.sort(_sumas_con_signo(d[mitad:]))
+    # b ≥ umbral - a   o   b ≤ -umbral - a
+    altos = sumas_b.size - np.searchsorted(sumas_b, umbral - sumas_a - tol, side='left')
+    bajos = np.searchsorted(sumas_b, -umbral - sumas_a + tol, side='right')
+    return float((altos + bajos).sum()) / 2.0 ** n
+
+
+def _contar_bloque(d, n_remuestras, semilla, umbral):
+    """Trabajo de un proceso: remuestras con signos aleatorios que igualan o superan `umbral`."""
+    rng = np.random.default_rng(semilla)
+    signos = rng.integers(0, 2, size=(n_remuestras, d.size), dtype=np.int8) * 2 - 1
+    sumas = signos.astype(np.float64) @ d
+    return int(np.count_nonzero(np.abs(sumas) >= umbral)), n_remuestras
+
+
+def prueba_signos(d, n_perm=10000, tam_bloque=2000, n_procesos=None, semilla=0, progreso=None):
+    """
+    Prueba sign-flip del contraste `d` (un valor por sujeto).
+
+    Los `n_perm` remuestreos se generan en bloques de `tam_bloque` filas; con
+    `n_procesos` > 1 los bloques se reparten en un `ProcessPoolExecutor`.
+    `progreso(fraccion)` se llama al terminar cada bloque. Devuelve F/t
+    observados, p paramétrico, p exacto (o None) y p de Monte Carlo.
+    """
+    d = np.asarray(d, dtype=np.float64)
+    n = d.size
+    umbral = abs(d.sum()) - _tolerancia(d)
+    tamanos = [tam_bloque] * (n_perm // tam_bloque)
+    if n_perm % tam_bloque:
+        tamanos.append(n_perm % tam_bloque)
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+
+    if n_procesos is None:
+        # El pool solo compensa cuando hay mucho trabajo por hacer
+        n_procesos = min(os.cpu_count() or 1, len(tamanos)) if n_perm * n > 5_000_000 else 1
+
+    extremos = 0
+    hechos = 0
+    if n_procesos > 1:
+        # forkserver: el servidor tiene hilos y un fork podría heredar locks tomados
+        pool = ProcessPoolExecutor(max_workers=n_procesos, mp_context=multiprocessing.get_context('forkserver'))
+        try:
+            futuros = [pool.submit(_contar_bloque, d, t, s, umbral) for t, s in zip(tamanos, semillas)]
+            for futuro in as_completed(futuros):
+                cuenta, hechas = futuro.result()
+                extremos += cuenta
+                hechos += hechas
+                if progreso is not None:
+                    progreso(hechos / n_perm)
+        except Cancelado:
+            # Sin esperar a los bloques pendientes: el hilo del trabajo queda libre ya
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+    else:
+        for t, s in zip(tamanos, semillas):
+            cuenta, hechas = _contar_bloque(d, t, s, umbral)
+            extremos += cuenta
+            hechos += hechas
+            if progreso is not None:
+                progreso(hechos / n_perm)
+
+    f_obs = float(f_desde_contraste(d))
+    return {
+        'n_sujetos': n,
+        'F': f_obs,
+        't': float(np.sign(d.mean()) * np.sqrt(f_obs)),
+        'p_parametrico': float(dist_f.sf(f_obs, 1, n - 1)),
+        'p_exacto': p_exacto(d),
+        'p_montecarlo': (extremos + 1) / (n_perm + 1),
+        'n_perm': n_perm,
+    }
+
+
+def prueba_signos_cacheada(df, dv, n_perm=10000, within=('prime', 'target'), subject='id', semilla=0, progreso=None):
+    """`prueba_signos` sobre el contraste de `df`, memoizada por huella del dataset."""
+    within = list(within)
+    huella = huella_dataframe(df[[subject, *within, dv]])
+    clave = (huella, 'sign_flip', dv, tuple(within), subject, n_perm, semilla)
+    return cache_analisis.obtener(
+        clave,
+        lambda: prueba_signos(contraste_interaccion(df, dv, within, subject),
+                              n_perm=n_perm, semilla=semilla, progreso=progreso),
+    )
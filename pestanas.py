@@ -0,0 +1,130 @@
+"""
+Pestañas perezosas para las apps de Streamlit.
+
+`st.tabs` ejecuta el cuerpo de todas las pestañas en cada rerun aunque solo se
+vea una. Aquí la navegación es un `st.radio` horizontal y cada pestaña es un
+`st.fragment`: solo se ejecuta la visible, sus widgets la vuelven a ejecutar
+sin recorrer el resto del script y los resultados pesados quedan en las
+cachés, así que volver a una pestaña ya vista es inmediato. Cada ejecución se
+cronometra para poder comparar el tiempo del bloque de KPIs con el de cada
+pestaña (en la sesión) y se registra como etapa en `instrumentacion` (en el
+proceso).
+"""
+import functools
+import time
+from concurrent.futures import CancelledError
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from filtros import RT_MAXIMO, RT_MINIMO
+from instrumentacion import instrumentacion
+from trabajos import Cancelado
+
+CLAVE_TIEMPOS = 'tiempos_pestanas'
+
+
+def registrar_tiempo(nombre, segundos):
+    """Guarda en la sesión la primera y la última duración de `nombre`."""
+    tiempos = st.session_state.setdefault(CLAVE_TIEMPOS, {})
+    registro = tiempos.setdefault(nombre, {'primera': segundos, 'ultima': segundos, 'ejecuciones': 0})
+    registro['ultima'] = segundos
+    registro['ejecuciones'] += 1
+
+
+def tabla_tiempos():
+    """DataFrame con las duraciones registradas en la sesión (segundos)."""
+    tiempos = st.session_state.get(CLAVE_TIEMPOS, {})
+    return pd.DataFrame.from_dict(tiempos, orient='index', columns=['primera', 'ultima', 'ejecuciones'])
+
+
+def pestana(nombre):
+    """Decorador: convierte el cuerpo de una pestaña en un fragmento cronometrado."""
+    def decorador(cuerpo):
+        @st.fragment
+        @functools.wraps(cuerpo)
+        def envoltura():
+            inicio = time.perf_counter()
+            with instrumentacion.etapa(f"Pestaña: {nombre}"):
+                cuerpo()
+            segundos = time.perf_counter() - inicio
+            registrar_tiempo(nombre, segundos)
+            st.caption(f"⏱️ Pestaña calculada en {segundos:.2f} s")
+        return envoltura
+    return decorador
+
+
+def selector_pestanas(nombres, key='pestana_activa'):
+    """Control horizontal que sustituye a `st.tabs`; devuelve el nombre de la pestaña activa."""
+    return st.radio("Sección", nombres, horizontal=True, key=key, label_visibility='collapsed')
+
+
+def panel_instrumentacion():
+    """Expander con las etapas instrumentadas del proceso y sus exportaciones."""
+    with st.expander("📡 Instrumentación (proceso)", expanded=False):
+        tabla = instrumentacion.resumen()
+        if tabla.empty:
+            st.caption("Sin etapas registradas todavía.")
+            return
+        st.dataframe(tabla.sort_values('total_s', ascending=False).round(4), use_container_width=True)
+        col_json, col_prom = st.columns(2)
+        with col_json:
+            st.download_button("JSON", instrumentacion.exportar_json(), file_name="instrumentacion.json",
+                               mime="application/json", use_container_width=True)
+        with col_prom:
+            st.download_button("Prometheus", instrumentacion.exportar_prometheus(), file_name="metricas.prom",
+                               mime="text/plain", use_container_width=True)
+        if st.button("Reiniciar métricas", use_container_width=True):
+            instrumentacion.reiniciar()
+            st.rerun()
+
+
+def controles_filtros(indice, key='filtro'):
+    """
+    Controles de la barra lateral para `filtros.filtrar_cacheado`.
+
+    Devuelve el rango de RT y los sujetos / runs incluidos (None = todos).
+    """
+    with st.expander("🧹 Filtro de ensayos", expanded=False):
+        _, maximo_datos = indice.limites()
+        tope = float(max(RT_MAXIMO, np.ceil(maximo_datos / 100) * 100))
+        minimo, maximo = st.slider("RT (ms), límites exclusivos", 0.0, tope, (RT_MINIMO, RT_MAXIMO),
+                                   step=10.0, key=f"{key}_rt")
+        excluir_sujetos = st.multiselect("Excluir sujetos", indice.sujetos.tolist(), key=f"{key}_sujetos")
+        excluir_runs = st.multiselect("Excluir runs", indice.runs.tolist(), key=f"{key}_runs",
+                                      disabled=indice.cod_run is None)
+    sujetos = [s for s in indice.sujetos.tolist() if s not in excluir_sujetos] if excluir_sujetos else None
+    runs = [r for r in indice.runs.tolist() if r not in excluir_runs] if excluir_runs else None
+    return {'minimo': minimo, 'maximo': maximo, 'sujetos': sujetos, 'runs': runs}
+
+
+def ranura(nombre):
+    """Ranura del planificador propia de la sesión actual (ver `trabajos.py`)."""
+    ctx = get_script_run_ctx()
+    return (ctx.session_id if ctx is not None else None, nombre)
+
+
+@st.fragment(run_every=0.5)
+def _sondear(trabajo, mensaje):
+    if trabajo.listo():
+        st.rerun()
+    st.progress(min(trabajo.progreso, 1.0), text=f"⏳ {mensaje} {trabajo.progreso:.0%}")
+
+
+def resultado_o_espera(trabajo, mensaje="Calculando en segundo plano...", espera=0.3):
+    """
+    Resultado de `trabajo`, o None mientras se calcula.
+
+    Los trabajos que terminan en `espera` segundos se muestran en este mismo
+    rerun; si no, se dibuja un marcador con el progreso que se sondea sin
+    bloquear la página y vuelve a ejecutar la app al terminar.
+    """
+    try:
+        return trabajo.resultado(timeout=espera)
+    except TimeoutError:
+        _sondear(trabajo, mensaje)
+    except (Cancelado, CancelledError):
+        st.info("El cálculo se canceló; vuelve a pedirlo para reanudarlo.")
+    return None
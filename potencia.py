@@ -0,0 +1,183 @@
+"""
+Análisis de potencia por Monte Carlo para el diseño prime × target.
+
+Los parámetros salen del dataset actual: medias por celda y matriz de
+covarianzas entre las 4 celdas de cada sujeto (o los propios sujetos, si se
+remuestrea). Para cada tamaño muestral se simulan miles de datasets como un
+único array `(simulaciones, sujetos, 4 celdas)` y las F de prime, target y la
+interacción se obtienen de una vez: en un diseño 2 × 2 de medidas repetidas
+cada F es `t²` del contraste por sujeto correspondiente (ver
+`permutaciones.py`), así que basta un producto matricial por los contrastes y
+`f_desde_contraste`. Con rejillas grandes los bloques de simulaciones se
+reparten en un pool de procesos.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from scipy.stats import f as dist_f
+from scipy.stats import nct
+from scipy.stats import t as dist_t
+
+from cache_analisis import cache_analisis, huella_dataframe, medias_sujeto_celda
+from permutaciones import f_desde_contraste
+from trabajos import Cancelado
+
+# Celdas en el orden de `medias_sujeto_celda` aplanado: a1b1, a1b2, a2b1, a2b2
+CONTRASTES = np.array([
+    [1, 1, -1, -1],   # prime
+    [1, -1, 1, -1],   # target
+    [1, -1, -1, 1],   # prime * target
+], dtype=np.float64).T
+EFECTOS = ['prime', 'target', 'prime * target']
+METODOS = ['normal', 'remuestreo']
+TAM_BLOQUE = 2000
+# Por encima de este número de sujetos-simulación (en total) compensa el pool
+UMBRAL_PROCESOS = 20_000_000
+
+
+def parametros_desde_datos(df, dv, within=('prime', 'target'), subject='id'):
+    """
+    Medias por celda, covarianzas entre celdas y cubo `(sujetos, 4)` observados.
+
+    También devuelve la media y la DE del contraste de interacción, y su dz.
+    """
+    cubo, _ = medias_sujeto_celda(df, dv, within=within, subject=subject)
+    if cubo.shape[1:3] != (2, 2):
+        raise ValueError("El análisis de potencia requiere un diseño 2 × 2.")
+    celdas = cubo[..., 0].reshape(len(cubo), 4)
+    d = celdas @ CONTRASTES[:, 2]
+    return {
+        'medias': celdas.mean(axis=0),
+        'cov': np.cov(celdas, rowvar=False),
+        'celdas': celdas,
+        'n_sujetos': len(celdas),
+        'interaccion': float(d.mean()),
+        'sd_interaccion': float(d.std(ddof=1)),
+        'dz': float(d.mean() / d.std(ddof=1)),
+    }
+
+
+def _escalar_interaccion(medias, escala):
+    """Multiplica por `escala` la componente de interacción del vector de medias."""
+    c = CONTRASTES[:, 2]
+    return medias + (escala - 1) * (c @ medias) / (c @ c) * c
+
+
+def simular_bloque(parametros, n, n_sims, semilla, metodo='normal', escala=1.0, alpha=0.05):
+    """
+    Simula `n_sims` datasets de `n` sujetos y cuenta los rechazos de cada efecto.
+
+    Con `metodo='normal'` los sujetos salen de una normal multivariante con
+    las medias y covarianzas observadas; con `'remuestreo'` se remuestrean los
+    sujetos observados (conserva asimetría y colas). Devuelve un array con los
+    rechazos de prime, target e interacción.
+    """
+    rng = np.random.default_rng(semilla)
+    medias = _escalar_interaccion(parametros['medias'], escala)
+    if metodo == 'normal':
+        raiz = np.linalg.cholesky(parametros['cov'] + 1e-12 * np.eye(4))
+        datos = rng.standard_normal((n_sims, n, 4)) @ raiz.T + medias
+    else:
+        celdas = parametros['celdas']
+        datos = celdas[rng.integers(0, len(celdas), (n_sims, n))]
+        datos += medias - parametros['medias']
+    # Contrastes por sujeto: (simulaciones, efectos, sujetos)
+    contrastes = np.moveaxis(datos @ CONTRASTES, -1, 1)
+    f_obs = f_desde_contraste(contrastes)
+    return (dist_f.sf(f_obs, 1, n - 1) < alpha).sum(axis=0)
+
+
+def potencia_analitica(dz, n, alpha=0.05):
+    """Potencia exacta de la interacción (t no central) bajo normalidad."""
+    n = np.asarray(n)
+    critico = dist_t.ppf(1 - alpha / 2, n - 1)
+    delta = dz * np.sqrt(n)
+    return nct.sf(critico, n - 1, delta) + nct.cdf(-critico, n - 1, delta)
+
+
+def curva_potencia(parametros, tamanos, n_sims=5000, metodo='normal', escala=1.0, alpha=0.05,
+                   semilla=0, tam_bloque=TAM_BLOQUE, n_procesos=None, progreso=None):
+    """
+    Potencia de cada efecto para cada tamaño de `tamanos`.
+
+    Las simulaciones de cada tamaño se dividen en bloques de `tam_bloque`; si
+    el trabajo total es grande se reparten en un `ProcessPoolExecutor`.
+    `progreso(fraccion)` se llama al terminar cada bloque. Devuelve un
+    DataFrame con la potencia simulada (e IC 95 % de Wilson) y la analítica.
+    """
+    tamanos = [int(n) for n in tamanos]
+    trabajos = []
+    for n in tamanos:
+        for inicio in range(0, n_sims, tam_bloque):
+            trabajos.append((n, min(tam_bloque, n_sims - inicio)))
+    semillas = np.random.SeedSequence(semilla).spawn(len(trabajos))
+
+    if n_procesos is None:
+        carga = n_sims * sum(tamanos)
+        n_procesos = min(os.cpu_count() or 1, len(trabajos)) if carga > UMBRAL_PROCESOS else 1
+
+    rechazos = {n: np.zeros(len(EFECTOS)) for n in tamanos}
+    hechos = 0
+
+    def acumular(trabajo, conteo):
+        nonlocal hechos
+        rechazos[trabajo[0]] += conteo
+        hechos += 1
+        if progreso is not None:
+            progreso(hechos / len(trabajos))
+
+    argumentos = [(parametros, n, k, s, metodo, escala, alpha) for (n, k), s in zip(trabajos, semillas)]
+    if n_procesos > 1:
+        # forkserver: el servidor tiene hilos y un fork podría heredar locks tomados
+        pool = ProcessPoolExecutor(max_workers=n_procesos, mp_context=multiprocessing.get_context('forkserver'))
+        try:
+            futuros = {pool.submit(simular_bloque, *args): trabajo for args, trabajo in zip(argumentos, trabajos)}
+            for futuro in as_completed(futuros):
+                acumular(futuros[futuro], futuro.result())
+        except Cancelado:
+            # Sin esperar a los bloques pendientes: el hilo del trabajo queda libre ya
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+    else:
+        for args, trabajo in zip(argumentos, trabajos):
+            acumular(trabajo, simular_bloque(*args))
+
+    filas = []
+    z = 1.959963984540054
+    dz = parametros['dz'] * escala
+    for n in tamanos:
+        for efecto, exitos in zip(EFECTOS, rechazos[n]):
+            p = exitos / n_sims
+            # Intervalo de Wilson para una proporción
+            centro = (p + z ** 2 / (2 * n_sims)) / (1 + z ** 2 / n_sims)
+            margen = z * np.sqrt(p * (1 - p) / n_sims + z ** 2 / (4 * n_sims ** 2)) / (1 + z ** 2 / n_sims)
+            filas.append({'n_sujetos': n, 'efecto': efecto, 'potencia': p,
+                          'ic_inf': centro - margen, 'ic_sup': centro + margen})
+    tabla = pd.DataFrame(filas)
+    es_interaccion = tabla['efecto'] == EFECTOS[2]
+    tabla.loc[es_interaccion, 'potencia_analitica'] = potencia_analitica(
+        dz, tabla.loc[es_interaccion, 'n_sujetos'].to_numpy(), alpha)
+    return tabla
+
+
+def n_para_potencia(tabla, objetivo=0.8, efecto=EFECTOS[2]):
+    """Menor tamaño de la rejilla cuya potencia simulada alcanza `objetivo` (o None)."""
+    filas = tabla[(tabla['efecto'] == efecto) & (tabla['potencia'] >= objetivo)]
+    return int(filas['n_sujetos'].min()) if not filas.empty else None
+
+
+def curva_potencia_cacheada(df, dv, tamanos, n_sims=5000, metodo='normal', escala=1.0, alpha=0.05,
+                            within=('prime', 'target'), subject='id', semilla=0, progreso=None):
+    """`curva_potencia` con parámetros estimados de `df`, memoizada por huella del dataset."""
+    within = list(within)
+    huella = huella_dataframe(df[[subject, *within, dv]])
+    clave = (huella, 'potencia', dv, tuple(int(n) for n in tamanos), n_sims, metodo, escala, alpha, semilla)
+    return cache_analisis.obtener(
+        clave,
+        lambda: curva_potencia(parametros_desde_datos(df, dv, within, subject), tamanos, n_sims=n_sims,
+                               metodo=metodo, escala=escala, alpha=alpha, semilla=semilla, progreso=progreso),
+    ).copy()
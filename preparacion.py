@@ -0,0 +1,69 @@
+"""
+Carga, limpieza y formato de tablas sin dependencias de Streamlit.
+
+Es la lógica que comparten `articulo.py`, `hello.py` y el analizador por lotes
+(`analisis_lote.py`): las apps solo añaden encima la caché de Streamlit y los
+mensajes de error en pantalla.
+"""
+from ensayos import es_archivo_ensayos, leer_ensayos
+from ingesta import leer_tabla, reparar_numeros
+from libros_excel import es_libro_excel, leer_libro
+
+FACTORES = ['id', 'prime', 'target']
+COLUMNAS_RT = ['id', 'run', 'prime', 'target', 'rt_raw', 'rt_log']
+COLUMNAS_NEURO = ['id', 'prime', 'target', 'value']
+
+
+def cargar_tabla(ruta, columnas=None):
+    """
+    CSV -> Parquet tipado en la primera carga, luego lectura con proyección de columnas.
+
+    Los archivos a nivel de ensayo se agregan por bloques a medias sujeto × run × celda;
+    los libros de Excel se leen en streaming (primera hoja).
+    """
+    if es_libro_excel(ruta):
+        df = leer_libro(ruta, columnas)
+    elif es_archivo_ensayos(ruta):
+        df = leer_ensayos(ruta, columnas)
+    else:
+        df = leer_tabla(ruta, columnas)
+    # Convertir a categórico
+    for factor in FACTORES:
+        if factor in df.columns:
+            df[factor] = df[factor].astype('category')
+    return df
+
+
+def clean_neuro_data(df):
+    """Repara `value` como los scripts R y asegura los factores; sin `value` devuelve `df` tal cual."""
+    if not df.empty and 'value' in df.columns:
+        data = df.copy()
+        # Misma reparación que los scripts R (espacios y puntos sobrantes), vectorizada
+        data['value'], reporte = reparar_numeros(data['value'])
+        data.attrs['reparacion_value'] = reporte
+        # Asegurar factores
+        for factor in FACTORES:
+            data[factor] = data[factor].astype('category')
+        return data
+    return df
+
+
+def formatear_tabla_anova(anova_df):
+    """
+    Formatea la salida de Pingouin para que coincida con la tabla estilo Minitab/SAS:
+    Source | DF | Adj SS | Adj MS | F-Value | P-Value
+    """
+    # 1. Mapeo de nombres de columnas de Pingouin a tu formato deseado
+    nombres_nuevos = {
+        'Source': 'Source',
+        'DF': 'DF',      # Pingouin ya devuelve 'DF' cuando detailed=True
+        'SS': 'Adj SS',  # Sum of Squares -> Adj SS
+        'MS': 'Adj MS',  # Mean Square -> Adj MS
+        'F': 'F-Value',
+        'p-unc': 'P-Value'
+    }
+
+    # 2. Seleccionar solo las columnas que existen en el mapeo
+    # (Filtramos np2 o eps que no están en tu imagen)
+    cols_a_mantener = [col for col in nombres_nuevos.keys() if col in anova_df.columns]
+    return anova_df[cols_a_mantener].rename(columns=nombres_nuevos)
@@ -0,0 +1,142 @@
+"""
+Análisis de las réplicas conductuales (port de `anovareplicaciones.R`).
+
+El script R limpiaba cada `beh_replication*.csv` (espacios y puntos sobrantes
+en `RT`, filtro 200 < RT < 2000 ms) y ejecutaba `aov_ez` prime × target sobre
+`subjID`, una réplica detrás de otra. Aquí cada archivo se lee con la ingesta
+de ensayos (`ensayos.py`, misma reparación y filtro, sin cargar los ensayos en
+memoria), se analiza con el ANOVA vectorizado y se resume la interacción para
+compararla con el estudio principal. Como `aov_ez` promedia todos los
+ensayos filtrados de cada sujeto × celda, las medias por run se ponderan por
+su número de ensayos (`n_ensayos`) antes del ANOVA; promediarlas por igual
+daría el mismo peso a un run con 3 ensayos válidos que a uno con 40. Las réplicas que no están en la caché de
+análisis se procesan en paralelo en un pool de procesos.
+"""
+import glob
+import multiprocessing
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import t as dist_t
+
+from cache_analisis import cache_analisis, cubo_cacheado, rm_anova_desde_cubo
+from ingesta import firma_archivo
+from permutaciones import contraste_interaccion
+from preparacion import cargar_tabla
+
+PATRON = 'beh_replication*.csv*'
+DIR_REPLICACIONES = os.environ.get("DIR_REPLICACIONES", ".")
+WITHIN = ['prime', 'target']
+DVS = ['rt_log', 'rt_raw']
+
+
+def descubrir_replicaciones(directorio=DIR_REPLICACIONES, patron=PATRON):
+    """Rutas de las réplicas de `directorio`, en orden numérico (1, 2, ..., 10)."""
+    def numero(ruta):
+        encontrado = re.search(r'(\d+)', os.path.basename(ruta))
+        return (int(encontrado.group(1)) if encontrado else 0, ruta)
+    return sorted(glob.glob(os.path.join(directorio, patron)), key=numero)
+
+
+def nombre_replicacion(ruta):
+    """`beh_replication2.csv.gz` -> `Réplica 2`."""
+    encontrado = re.search(r'(\d+)', os.path.basename(ruta))
+    return f"Réplica {encontrado.group(1)}" if encontrado else os.path.basename(ruta)
+
+
+def medias_ponderadas(df, dvs, claves, pesos='n_ensayos'):
+    """
+    Medias de `dvs` por `claves` ponderadas por `pesos` (la media de todos los
+    ensayos cuando cada fila es la media de un run); la columna de pesos del
+    resultado es la suma de los pesos. Sin columna de pesos, media simple.
+    """
+    if pesos not in df.columns:
+        return df.groupby(claves, observed=True)[dvs].mean().reset_index()
+    w = df[pesos].to_numpy(dtype=np.float64)
+    valores = df[dvs].to_numpy(dtype=np.float64)
+    validos = np.isfinite(valores) & (w[:, None] > 0)
+    sumas = pd.DataFrame(np.where(validos, valores * w[:, None], 0.0), columns=dvs, index=df.index)
+    sumas[[f'_w_{dv}' for dv in dvs]] = np.where(validos, w[:, None], 0.0)
+    sumas[claves] = df[claves]
+    sumas = sumas.groupby(claves, observed=True).sum()
+    resultado = pd.DataFrame(index=sumas.index)
+    for dv in dvs:
+        resultado[dv] = sumas[dv] / sumas[f'_w_{dv}'].where(sumas[f'_w_{dv}'] > 0)
+    resultado[pesos] = sumas[f'_w_{dvs[0]}']
+    return resultado.reset_index()
+
+
+def resumen_interaccion(df, dvs=DVS, within=WITHIN, subject='id', confianza=0.95):
+    """
+    ANOVA prime × target y efecto de interacción de `df` para cada DV.
+
+    Además de F, p y η²G de la interacción devuelve el contraste por sujeto
+    `(a1b1 - a1b2) - (a2b1 - a2b2)` con su media, IC `confianza` y dz, que
+    permite comparar la magnitud del efecto entre estudios. Con `n_ensayos`
+    (ensayos agregados por run) todas las medias son de ensayos, no de runs.
+    """
+    dvs = [dv for dv in dvs if dv in df.columns]
+    if 'n_ensayos' in df.columns:
+        df = medias_ponderadas(df, dvs, [subject, *within])
+        celdas = medias_ponderadas(df, dvs, within)[[*within, *dvs]]
+    else:
+        cubo = cubo_cacheado(df)
+        celdas = cubo.tabla_celdas(dvs[0], within)[['mean']].rename(columns={'mean': dvs[0]})
+        for dv in dvs[1:]:
+            celdas[dv] = cubo.tabla_celdas(dv, within)['mean']
+        celdas = celdas.reset_index()
+    anova = rm_anova_desde_cubo(df, dvs, within, subject)
+    fila_interaccion = anova['Source'] == f'{within[0]} * {within[1]}'
+
+    interaccion = {}
+    for dv in dvs:
+        fila = anova[fila_interaccion & (anova['DV'] == dv)].iloc[0]
+        d = contraste_interaccion(df, dv, within, subject)
+        n = d.size
+        media = d.mean()
+        error = d.std(ddof=1) / np.sqrt(n)
+        margen = dist_t.ppf(0.5 + confianza / 2, n - 1) * error
+        interaccion[dv] = {
+            'F': float(fila['F']), 'p': float(fila['p-unc']), 'ng2': float(fila['ng2']),
+            'contraste': float(media), 'ic_inf': float(media - margen), 'ic_sup': float(media + margen),
+            'dz': float(media / d.std(ddof=1)), 'n_sujetos': int(n),
+        }
+    return {'anova': anova, 'celdas': celdas, 'interaccion': interaccion}
+
+
+def analizar_replicacion(ruta):
+    """Carga (ensayos -> medias sujeto × celda) y resume una réplica; se ejecuta en el pool."""
+    warnings.filterwarnings("ignore")
+    df = cargar_tabla(ruta)
+    resultado = resumen_interaccion(df)
+    resultado['nombre'] = nombre_replicacion(ruta)
+    resultado['archivo'] = ruta
+    if 'n_ensayos' in df.columns:
+        resultado['n_ensayos'] = int(df['n_ensayos'].sum())
+    return resultado
+
+
+def analizar_replicaciones(rutas, procesos=None):
+    """
+    Resultados de `analizar_replicacion` para cada ruta, en el mismo orden.
+
+    Cada resultado se memoiza en la caché de análisis por la firma del
+    archivo; las réplicas sin resultado en caché se reparten en procesos.
+    """
+    claves = [(firma_archivo(ruta), 'replicacion', os.path.abspath(ruta)) for ruta in rutas]
+
+    def calcular_lote(indices):
+        n = min(os.cpu_count() or 1, len(indices)) if procesos is None else procesos
+        pendientes = [rutas[i] for i in indices]
+        if n > 1:
+            # forkserver: el servidor tiene hilos y un fork podría heredar locks tomados
+            contexto = multiprocessing.get_context('forkserver')
+            with ProcessPoolExecutor(max_workers=n, mp_context=contexto) as pool:
+                return list(pool.map(analizar_replicacion, pendientes))
+        return [analizar_replicacion(ruta) for ruta in pendientes]
+
+    return cache_analisis.obtener_lote(claves, calcular_lote)
@@ -0,0 +1,116 @@
+"""
+ANOVA searchlight voxel a voxel sobre arrays mapeados en memoria.
+
+El archivo de entrada es un `.npy` con forma `(voxeles, sujetos, prime, target)`
+(voxel como eje más externo para que cada bloque se lea de forma contigua).
+Se calcula el mapa F/p de la interacción prime × target por bloques de memoria
+acotada y los mapas se escriben en disco como `.npy`, junto con un resumen JSON.
+"""
+import json
+import os
+
+import numpy as np
+
+from anova_vectorizado import rm_anova2_arrays
+
+FUENTE_INTERACCION = 2  # Índice de `prime * target` en rm_anova2_arrays
+
+
+def abrir_voxeles(ruta):
+    """Abre el array de voxeles en modo solo lectura sin cargarlo en memoria."""
+    datos = np.load(ruta, mmap_mode='r')
+    if datos.ndim != 4:
+        raise ValueError(
+            f"Se esperaba un array (voxeles, sujetos, prime, target) y se obtuvo la forma {datos.shape}."
+        )
+    return datos
+
+
+def voxeles_por_bloque(forma, memoria_max_mb=256):
+    """Número de voxeles por bloque para no superar `memoria_max_mb`."""
+    _, n_s, n_a, n_b = forma
+    # El bloque en float64 y los temporales del motor ocupan ~4 copias
+    bytes_por_voxel = n_s * n_a * n_b * 8 * 4
+    return max(1, int(memoria_max_mb * 1024 ** 2 // bytes_por_voxel))
+
+
+def anova_searchlight_voxeles(ruta_entrada, dir_salida, memoria_max_mb=256, alpha=0.05, progreso=None):
+    """
+    Calcula los mapas F y p de la interacción para todos los voxeles.
+
+    Escribe `f_interaccion.npy`, `p_interaccion.npy` y `resumen.json` en
+    `dir_salida` y devuelve el resumen. `progreso(fraccion)` se llama tras cada
+    bloque si se proporciona.
+    """
+    datos = abrir_voxeles(ruta_entrada)
+    n_vox = datos.shape[0]
+    os.makedirs(dir_salida, exist_ok=True)
+
+    mapa_f = np.lib.format.open_memmap(
+        os.path.join(dir_salida, 'f_interaccion.npy'), mode='w+', dtype=np.float32, shape=(n_vox,))
+    mapa_p = np.lib.format.open_memmap(
+        os.path.join(dir_salida, 'p_interaccion.npy'), mode='w+', dtype=np.float64, shape=(n_vox,))
+
+    paso = voxeles_por_bloque(datos.shape, memoria_max_mb)
+    n_validos = 0
+    n_sig = 0
+    suma_f = 0.0
+    f_max = -np.inf
+    p_min = np.inf
+    ddof = None
+
+    for inicio in range(0, n_vox, paso):
+        fin = min(inicio + paso, n_vox)
+        # (voxeles, sujetos, a, b) -> (sujetos, a, b, voxeles) para el motor
+        bloque = np.moveaxis(np.asarray(datos[inicio:fin], dtype=np.float64), 0, -1)
+        with np.errstate(all='ignore'):
+            res = rm_anova2_arrays(bloque)
+        f_bloque = res['F'][FUENTE_INTERACCION]
+        p_bloque = res['p-unc'][FUENTE_INTERACCION]
+        ddof = (int(res['ddof1'][FUENTE_INTERACCION]), int(res['ddof2'][FUENTE_INTERACCION]))
+
+        mapa_f[inicio:fin] = f_bloque
+        mapa_p[inicio:fin] = p_bloque
+
+        validos = np.isfinite(f_bloque) & np.isfinite(p_bloque)
+        if validos.any():
+            n_validos += int(validos.sum())
+            n_sig += int((p_bloque[validos] < alpha).sum())
+            suma_f += float(f_bloque[validos].sum())
+            f_max = max(f_max, float(f_bloque[validos].max()))
+            p_min = min(p_min, float(p_bloque[validos].min()))
+        if progreso is not None:
+            progreso(fin / n_vox)
+
+    mapa_f.flush()
+    mapa_p.flush()
+    del mapa_f, mapa_p
+
+    resumen = {
+        'n_voxeles': int(n_vox),
+        'n_sujetos': int(datos.shape[1]),
+        'n_validos': n_validos,
+        'ddof1': ddof[0] if ddof else None,
+        'ddof2': ddof[1] if ddof else None,
+        'f_media': suma_f / n_validos if n_validos else None,
+        'f_max': f_max if n_validos else None,
+        'p_min': p_min if n_validos else None,
+        'alpha': alpha,
+        'n_significativos': n_sig,
+        'n_significativos_bonferroni': contar_voxeles_umbral(
+            os.path.join(dir_salida, 'p_interaccion.npy'), alpha / max(n_validos, 1)),
+        'voxeles_por_bloque': paso,
+    }
+    with open(os.path.join(dir_salida, 'resumen.json'), 'w') as fh:
+        json.dump(resumen, fh, indent=2)
+    return resumen
+
+
+def contar_voxeles_umbral(ruta_p, alpha, tam_bloque=1_000_000):
+    """Cuenta los voxeles con p < alpha leyendo el mapa p por bloques."""
+    mapa_p = np.load(ruta_p, mmap_mode='r')
+    total = 0
+    for inicio in range(0, mapa_p.shape[0], tam_bloque):
+        bloque = np.asarray(mapa_p[inicio:inicio + tam_bloque])
+        total += int(np.count_nonzero(bloque < alpha))
+    return total
@@ -0,0 +1,178 @@
+"""
+Sketch de cuantiles fusionable (t-digest) para Q-Q plots y resúmenes descriptivos.
+
+Un `TDigest` resume una columna con unos ~`compresion / 2` centroides (media,
+peso) más el recuento, la media, M2, el mínimo y el máximo exactos. Los datos
+se absorben por bloques y dos sketches (de archivos o bloques distintos) se
+fusionan concatenando centroides, de modo que nunca hace falta ordenar el
+conjunto completo. Mientras el número de observaciones no supera el búfer
+(`BUFER * compresion`), los centroides son los propios datos y los cuantiles
+coinciden con los de pandas / numpy (interpolación lineal).
+"""
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from cache_analisis import cache_analisis, huella_dataframe
+from supuestos import medianas_estadisticos_orden
+
+COMPRESION = 500
+BUFER = 5
+PUNTOS_QQ = 500
+
+
+class TDigest:
+    """t-digest con función de escala k₁ (`δ/2π · arcsin(2q - 1)`) y compresión vectorizada."""
+
+    def __init__(self, compresion=COMPRESION):
+        self.compresion = compresion
+        self.medias = np.empty(0)
+        self.pesos = np.empty(0)
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+
+    def _combinar_momentos(self, n, media, m2):
+        """Combina recuento, media y M2 (Chan et al.) sin perder precisión."""
+        total = self.n + n
+        delta = media - self.media
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.media += delta * n / total
+        self.n = total
+
+    def agregar(self, valores):
+        """Absorbe un bloque de valores (se ignoran NaN e infinitos)."""
+        v = np.asarray(valores, dtype=np.float64).ravel()
+        v = v[np.isfinite(v)]
+        if v.size == 0:
+            return self
+        media = v.mean()
+        self._combinar_momentos(v.size, media, ((v - media) ** 2).sum())
+        self.minimo = min(self.minimo, v.min())
+        self.maximo = max(self.maximo, v.max())
+        self._absorber(v, np.ones(v.size))
+        return self
+
+    def _absorber(self, medias, pesos):
+        self.medias = np.concatenate([self.medias, medias])
+        self.pesos = np.concatenate([self.pesos, pesos])
+        if self.medias.size > BUFER * self.compresion:
+            self._comprimir()
+
+    def _comprimir(self):
+        """Agrupa los centroides contiguos que caen en la misma unidad de la escala k₁."""
+        orden = np.argsort(self.medias, kind='stable')
+        medias, pesos = self.medias[orden], self.pesos[orden]
+        centro = (np.cumsum(pesos) - pesos / 2) / pesos.sum()
+        k = self.compresion / (2 * np.pi) * np.arcsin(2 * centro - 1)
+        # k es monótona: cada cambio de su parte entera abre un centroide nuevo
+        escalon = np.floor(k)
+        grupo = np.concatenate([[0], np.cumsum(escalon[1:] != escalon[:-1])])
+        self.pesos = np.bincount(grupo, weights=pesos)
+        self.medias = np.bincount(grupo, weights=pesos * medias) / self.pesos
+
+    def fusionar(self, otro):
+        """Nuevo sketch con los datos de `self` y `otro`; ninguno de los dos se modifica."""
+        resultado = TDigest(max(self.compresion, otro.compresion))
+        for sketch in (self, otro):
+            if sketch.n:
+                resultado._combinar_momentos(sketch.n, sketch.media, sketch.m2)
+                resultado.minimo = min(resultado.minimo, sketch.minimo)
+                resultado.maximo = max(resultado.maximo, sketch.maximo)
+        resultado._absorber(np.concatenate([self.medias, otro.medias]),
+                            np.concatenate([self.pesos, otro.pesos]))
+        return resultado
+
+    def cuantil(self, q):
+        """
+        Cuantil(es) `q` ∈ [0, 1] con la interpolación lineal de `np.quantile`.
+
+        Cada centroide se sitúa en el rango medio de las observaciones que
+        resume; el mínimo y el máximo exactos anclan los extremos.
+        """
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan)
+        orden = np.argsort(self.medias, kind='stable')
+        medias, pesos = self.medias[orden], self.pesos[orden]
+        rango = np.cumsum(pesos) - pesos + (pesos - 1) / 2
+        x = np.concatenate([[0.0], rango, [self.n - 1.0]])
+        y = np.concatenate([[self.minimo], medias, [self.maximo]])
+        return np.interp(np.asarray(q, dtype=np.float64) * (self.n - 1), x, y)
+
+    def mediana(self):
+        return float(self.cuantil(0.5))
+
+    def desviacion(self):
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+    def describir(self):
+        """Serie con los mismos índices que `pd.Series.describe()`."""
+        q1, q2, q3 = self.cuantil([0.25, 0.5, 0.75])
+        return pd.Series({
+            'count': float(self.n), 'mean': self.media if self.n else np.nan, 'std': self.desviacion(),
+            'min': self.minimo if self.n else np.nan, '25%': q1, '50%': q2, '75%': q3,
+            'max': self.maximo if self.n else np.nan,
+        })
+
+
+def sketch_de(valores, compresion=COMPRESION, tam_bloque=1 << 16):
+    """Construye un `TDigest` recorriendo `valores` en bloques de `tam_bloque`."""
+    valores = np.asarray(valores, dtype=np.float64)
+    sketch = TDigest(compresion)
+    for inicio in range(0, valores.size, tam_bloque):
+        sketch.agregar(valores[inicio:inicio + tam_bloque])
+    return sketch
+
+
+def qq_desde_sketch(sketch, n_puntos=PUNTOS_QQ):
+    """
+    Q-Q normal de `n_puntos` rangos equiespaciados, sin ordenar los datos.
+
+    Los cuantiles teóricos son las medianas de Filliben de esos rangos (como
+    `stats.probplot`) y los muestrales salen del sketch. Devuelve teóricos,
+    muestrales, pendiente, intercepto y r de la recta ajustada.
+    """
+    n = sketch.n
+    rangos = np.unique(np.linspace(0, n - 1, min(n, n_puntos)).round().astype(np.int64))
+    teoricos = norm.ppf(medianas_estadisticos_orden(n)[rangos])
+    muestrales = sketch.cuantil(rangos / max(n - 1, 1))
+    pendiente, intercepto = np.polyfit(teoricos, muestrales, 1)
+    r = np.corrcoef(teoricos, muestrales)[0, 1]
+    return teoricos, muestrales, pendiente, intercepto, r
+
+
+def sketches_cacheados(df, columnas, compresion=COMPRESION):
+    """Diccionario columna -> `TDigest`, memoizado por huella de las columnas."""
+    columnas = list(columnas)
+    clave = (huella_dataframe(df[columnas]), 'sketch', tuple(columnas), compresion)
+    return cache_analisis.obtener(
+        clave, lambda: {c: sketch_de(df[c].to_numpy(dtype=np.float64), compresion) for c in columnas}
+    )
+
+
+def describir_cacheado(df):
+    """Equivalente de `df.describe()` (columnas numéricas) construido desde los sketches."""
+    columnas = df.select_dtypes(include='number').columns
+    sketches = sketches_cacheados(df, columnas)
+    return pd.DataFrame({c: sketches[c].describir() for c in columnas})
+
+
+def resumen_por_grupo_cacheado(df, dv, grupos):
+    """count, mean, std y median de `dv` por combinación de `grupos`, desde un sketch por grupo."""
+    grupos = list(grupos)
+    clave = (huella_dataframe(df[[*grupos, dv]]), 'resumen_grupos', dv, tuple(grupos))
+
+    def calcular():
+        valores = df[dv].to_numpy(dtype=np.float64)
+        filas = {}
+        for nivel, posiciones in df.groupby(grupos, observed=True).indices.items():
+            sketch = sketch_de(valores[posiciones])
+            filas[nivel] = {'count': sketch.n, 'mean': sketch.media,
+                            'std': sketch.desviacion(), 'median': sketch.mediana()}
+        tabla = pd.DataFrame.from_dict(filas, orient='index')
+        tabla.index = pd.MultiIndex.from_tuples(tabla.index, names=grupos)
+        return tabla.sort_index()
+
+    return cache_analisis.obtener(clave, calcular).copy()
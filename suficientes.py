@@ -0,0 +1,280 @@
+"""
+Almacén persistente de estadísticos suficientes para actualizar el análisis al llegar sujetos.
+
+Por cada dataset se guardan en `.cache_datos/` las sumas y recuentos por
+sujeto × celda, los momentos `Σ x` y `Σ x xᵀ` de las medias de celda de los
+sujetos completos (ver `rm_anova2_momentos`) y los momentos por fila (global y
+por celda) con la fusión de Chan et al. Cuando el CSV solo ha crecido por el
+final, solo se analizan los bytes nuevos: el ANOVA de dos factores, los KPIs
+y la tabla de medias por celda se actualizan agregando las filas nuevas y
+coinciden con un recálculo completo.
+
+Para saber que el contenido previo no cambió se guarda un SHA-256 por bloque
+de `BLOQUE_HUELLA` bytes y se comprueban todos, así que la lectura (no el
+análisis) del prefijo sigue siendo O(archivo); una edición en cualquier punto
+obliga a reconstruir. Los valores no finitos (celdas vacías del CSV) no
+cuentan en ningún recuento ni momento, y un sujeto que se queda sin valores
+en alguna celda de una DV no entra en el ANOVA de esa DV (como Pingouin, que
+lo descarta). Ojo: esto solo vale para el almacén; `load_data`, el
+índice de filtros y las cachés por huella vuelven a leer el CSV completo
+cada vez que cambia su mtime.
+"""
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from anova_vectorizado import rm_anova2_momentos, tabla_anova
+from ingesta import escribir_atomico, firma_archivo, reparar_numeros, ruta_en_cache
+
+BLOQUE_HUELLA = 1 << 20
+FORMATO = 2  # recuentos por DV; los almacenes anteriores se reconstruyen
+
+
+def _fusionar_momentos(n1, media1, m21, n2, media2, m22):
+    """Fusión de (n, media, M2) de dos bloques; admite arrays que se difunden entre sí."""
+    n = n1 + n2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        peso = np.where(n > 0, n2 / np.maximum(n, 1), 0.0)
+    delta = media2 - media1
+    return n, media1 + delta * peso, m21 + m22 + delta ** 2 * n1 * peso
+
+
+class AlmacenSuficientes:
+    """Estadísticos suficientes de un diseño sujeto × a × b para una o varias DV."""
+
+    def __init__(self, niveles_a, niveles_b, dvs, within=('prime', 'target'), subject='id'):
+        self.within = list(within)
+        self.subject = subject
+        self.niveles_a = list(niveles_a)
+        self.niveles_b = list(niveles_b)
+        self.dvs = list(dvs)
+        n_a, n_b, n_dv = len(self.niveles_a), len(self.niveles_b), len(self.dvs)
+        self.sujetos = []
+        self._indice = {}
+        # Capacidad que se duplica: añadir sujetos no copia el almacén en cada llamada
+        self.n_celda = np.zeros((0, n_a, n_b, n_dv), dtype=np.int64)
+        self.suma_celda = np.zeros((0, n_a, n_b, n_dv))
+        # Referencia fija: se acumulan desviaciones para no perder precisión
+        self.referencia = None
+        self.n_completos = np.zeros(n_dv, dtype=np.int64)
+        self.suma_x = np.zeros((n_a, n_b, n_dv))
+        self.suma_xx = np.zeros((n_a * n_b, n_a * n_b, n_dv))
+        self.filas = (np.zeros(n_dv, dtype=np.int64), np.zeros(n_dv), np.zeros(n_dv))
+        self.celdas = (np.zeros((n_a, n_b, n_dv), dtype=np.int64), np.zeros((n_a, n_b, n_dv)), np.zeros((n_a, n_b, n_dv)))
+
+    # --- Actualización ---------------------------------------------------------
+
+    def _codigos(self, columna, niveles):
+        codigos = pd.Categorical(columna, categories=niveles).codes
+        if (codigos < 0).any():
+            nuevos = sorted(set(columna[codigos < 0].astype(str)))
+            raise ValueError(f"Niveles no vistos al crear el almacén: {nuevos}")
+        return codigos.astype(np.int64)
+
+    def _indices_sujetos(self, ids):
+        for sujeto in pd.unique(ids):
+            if sujeto not in self._indice:
+                self._indice[sujeto] = len(self.sujetos)
+                self.sujetos.append(sujeto)
+        if len(self.sujetos) > self.n_celda.shape[0]:
+            capacidad = max(len(self.sujetos), 2 * self.n_celda.shape[0], 16)
+            extra = capacidad - self.n_celda.shape[0]
+            self.n_celda = np.concatenate([self.n_celda, np.zeros((extra, *self.n_celda.shape[1:]), np.int64)])
+            self.suma_celda = np.concatenate([self.suma_celda, np.zeros((extra, *self.suma_celda.shape[1:]))])
+        return np.array([self._indice[s] for s in ids], dtype=np.int64)
+
+    def _vectores(self, indices):
+        """Medias de celda (desviadas de la referencia) de los sujetos `indices`, aplanadas a-mayor."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            medias = self.suma_celda[indices] / self.n_celda[indices] - self.referencia
+        return medias.reshape(len(indices), -1, len(self.dvs))
+
+    def _completos(self, indices):
+        """Máscara sujeto × DV: True si el sujeto tiene algún valor en todas las celdas de la DV."""
+        return (self.n_celda[indices] > 0).all(axis=(1, 2))
+
+    def _mover_momentos(self, indices, signo):
+        completos = self._completos(indices)
+        indices, completos = indices[completos.any(axis=1)], completos[completos.any(axis=1)]
+        if indices.size == 0:
+            return
+        # Los sujetos incompletos en una DV aportan ceros a los momentos de esa DV
+        x = np.where(completos[:, None, :], self._vectores(indices), 0.0)
+        self.n_completos += signo * completos.sum(axis=0)
+        self.suma_x += signo * x.sum(axis=0).reshape(self.suma_x.shape)
+        self.suma_xx += signo * np.einsum('sin,sjn->ijn', x, x)
+
+    def agregar(self, df):
+        """Incorpora las filas de `df`; el coste solo depende de `len(df)` y de los sujetos que toca."""
+        if df.empty:
+            return self
+        a, b = self.within
+        valores = np.column_stack([
+            reparar_numeros(df[dv])[0].to_numpy(dtype=np.float64) for dv in self.dvs
+        ])
+        cod_a = self._codigos(df[a].to_numpy(), self.niveles_a)
+        cod_b = self._codigos(df[b].to_numpy(), self.niveles_b)
+        cod_s = self._indices_sujetos(df[self.subject].to_numpy())
+        # Los valores no finitos se enmascaran: no suman ni cuentan en ninguna DV
+        validos = np.isfinite(valores)
+        valores = np.where(validos, valores, 0.0)
+        if self.referencia is None:
+            n_validos = validos.sum(axis=0)
+            self.referencia = np.where(n_validos > 0, valores.sum(axis=0) / np.maximum(n_validos, 1), 0.0)
+
+        # Los sujetos tocados salen de los momentos y vuelven con sus medias nuevas
+        afectados = np.unique(cod_s)
+        self._mover_momentos(afectados, -1)
+        np.add.at(self.n_celda, (cod_s, cod_a, cod_b), validos.astype(np.int64))
+        np.add.at(self.suma_celda, (cod_s, cod_a, cod_b), valores)
+        self._mover_momentos(afectados, +1)
+
+        # Momentos por fila: global y por celda
+        n = validos.sum(axis=0)
+        media = valores.sum(axis=0) / np.maximum(n, 1)
+        m2 = np.where(validos, (valores - media) ** 2, 0.0).sum(axis=0)
+        self.filas = _fusionar_momentos(*self.filas, n, media, m2)
+
+        n_a, n_b, n_dv = len(self.niveles_a), len(self.niveles_b), len(self.dvs)
+        celda = cod_a * n_b + cod_b
+        n_c = np.stack([np.bincount(celda, validos[:, j], n_a * n_b) for j in range(n_dv)], axis=-1)
+        n_c = n_c.astype(np.int64).reshape(n_a, n_b, n_dv)
+        suma_c = np.stack([np.bincount(celda, valores[:, j], n_a * n_b) for j in range(n_dv)], axis=-1)
+        media_c = suma_c.reshape(n_a, n_b, n_dv) / np.maximum(n_c, 1)
+        dif = np.where(validos, valores - media_c.reshape(n_a * n_b, n_dv)[celda], 0.0)
+        m2_c = np.stack([np.bincount(celda, dif[:, j] ** 2, n_a * n_b) for j in range(n_dv)], axis=-1)
+        self.celdas = _fusionar_momentos(*self.celdas, n_c, media_c, m2_c.reshape(n_a, n_b, n_dv))
+        return self
+
+    # --- Resultados ------------------------------------------------------------
+
+    def anova(self, dv):
+        """Tabla del ANOVA de medidas repetidas (formato Pingouin) para `dv`."""
+        j = self.dvs.index(dv)
+        res = rm_anova2_momentos(int(self.n_completos[j]), self.suma_x[..., j], self.suma_xx[..., j])
+        return tabla_anova(res, within=self.within)
+
+    def kpis(self):
+        """Número de sujetos y media / desviación típica (ddof=1) por fila de cada DV."""
+        n, media, m2 = self.filas
+        return {
+            'total_participantes': len(self.sujetos),
+            'media': dict(zip(self.dvs, media.tolist())),
+            'std': dict(zip(self.dvs, np.sqrt(m2 / (n - 1)).tolist())),
+        }
+
+    def tabla_celdas(self, dv):
+        """count, mean y std de `dv` por combinación de niveles (como `groupby().agg`)."""
+        j = self.dvs.index(dv)
+        n, media, m2 = self.celdas
+        n = n[..., j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(m2[..., j] / (n - 1))
+        indice = pd.MultiIndex.from_product([self.niveles_a, self.niveles_b], names=self.within)
+        return pd.DataFrame({'count': n.ravel(), 'mean': media[..., j].ravel(), 'std': std.ravel()}, index=indice)
+
+    # --- Persistencia ----------------------------------------------------------
+
+    def guardar(self, ruta, extra=None):
+        n_s = len(self.sujetos)
+        meta = {
+            'within': self.within, 'subject': self.subject, 'dvs': self.dvs,
+            'niveles_a': self.niveles_a, 'niveles_b': self.niveles_b,
+            'sujetos': [s.item() if hasattr(s, 'item') else s for s in self.sujetos],
+            'formato': FORMATO, 'n_completos': self.n_completos.tolist(), 'extra': extra or {},
+        }
+        escribir_atomico(ruta, lambda tmp: np.savez(
+            tmp, meta=np.array(json.dumps(meta)),
+            n_celda=self.n_celda[:n_s], suma_celda=self.suma_celda[:n_s],
+            referencia=self.referencia if self.referencia is not None else np.array([]),
+            suma_x=self.suma_x, suma_xx=self.suma_xx,
+            filas_n=np.array(self.filas[0]), filas_media=self.filas[1], filas_m2=self.filas[2],
+            celdas_n=self.celdas[0], celdas_media=self.celdas[1], celdas_m2=self.celdas[2],
+        ), sufijo='.tmp.npz')
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Devuelve `(almacen, extra)` desde un archivo escrito por `guardar`; `(None, {})` si es de otro formato."""
+        with np.load(ruta) as z:
+            meta = json.loads(str(z['meta']))
+            if meta.get('formato') != FORMATO:
+                return None, {}
+            almacen = cls(meta['niveles_a'], meta['niveles_b'], meta['dvs'], meta['within'], meta['subject'])
+            almacen.sujetos = meta['sujetos']
+            almacen._indice = {s: i for i, s in enumerate(almacen.sujetos)}
+            almacen.n_celda = z['n_celda']
+            almacen.suma_celda = z['suma_celda']
+            almacen.referencia = z['referencia'] if z['referencia'].size else None
+            almacen.n_completos = np.array(meta['n_completos'], dtype=np.int64)
+            almacen.suma_x, almacen.suma_xx = z['suma_x'], z['suma_xx']
+            almacen.filas = (z['filas_n'], z['filas_media'], z['filas_m2'])
+            almacen.celdas = (z['celdas_n'], z['celdas_media'], z['celdas_m2'])
+        return almacen, meta['extra']
+
+
+def _ruta_almacen(ruta, dvs):
+    return ruta_en_cache(ruta, f".{'-'.join(dvs)}.suficientes.npz")
+
+
+def _huellas_bloques(fh, fin, desde=0):
+    """SHA-256 de cada bloque de `BLOQUE_HUELLA` bytes de `[desde, fin)`; `desde` alineado a bloque."""
+    huellas = []
+    fh.seek(desde)
+    for inicio in range(desde, fin, BLOQUE_HUELLA):
+        huellas.append(hashlib.sha256(fh.read(min(BLOQUE_HUELLA, fin - inicio))).hexdigest())
+    return huellas
+
+
+def actualizar_almacen(ruta, dvs, within=('prime', 'target'), subject='id'):
+    """
+    Carga el almacén persistido de `ruta` y le añade solo las filas nuevas del CSV.
+
+    Si el archivo no ha crecido exclusivamente por el final (cabecera o
+    contenido previo distintos, o última línea sin salto), se reconstruye
+    desde cero. Devuelve `(almacen, filas_nuevas)`.
+    """
+    dvs = list(dvs)
+    ruta_almacen = _ruta_almacen(ruta, dvs)
+    _, tamano = firma_archivo(ruta)
+    almacen, extra = None, {}
+    if os.path.exists(ruta_almacen):
+        almacen, extra = AlmacenSuficientes.cargar(ruta_almacen)
+
+    with open(ruta, 'rb') as fh:
+        cabecera = fh.readline()
+        desplazamiento = extra.get('bytes', 0)
+        valido = (
+            almacen is not None
+            and extra.get('origen') == os.path.abspath(ruta)
+            and desplazamiento <= tamano
+            and extra.get('termina_en_salto', True)
+            and _huellas_bloques(fh, desplazamiento) == extra.get('huellas')
+        )
+        if not valido:
+            almacen, desplazamiento = None, len(cabecera)
+            extra = {}
+        if desplazamiento == tamano and almacen is not None:
+            return almacen, 0
+        fh.seek(desplazamiento)
+        cola = fh.read(tamano - desplazamiento)
+
+    nuevas = pd.read_csv(io.BytesIO(cabecera + cola)) if cola.strip() else pd.DataFrame()
+    if almacen is None:
+        a, b = within
+        almacen = AlmacenSuficientes(sorted(pd.unique(nuevas[a]).tolist()),
+                                     sorted(pd.unique(nuevas[b]).tolist()), dvs, within, subject)
+    almacen.agregar(nuevas)
+
+    # Los bloques completos del prefijo ya comprobado se conservan; se rehace desde el último
+    conservados = min(desplazamiento, extra.get('bytes', 0)) // BLOQUE_HUELLA
+    with open(ruta, 'rb') as fh:
+        huellas = extra.get('huellas', [])[:conservados] + _huellas_bloques(fh, tamano, conservados * BLOQUE_HUELLA)
+    almacen.guardar(ruta_almacen, extra={
+        'origen': os.path.abspath(ruta), 'bytes': tamano, 'huellas': huellas,
+        'termina_en_salto': cola.endswith(b'\n') or not cola,
+    })
+    return almacen, len(nuevas)
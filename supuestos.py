@@ -0,0 +1,122 @@
+"""
+Residuos del ANOVA de medidas repetidas y verificación de supuestos.
+
+Sustituye a los tres bloques copiados (RT, MVPA, searchlight) que construían
+`mean_sujeto` / `mean_celda` con `groupby().mean().reset_index()` y dos `merge`.
+Aquí los residuos `y - ȳ_celda - ȳ_sujeto + ȳ` se obtienen con
+`groupby().transform` sobre el propio índice del DataFrame (o, en la versión
+cacheada, de las medias del cubo del dataset), y Shapiro-Wilk, Levene y el Q-Q
+normal se calculan de una vez para una o muchas variables.
+"""
+import numpy as np
+import pandas as pd
+from scipy.stats import levene, linregress, norm, shapiro
+
+from cache_analisis import cache_analisis, cubo_cacheado, huella_dataframe
+from cubo_datos import DIMS
+from instrumentacion import instrumentacion
+
+
+def residuos_anova(df, dv, within=('prime', 'target'), subject='id'):
+    """
+    Residuos `y - ȳ_celda - ȳ_sujeto + ȳ` para una o varias variables dependientes.
+
+    Devuelve un DataFrame con el mismo índice que `df` y una columna por DV.
+    """
+    dvs = [dv] if isinstance(dv, str) else list(dv)
+    y = df[dvs].astype(np.float64)
+    media_celda = y.groupby([df[w] for w in within], observed=True, sort=False).transform('mean')
+    media_sujeto = y.groupby(df[subject], observed=True, sort=False).transform('mean')
+    return y - media_celda - media_sujeto + y.mean()
+
+
+def medianas_estadisticos_orden(n):
+    """Medianas de los estadísticos de orden uniformes de Filliben (como `stats.probplot`)."""
+    v = (np.arange(1, n + 1) - 0.3175) / (n + 0.365)
+    v[-1] = 0.5 ** (1.0 / n)
+    v[0] = 1 - v[-1]
+    return v
+
+
+def qq_normal(valores):
+    """
+    Q-Q normal vectorizado por columnas, equivalente a `stats.probplot(x, dist="norm")`.
+
+    `valores` tiene forma `(n,)` o `(n, n_dv)`. Devuelve los cuantiles teóricos
+    `(n,)`, los muestrales ordenados y la recta de mínimos cuadrados
+    (pendiente, intercepto, r) de cada columna.
+    """
+    muestrales = np.sort(np.asarray(valores, dtype=np.float64), axis=0)
+    teoricos = norm.ppf(medianas_estadisticos_orden(muestrales.shape[0]))
+    if muestrales.ndim == 1:
+        ajuste = linregress(teoricos, muestrales)
+        return teoricos, muestrales, ajuste.slope, ajuste.intercept, ajuste.rvalue
+
+    # Regresión lineal simple para todas las columnas a la vez
+    x_c = teoricos - teoricos.mean()
+    y_c = muestrales - muestrales.mean(axis=0)
+    sxx = (x_c ** 2).sum()
+    sxy = x_c @ y_c
+    pendiente = sxy / sxx
+    intercepto = muestrales.mean(axis=0) - pendiente * teoricos.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = sxy / np.sqrt(sxx * (y_c ** 2).sum(axis=0))
+    return teoricos, muestrales, pendiente, intercepto, r
+
+
+def residuos_y_supuestos(df, dv, within=('prime', 'target'), subject='id', cubo=None):
+    """
+    Residuos, Shapiro-Wilk, Levene (entre celdas) y Q-Q para una o varias DV.
+
+    Con `dv` como texto los valores son escalares / vectores; con una lista,
+    cada estadístico es un array con un elemento (o columna) por DV. Con
+    `cubo` (`cubo_datos.CuboDatos` de `df`) las medias salen del cubo.
+    """
+    dvs = [dv] if isinstance(dv, str) else list(dv)
+    if cubo is not None:
+        residuos = cubo.residuos(df, dvs, within=within, subject=subject)
+        cod_a, cod_b = cubo.codigos(df, within)
+        codigos = cod_a.astype(np.int64) * len(cubo.ds[within[1]]) + cod_b
+    else:
+        residuos = residuos_anova(df, dvs, within=within, subject=subject)
+        codigos = df.groupby(list(within), observed=True).ngroup().to_numpy()
+    matriz = residuos.to_numpy()
+
+    shapiro_w, shapiro_p = shapiro(matriz, axis=0)
+    grupos = [matriz[codigos == g] for g in np.unique(codigos)]
+    levene_stat, levene_p = levene(*grupos, axis=0)
+    teoricos, muestrales, pendiente, intercepto, r = qq_normal(matriz)
+
+    resultado = {
+        'residuos': residuos,
+        'shapiro_w': np.atleast_1d(shapiro_w),
+        'shapiro_p': np.atleast_1d(shapiro_p),
+        'levene_stat': np.atleast_1d(levene_stat),
+        'levene_p': np.atleast_1d(levene_p),
+        'qq_teoricos': teoricos,
+        'qq_muestrales': muestrales,
+        'qq_pendiente': np.atleast_1d(pendiente),
+        'qq_intercepto': np.atleast_1d(intercepto),
+        'qq_r': np.atleast_1d(r),
+    }
+    if isinstance(dv, str):
+        resultado['residuos'] = residuos[dv]
+        resultado['qq_muestrales'] = muestrales[:, 0]
+        for clave in ('shapiro_w', 'shapiro_p', 'levene_stat', 'levene_p', 'qq_pendiente', 'qq_intercepto', 'qq_r'):
+            resultado[clave] = float(resultado[clave][0])
+    return resultado
+
+
+def supuestos_cacheados(df, dv, within=('prime', 'target'), subject='id'):
+    """`residuos_y_supuestos` memoizado en la caché de análisis por huella del dataset."""
+    dvs = [dv] if isinstance(dv, str) else list(dv)
+    within = list(within)
+    huella = huella_dataframe(df[[subject, *within, *dvs]])
+    clave = (huella, 'supuestos', tuple(dvs) if not isinstance(dv, str) else dv, tuple(within), subject)
+    with instrumentacion.etapa("Residuos y supuestos"):
+        cubo = cubo_cacheado(df) if {subject, *within} <= set(DIMS) else None
+        resultado = cache_analisis.obtener(
+            clave, lambda: residuos_y_supuestos(df, dv, within=within, subject=subject, cubo=cubo)
+        )
+    # Copias de los objetos pandas para que ningún rerun modifique el resultado compartido
+    return {k: v.copy() if isinstance(v, (pd.Series, pd.DataFrame)) else v for k, v in resultado.items()}
@@ -0,0 +1,44 @@
+"""Analizador por lotes con archivos del mismo nombre en carpetas distintas."""
+import glob
+import os
+
+import pandas as pd
+
+import ingesta
+from analisis_lote import analizar_directorio
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+
+
+def _preparar(directorio, n=12):
+    """`s<i>/data.csv`, alternando datos conductuales (rt_log) y de searchlight (value)."""
+    rt = pd.read_csv(os.path.join(AQUI, 'ANOVA beh RT.csv'))
+    search = pd.read_csv(os.path.join(AQUI, 'ANOVA searchlight_WIT.csv'))
+    esperado = {}
+    for i in range(n):
+        carpeta = directorio / f's{i}'
+        carpeta.mkdir()
+        ruta = carpeta / 'data.csv'
+        (rt if i % 2 == 0 else search).to_csv(ruta, index=False)
+        esperado[os.path.abspath(ruta)] = ['rt_log'] if i % 2 == 0 else ['value']
+    return esperado
+
+
+def test_mismo_nombre_en_paralelo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    entrada = tmp_path / 'in'
+    entrada.mkdir()
+    esperado = _preparar(entrada)
+
+    manifiesto = analizar_directorio(str(entrada), str(tmp_path / 'out'), procesos=8, recursivo=True)
+    assert manifiesto['errores'] == 0, [d.get('error') for d in manifiesto['datasets']]
+    assert {d['archivo']: d['dvs'] for d in manifiesto['datasets']} == esperado
+
+    # Una copia Parquet por archivo, y una segunda pasada no reconvierte nada
+    copias = sorted(glob.glob(os.path.join(ingesta.DIR_CACHE, '*.parquet')))
+    assert len(copias) == len(esperado)
+    fechas = {ruta: os.stat(ruta).st_mtime_ns for ruta in copias}
+    manifiesto = analizar_directorio(str(entrada), str(tmp_path / 'out2'), procesos=1, recursivo=True)
+    assert manifiesto['errores'] == 0
+    assert {ruta: os.stat(ruta).st_mtime_ns for ruta in copias} == fechas
+    assert not glob.glob(os.path.join(ingesta.DIR_CACHE, '*.tmp'))
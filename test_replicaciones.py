@@ -0,0 +1,44 @@
+"""Réplicas a nivel de ensayo: las medias por run se ponderan por su número de ensayos."""
+import numpy as np
+import pandas as pd
+import pingouin as pg
+
+from replicaciones import analizar_replicacion
+
+
+def _ensayos(n_sujetos=8, semilla=0):
+    """Ensayos con runs de tamaño muy desigual y algunos RT fuera del filtro."""
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for sujeto in range(1, n_sujetos + 1):
+        for run in (1, 2, 3):
+            for prime in ('Black', 'White'):
+                for target in ('gun', 'tool'):
+                    n = int(rng.integers(2, 40))
+                    efecto = 40 * (prime == 'Black') * (target == 'gun') + 15 * run
+                    rt = rng.lognormal(np.log(450 + efecto + 10 * sujeto), 0.25, n)
+                    rt[rng.random(n) < 0.05] = 2500
+                    filas.append(pd.DataFrame({'subjID': sujeto, 'run': run, 'prime': prime,
+                                               'target': target, 'RT': rt.round(1)}))
+    return pd.concat(filas, ignore_index=True)
+
+
+def test_medias_de_ensayos(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ensayos = _ensayos()
+    ruta = tmp_path / 'beh_replication1.csv'
+    ensayos.to_csv(ruta, index=False)
+    resultado = analizar_replicacion(str(ruta))
+
+    # Referencia: todos los ensayos filtrados de cada sujeto × celda, como aov_ez
+    filtrados = ensayos[(ensayos['RT'] > 200) & (ensayos['RT'] < 2000)].rename(columns={'subjID': 'id'})
+    filtrados = filtrados.assign(rt_log=np.log(filtrados['RT']), rt_raw=filtrados['RT'])
+    medias = filtrados.groupby(['id', 'prime', 'target'], as_index=False)[['rt_log', 'rt_raw']].mean()
+    for dv in ('rt_log', 'rt_raw'):
+        referencia = pg.rm_anova(data=medias, dv=dv, within=['prime', 'target'], subject='id')
+        assert np.isclose(resultado['interaccion'][dv]['F'], referencia['F'].iloc[2])
+
+    celdas = filtrados.groupby(['prime', 'target'])[['rt_log', 'rt_raw']].mean()
+    obtenidas = resultado['celdas'].set_index(['prime', 'target']).loc[celdas.index]
+    np.testing.assert_allclose(obtenidas[['rt_log', 'rt_raw']].to_numpy(), celdas.to_numpy())
+    assert resultado['n_ensayos'] == len(filtrados)
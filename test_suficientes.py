@@ -0,0 +1,38 @@
+"""Almacén de estadísticos suficientes con valores ausentes frente a un recálculo completo."""
+import os
+
+import numpy as np
+import pandas as pd
+import pingouin as pg
+
+from suficientes import actualizar_almacen
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_valores_ausentes_como_recalculo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    datos = pd.read_csv(os.path.join(AQUI, 'ANOVA searchlight_WIT.csv'))
+    datos.loc[[3, 10], 'value'] = np.nan
+    ruta = tmp_path / 'search.csv'
+    mitad = len(datos) // 2
+    datos.iloc[:mitad].to_csv(ruta, index=False)
+    actualizar_almacen(str(ruta), ['value'])
+    # La segunda mitad llega por el final: camino incremental
+    datos.to_csv(ruta, index=False)
+    almacen, nuevas = actualizar_almacen(str(ruta), ['value'])
+    assert nuevas == len(datos) - mitad
+
+    referencia = pg.rm_anova(data=datos, dv='value', within=['prime', 'target'], subject='id', detailed=True)
+    tabla = almacen.anova('value')
+    np.testing.assert_allclose(tabla['F'].to_numpy(), referencia['F'].to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(tabla['SS'].to_numpy(), referencia['SS'].to_numpy(), rtol=1e-9)
+
+    kpis = almacen.kpis()
+    assert np.isclose(kpis['media']['value'], datos['value'].mean())
+    assert np.isclose(kpis['std']['value'], datos['value'].std())
+
+    celdas = datos.groupby(['prime', 'target'])['value'].agg(['count', 'mean', 'std'])
+    obtenidas = almacen.tabla_celdas('value').loc[celdas.index]
+    np.testing.assert_array_equal(obtenidas['count'].to_numpy(), celdas['count'].to_numpy())
+    np.testing.assert_allclose(obtenidas[['mean', 'std']].to_numpy(), celdas[['mean', 'std']].to_numpy())
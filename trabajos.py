@@ -0,0 +1,145 @@
+"""
+Planificador de cálculos en segundo plano para las apps de Streamlit.
+
+Los análisis pesados (ANOVA, supuestos, remuestreos, ajustes de modelos) se
+envían a un pool de hilos en cuanto hay datos, en lugar de ejecutarse en el
+hilo del script: la página pinta KPIs y marcadores de posición y rellena los
+resultados al terminar cada trabajo. Se usan hilos y no procesos porque los
+resultados van a la caché de análisis del proceso (y NumPy / SciPy liberan el
+GIL en los cálculos); los trabajos que ya reparten bloques en procesos
+(permutaciones, potencia) siguen haciéndolo dentro de su hilo.
+
+Cada trabajo tiene una clave: pedir dos veces la misma clave devuelve el
+mismo trabajo, también entre sesiones. Los trabajos se agrupan por "ranura"
+(p. ej. sesión + sección de la página); al enviar a una ranura un trabajo
+con otra clave, el anterior se cancela si ninguna otra ranura lo usa. Si aún
+no empezó, se retira de la cola; si está en curso, la cancelación es
+cooperativa: su función de progreso lanza `Cancelado` en el siguiente bloque.
+
+Streamlit no avisa cuando una sesión termina, así que cada ranura recuerda
+cuándo se usó por última vez: las que llevan más de `TTL_RANURA` segundos
+sin enviar nada se sueltan al purgar, y sus trabajos terminados (o en curso
+sin nadie más que los espere) dejan de retenerse.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_HILOS = int(os.environ.get("TRABAJOS_HILOS", min(4, (os.cpu_count() or 1) + 1)))
+MAX_TERMINADOS = 64
+TTL_RANURA = float(os.environ.get("TRABAJOS_TTL_RANURA", 30 * 60))  # segundos sin uso
+
+
+class Cancelado(Exception):
+    """El trabajo se canceló porque nadie espera ya su resultado."""
+
+
+class Trabajo:
+    """Un cálculo enviado al planificador: futuro, progreso y ranuras que lo esperan."""
+
+    def __init__(self, clave):
+        self.clave = clave
+        self.futuro = None
+        self.progreso = 0.0
+        self.ranuras = set()
+        self._cancelado = threading.Event()
+
+    def avance(self, fraccion):
+        """Función de progreso que se pasa al cálculo; aborta si el trabajo fue cancelado."""
+        if self._cancelado.is_set():
+            raise Cancelado(self.clave)
+        self.progreso = fraccion
+
+    def cancelar(self):
+        self._cancelado.set()
+        self.futuro.cancel()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    def listo(self):
+        return self.futuro.done()
+
+    def resultado(self, timeout=None):
+        return self.futuro.result(timeout)
+
+
+class Planificador:
+    """Pool de hilos con trabajos deduplicados por clave y cancelación por ranura."""
+
+    def __init__(self, max_hilos=MAX_HILOS, ttl_ranura=TTL_RANURA):
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='trabajo')
+        self._trabajos = OrderedDict()
+        self._ranuras = {}
+        self._usos = {}  # ranura -> último `enviar` (time.monotonic)
+        self.ttl_ranura = ttl_ranura
+        self._lock = threading.Lock()
+        self.cancelados = 0
+
+    def enviar(self, clave, funcion, *args, ranura=None, con_progreso=False, **kwargs):
+        """
+        Trabajo para `funcion(*args, **kwargs)` identificado por `clave`.
+
+        Con `con_progreso=True` la función recibe `progreso=trabajo.avance`.
+        Con `ranura`, el trabajo previo de esa ranura se suelta (y se cancela
+        si ya no lo espera nadie).
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is None or trabajo.cancelado or (trabajo.listo() and trabajo.futuro.exception() is not None):
+                trabajo = Trabajo(clave)
+                if con_progreso:
+                    kwargs['progreso'] = trabajo.avance
+                trabajo.futuro = self._pool.submit(funcion, *args, **kwargs)
+                self._trabajos[clave] = trabajo
+            self._trabajos.move_to_end(clave)
+            if ranura is not None:
+                self._soltar(ranura, conservar=trabajo)
+                trabajo.ranuras.add(ranura)
+                self._ranuras[ranura] = trabajo
+                self._usos[ranura] = time.monotonic()
+            self._purgar()
+            return trabajo
+
+    def cancelar_ranura(self, ranura):
+        """Suelta el trabajo de `ranura` (p. ej. al desactivar una sección)."""
+        with self._lock:
+            self._soltar(ranura)
+
+    def _soltar(self, ranura, conservar=None):
+        self._usos.pop(ranura, None)
+        previo = self._ranuras.pop(ranura, None)
+        if previo is None or previo is conservar:
+            return
+        previo.ranuras.discard(ranura)
+        if not previo.ranuras and not previo.listo():
+            previo.cancelar()
+            self.cancelados += 1
+            self._trabajos.pop(previo.clave, None)
+
+    def _purgar(self):
+        # Ranuras de sesiones que ya no envían nada (p. ej. pestañas cerradas)
+        limite = time.monotonic() - self.ttl_ranura
+        for ranura in [r for r, uso in self._usos.items() if uso < limite]:
+            self._soltar(ranura)
+        # Los resultados viven en las cachés; aquí solo se recuerdan los últimos terminados
+        terminados = [c for c, t in self._trabajos.items() if t.listo() and not t.ranuras]
+        for clave in terminados[:max(0, len(terminados) - MAX_TERMINADOS)]:
+            del self._trabajos[clave]
+
+    def estadisticas(self):
+        with self._lock:
+            trabajos = list(self._trabajos.values())
+        return {
+            'en_curso': sum(t.futuro.running() for t in trabajos),
+            'en_cola': sum(not t.futuro.running() and not t.listo() for t in trabajos),
+            'terminados': sum(t.listo() for t in trabajos),
+            'cancelados': self.cancelados,
+        }
+
+
+# Instancia compartida por todas las sesiones del servidor
+planificador = Planificador()